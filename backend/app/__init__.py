@@ -10,9 +10,19 @@ from .config import Config
 def create_app():
     app = Flask(__name__)
     app.config.from_object(Config)
+    
+    # orjson-backed JSON responses when orjson is installed
+    from .serialization import FastJSONProvider, SocketJSON
+    app.json = FastJSONProvider(app)
+
+    # Engine options for the selected database profile (see database.py)
+    from .database import configure_engine, install_pragmas
+    configure_engine(app)
 
     # Initialize extensions
     db.init_app(app)
+    with app.app_context():
+        install_pragmas(app, db.engine)
     jwt.init_app(app)
     
     # Dynamic CORS origins for production and development
@@ -21,7 +31,38 @@ def create_app():
     CORS(app, resources={
         r"/api/*": {"origins": cors_origins}
     })
-    socketio.init_app(app, cors_allowed_origins=cors_origins)
+    
+    # A message queue lets emits from any worker (including REST handlers) reach every client
+    socketio_options = {
+        'cors_allowed_origins': cors_origins,
+        'async_mode': app.config['SOCKETIO_ASYNC_MODE'],
+        'json': SocketJSON
+    }
+    message_queue = app.config.get('SOCKETIO_MESSAGE_QUEUE')
+    if message_queue and message_queue.startswith('local://'):
+        from .socket_events.local_queue import create_client_manager
+        socketio_options['client_manager'] = create_client_manager(message_queue, channel=app.config['SOCKETIO_CHANNEL'])
+    elif message_queue:
+        socketio_options['message_queue'] = message_queue
+        socketio_options['channel'] = app.config['SOCKETIO_CHANNEL']
+    socketio.init_app(app, **socketio_options)
+    
+    from .socket_events.fanout import fanout
+    fanout.init_app(app, socketio)
+    
+    from .socket_events.presence import presence
+    presence.init_app(app, socketio)
+    
+    from .socket_events.roster import roster
+    roster.init_app(app, socketio)
+    
+    from .socket_events.round_timers import round_timers
+    round_timers.init_app(app, socketio)
+    
+    from .metrics import metrics
+    metrics.init_app(app, socketio)
+    from .query_budget import query_budget
+    query_budget.init_app(app)
 
     # Import blueprints here to avoid circular imports
     from .auth import auth_bp
@@ -31,6 +72,20 @@ def create_app():
     app.register_blueprint(auth_bp, url_prefix='/api/auth')
     app.register_blueprint(session_bp, url_prefix='/api/session')
 
+    # Under gevent/eventlet, REST handlers run on the database thread pool so they don't block sockets
+    from .offload import offload
+    offload.init_app(app, socketio.async_mode)
+    from .auth.passwords import passwords
+    passwords.init_app(app, socketio.async_mode)
+    from .counters import counters
+    counters.init_app(app)
+    from .checkpoints import checkpoints
+    checkpoints.init_app(app, socketio)
+    if offload.async_mode != 'threading':
+        for endpoint, view in app.view_functions.items():
+            if endpoint.startswith(('auth.', 'session.')) and not getattr(view, 'offload_inline', False):
+                app.view_functions[endpoint] = offload.wrap(view)
+
     # Register Socket.IO events
     from .socket_events.events import register_socket_events
     register_socket_events(socketio)
@@ -38,12 +93,15 @@ def create_app():
     # Create tables and initialize data
     with app.app_context():
         db.create_all()
+        from .database import add_missing_columns, create_missing_indexes
+        add_missing_columns(db.engine, db.metadata)
+        create_missing_indexes(db.engine, db.metadata)
         
         # Auto-initialize database with data files on first run
         from .services.keyword_service import KeywordService
         from .services.prompt_service import PromptService
         from .models import Keyword, Prompt
-        import json
+        from .serialization import loads
         import glob
         
         # Only populate if empty (first run)
@@ -62,8 +120,8 @@ def create_app():
             for json_file in json_files:
                 try:
                     print(f"Loading {os.path.basename(json_file)}...")
-                    with open(json_file, 'r', encoding='utf-8') as f:
-                        prompts_data = json.load(f)
+                    with open(json_file, 'rb') as f:
+                        prompts_data = loads(f.read())
                     
                     # Import prompts from this file
                     stats = PromptService.bulk_import_prompts(prompts_data)
@@ -0,0 +1,62 @@
+# convolute/backend/app/auth/passwords.py
+
+"""
+Password hashing on its own bounded executor.
+
+KDFs are slow on purpose, so a burst of logins at the start of class would
+otherwise occupy the threads that serve database work (or, inline under
+gevent, the event loop itself). Hashes run on a pool of at most
+HASH_MAX_CONCURRENCY real threads; further logins wait their turn without
+holding anything else up.
+
+HASH_PROFILE picks the cost of new hashes. Existing hashes record their
+own method and keep verifying after a profile change.
+"""
+import threading
+from werkzeug.security import check_password_hash, generate_password_hash
+
+HASH_PROFILES = {
+    'fast': 'pbkdf2:sha256:50000',      # development and load tests only
+    'standard': 'scrypt:32768:8:1',     # werkzeug's default
+    'strong': 'scrypt:131072:8:1',
+}
+
+
+class PasswordHasher:
+    def __init__(self):
+        self.method = HASH_PROFILES['standard']
+        self.max_concurrency = 2
+        self._pool = None
+        self._slots = threading.BoundedSemaphore(self.max_concurrency)
+
+    def init_app(self, app, async_mode):
+        profile = app.config.get('HASH_PROFILE', 'standard')
+        if profile not in HASH_PROFILES:
+            raise ValueError(f"Unknown HASH_PROFILE {profile!r}, expected one of {', '.join(HASH_PROFILES)}")
+        self.method = HASH_PROFILES[profile]
+        self.max_concurrency = app.config.get('HASH_MAX_CONCURRENCY', 2)
+
+        if async_mode == 'gevent':
+            from gevent.threadpool import ThreadPool
+            self._pool = ThreadPool(self.max_concurrency)
+        else:
+            self._pool = None
+            self._slots = threading.BoundedSemaphore(self.max_concurrency)
+
+    def hash(self, password):
+        return self._run(generate_password_hash, password, self.method)
+
+    def check(self, pwhash, password):
+        if not pwhash:
+            return False
+        return self._run(check_password_hash, pwhash, password)
+
+    def _run(self, fn, *args):
+        """Under gevent, run fn on the hash pool; otherwise inline in the request thread, within the concurrency limit"""
+        if self._pool is not None:
+            return self._pool.apply(fn, args)
+        with self._slots:
+            return fn(*args)
+
+
+passwords = PasswordHasher()
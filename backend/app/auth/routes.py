@@ -2,13 +2,15 @@
 
 from flask import request, jsonify
 from flask_jwt_extended import create_access_token, jwt_required, get_jwt_identity
-from werkzeug.security import check_password_hash, generate_password_hash
 from ..models import Instructor
 from ..extensions import db
+from ..offload import offload
+from .passwords import passwords
 from . import auth_bp
 
 
 @auth_bp.route('/login', methods=['POST'])
+@offload.inline
 def login():
     data = request.get_json()
     email = data.get('email')
@@ -17,16 +19,18 @@ def login():
     if not email or not password:
         return jsonify({'message': 'Email and password required'}), 400
 
-    instructor = Instructor.query.filter_by(email=email).first()
+    # Database work on the database pool, the hash check on the hash pool
+    instructor = offload.run(_find_instructor, email)
 
-    if instructor and check_password_hash(instructor.password, password):
-        access_token = create_access_token(identity=instructor.id)
+    if instructor and passwords.check(instructor[1], password):
+        access_token = create_access_token(identity=instructor[0])
         return jsonify({'access_token': access_token}), 200
 
     return jsonify({'message': 'Invalid credentials'}), 401
 
 
 @auth_bp.route('/register', methods=['POST'])
+@offload.inline
 def register():
     data = request.get_json()
     email = data.get('email')
@@ -36,18 +40,27 @@ def register():
         return jsonify({'message': 'Email and password required'}), 400
 
     # Check if instructor already exists
-    if Instructor.query.filter_by(email=email).first():
+    if offload.run(_find_instructor, email):
         return jsonify({'message': 'Email already registered'}), 400
 
     # Create new instructor
-    hashed_password = generate_password_hash(password)
-    instructor = Instructor(email=email, password=hashed_password)
+    hashed_password = passwords.hash(password)
+    instructor_id = offload.run(_create_instructor, email, hashed_password)
+
+    access_token = create_access_token(identity=instructor_id)
+    return jsonify({'access_token': access_token, 'message': 'Registration successful'}), 201
+
+
+def _find_instructor(email):
+    """(id, password hash) of the instructor with this email, or None"""
+    return db.session.query(Instructor.id, Instructor.password).filter_by(email=email).first()
 
+
+def _create_instructor(email, hashed_password):
+    instructor = Instructor(email=email, password=hashed_password)
     db.session.add(instructor)
     db.session.commit()
-
-    access_token = create_access_token(identity=instructor.id)
-    return jsonify({'access_token': access_token, 'message': 'Registration successful'}), 201
+    return instructor.id
 
 
 @auth_bp.route('/profile', methods=['GET'])
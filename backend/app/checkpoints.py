@@ -0,0 +1,223 @@
+# convolute/backend/app/checkpoints.py
+
+"""
+Crash-recovery checkpoints of live classroom state.
+
+In-memory stores that a restart would lose register an export and a
+restore function under a kind, and mark a key (usually a session keyword)
+whenever its state changes. One background task writes the marked keys
+every CHECKPOINT_SECONDS to the checkpoints table, one row per kind and
+key, so a write costs as many rows as sessions changed since the last one
+rather than a dump of everything. A key whose state is gone (round reset,
+session ended) has its row deleted.
+
+Each row belongs to one worker (owner), which holds it on a lease renewed
+every CHECKPOINT_LEASE_SECONDS / 3. Only the owner updates or deletes a
+row: a worker that marks a key owned by another live worker writes
+nothing, so a reset-round handled elsewhere cannot delete a running
+timer's row. A row without an owner, or whose lease ran out because its
+worker died, is claimed with a conditional UPDATE, and only the worker
+whose UPDATE changed it restores it. Several workers starting together
+therefore restore each timer once instead of once per worker.
+
+The server entry points call restore() once before serving to claim and
+load what no live worker holds; the background task keeps claiming rows
+whose worker died. Shutting down writes whatever is still marked and
+releases the worker's rows for the next process to claim.
+"""
+import atexit
+import logging
+import os
+import socket
+import threading
+import time
+import uuid
+from sqlalchemy import bindparam, or_, tuple_
+from sqlalchemy.exc import IntegrityError
+from .extensions import db
+from .models import Checkpoint
+from .offload import offload
+from .serialization import dumps, loads
+
+logger = logging.getLogger(__name__)
+
+
+class Checkpointer:
+    def __init__(self):
+        self.app = None
+        self.socketio = None
+        self.interval = 1.0
+        self.lease = 10.0
+        self.owner = f'{socket.gethostname()}:{os.getpid()}:{uuid.uuid4().hex[:8]}'
+        self._lock = threading.Lock()
+        self._stores = {}     # kind -> (export(key) -> state or None, restore(key, state))
+        self._dirty = set()   # (kind, key) changed since the last write
+        self._running = False
+
+    def init_app(self, app, socketio):
+        self.app = app
+        self.socketio = socketio
+        self.interval = app.config.get('CHECKPOINT_SECONDS', 1.0)
+        self.lease = app.config.get('CHECKPOINT_LEASE_SECONDS', 10.0)
+        atexit.register(self.shutdown)
+
+    def register(self, kind, export, restore):
+        """Checkpoint a store. export(key) returns JSON-serializable state, or None once there is none"""
+        self._stores[kind] = (export, restore)
+
+    def mark(self, kind, key):
+        """Note that a store's state for key changed"""
+        with self._lock:
+            self._dirty.add((kind, key))
+        self._ensure_running()
+
+    def write(self):
+        """
+        Write the state of every marked key in one transaction, claiming rows nobody holds.
+        Rows held by another live worker are left alone. Returns the number of keys written
+        """
+        with self._lock:
+            dirty, self._dirty = self._dirty, set()
+        if not dirty:
+            return 0
+
+        states = {(kind, key): self._stores[kind][0](key) for kind, key in dirty}
+        now = time.time()
+        try:
+            with self.app.app_context():
+                owners = {(kind, key): (owner, lease_until) for kind, key, owner, lease_until in db.session.execute(
+                    db.select(Checkpoint.kind, Checkpoint.key, Checkpoint.owner, Checkpoint.lease_until)
+                    .where(tuple_(Checkpoint.kind, Checkpoint.key).in_(dirty)))}
+                mine = {ck for ck, (owner, _) in owners.items() if owner == self.owner}
+                for ck, (owner, lease_until) in owners.items():
+                    if ck not in mine and states[ck] is not None and (owner is None or lease_until < now):
+                        if self._claim([ck], now):
+                            mine.add(ck)
+
+                table = Checkpoint.__table__
+                updates = [{'b_kind': kind, 'b_key': key, 'b_data': dumps(states[kind, key])}
+                           for kind, key in mine if states[kind, key] is not None]
+                if updates:
+                    db.session.execute(
+                        table.update()
+                        .where(table.c.kind == bindparam('b_kind'), table.c.key == bindparam('b_key'),
+                               table.c.owner == self.owner)
+                        .values(data=bindparam('b_data'), lease_until=now + self.lease), updates)
+                gone = [ck for ck in mine if states[ck] is None]
+                if gone:
+                    db.session.execute(db.delete(Checkpoint).where(
+                        tuple_(Checkpoint.kind, Checkpoint.key).in_(gone), Checkpoint.owner == self.owner))
+                inserts = [{'kind': kind, 'key': key, 'data': dumps(state), 'owner': self.owner,
+                            'lease_until': now + self.lease}
+                           for (kind, key), state in states.items() if state is not None and (kind, key) not in owners]
+                if inserts:
+                    db.session.execute(db.insert(Checkpoint), inserts)
+                db.session.commit()
+        except Exception as e:
+            # Mark them again; the next write exports their state afresh. A key another worker
+            # inserted meanwhile is then found with its owner and skipped
+            with self._lock:
+                self._dirty |= dirty
+            if isinstance(e, IntegrityError):
+                logger.info("Checkpoint rows were created by another worker; retrying with the next write")
+                return 0
+            raise
+        return len(updates) + len(gone) + len(inserts)
+
+    def read(self, kind, key):
+        """The last written state of one key, or None. Call with an app context"""
+        data = db.session.query(Checkpoint.data).filter_by(kind=kind, key=key).scalar()
+        return loads(data) if data is not None else None
+
+    def restore(self):
+        """Claim and load the checkpoints no live worker holds. Call once at startup, before serving"""
+        started = time.perf_counter()
+        restored = self._adopt()
+        elapsed_ms = (time.perf_counter() - started) * 1000
+        if restored:
+            logger.info("Restored %d checkpoints in %.1f ms", restored, elapsed_ms)
+        self._ensure_running()
+        return restored, elapsed_ms
+
+    def shutdown(self):
+        """Write what is still marked and give up this worker's rows, so the next process claims them at once"""
+        self.write()
+        with self.app.app_context():
+            db.session.execute(db.update(Checkpoint).where(Checkpoint.owner == self.owner)
+                               .values(owner=None, lease_until=None))
+            db.session.commit()
+
+    def _claim(self, keys, now):
+        """
+        Take ownership of the rows among keys that nobody holds, in the current transaction.
+        Returns how many this worker got: a worker that claimed one first makes the UPDATE skip it
+        """
+        return db.session.execute(
+            db.update(Checkpoint)
+            .where(tuple_(Checkpoint.kind, Checkpoint.key).in_(keys),
+                   or_(Checkpoint.owner.is_(None), Checkpoint.lease_until < now))
+            .values(owner=self.owner, lease_until=now + self.lease)
+        ).rowcount
+
+    def _adopt(self):
+        """Claim the rows nobody holds and load them into their stores. Returns the number loaded"""
+        now = time.time()
+        with self.app.app_context():
+            orphans = db.session.execute(
+                db.select(Checkpoint.kind, Checkpoint.key)
+                .where(or_(Checkpoint.owner.is_(None), Checkpoint.lease_until < now))).all()
+            if not orphans or not self._claim([tuple(row) for row in orphans], now):
+                db.session.rollback()
+                return 0
+            db.session.commit()
+            rows = db.session.execute(
+                db.select(Checkpoint.kind, Checkpoint.key, Checkpoint.data)
+                .where(tuple_(Checkpoint.kind, Checkpoint.key).in_([tuple(row) for row in orphans]),
+                       Checkpoint.owner == self.owner)).all()
+
+        restored = 0
+        for kind, key, data in rows:
+            store = self._stores.get(kind)
+            if not store:
+                continue
+            if store[0](key) is not None:
+                # This worker has its own state for the key; write it over the claimed row
+                self.mark(kind, key)
+                continue
+            store[1](key, loads(data))
+            restored += 1
+        return restored
+
+    def _renew(self):
+        """Extend the lease on this worker's rows"""
+        with self.app.app_context():
+            db.session.execute(db.update(Checkpoint).where(Checkpoint.owner == self.owner)
+                               .values(lease_until=time.time() + self.lease))
+            db.session.commit()
+
+    def _ensure_running(self):
+        with self._lock:
+            if self._running or self.socketio is None:
+                return
+            self._running = True
+        offload.call_soon(self.socketio.start_background_task, self._run)
+
+    def _run(self):
+        """
+        The checkpoint task: write whatever was marked every interval, and every third of
+        a lease renew this worker's rows and claim those whose worker died
+        """
+        last_renewed = time.monotonic()
+        while True:
+            self.socketio.sleep(self.interval)
+            try:
+                offload.run(self.write)
+                if time.monotonic() - last_renewed >= self.lease / 3:
+                    last_renewed = time.monotonic()
+                    offload.run(self._renew)
+                    offload.run(self._adopt)
+            except Exception:
+                logger.exception("Checkpoint write failed; retrying with the next one")
+
+
+checkpoints = Checkpointer()
@@ -1,8 +1,41 @@
 # convolute/backend/app/config.py
 
+import os
+
 class Config:
     SECRET_KEY = "super-secret"
-    SQLALCHEMY_DATABASE_URI = "sqlite:///db.sqlite3"
+    SQLALCHEMY_DATABASE_URI = os.environ.get('DATABASE_URL', "sqlite:///db.sqlite3")
     SQLALCHEMY_TRACK_MODIFICATIONS = False
     JWT_SECRET_KEY = "jwt-secret"
-    PROMPT_SERVICE_URL = "http://localhost:5001/api/prompt"
+    PROMPT_SERVICE_URL = os.environ.get('PROMPT_SERVICE_URL', "http://localhost:5001/api/prompt")
+    PROMPT_SERVICE_CONNECT_TIMEOUT = 0.5  # seconds
+    PROMPT_SERVICE_READ_TIMEOUT = 1.0  # seconds
+    PROMPT_SERVICE_POOL_SIZE = 10  # kept-alive connections to the prompt service
+    PROMPT_SERVICE_FAILURE_THRESHOLD = 3  # consecutive failures before falling back to the local database
+    PROMPT_SERVICE_RESET_SECONDS = 30  # how long to stay on the fallback before trying the service again
+    PROMPT_SERVICE_MAX_COUNT = 100  # most prompts asked for in one request; matches prompt_server.MAX_COUNT
+    FANOUT_MAX_CONCURRENCY = 4  # rounds delivered by background fan-out tasks at the same time
+    PRESENCE_TTL_SECONDS = 1800  # idle presence entries whose socket is gone are dropped after this
+    CHECKPOINT_SECONDS = float(os.environ.get('CHECKPOINT_SECONDS', 1.0))  # how often changed live state is checkpointed for crash recovery
+    CHECKPOINT_LEASE_SECONDS = float(os.environ.get('CHECKPOINT_LEASE_SECONDS', 10.0))  # a dead worker's checkpoint rows are claimed by another after this
+    ROUND_TIMER_TICK_SECONDS = 5  # how often running round timers send a tick between phase changes
+    QUERY_BUDGET_DEFAULT = int(os.environ.get('QUERY_BUDGET_DEFAULT', 25))  # SQL statements a request may run unless its view declares a budget
+    QUERY_REPEAT_LIMIT = 3  # a statement shape run more often than this in one request is listed as a likely query in a loop
+    ROSTER_DEBOUNCE_MS = 100  # window for coalescing instructor roster updates into one roster_delta
+    SOCKETIO_MESSAGE_QUEUE = os.environ.get('SOCKETIO_MESSAGE_QUEUE')  # e.g. redis://localhost:6379/0 or local://127.0.0.1:6391
+    SOCKETIO_CHANNEL = os.environ.get('SOCKETIO_CHANNEL', 'flask-socketio')
+    SOCKETIO_ASYNC_MODE = os.environ.get('SOCKETIO_ASYNC_MODE', 'threading')  # serve.py switches this to gevent
+    DB_THREADPOOL_SIZE = int(os.environ.get('DB_THREADPOOL_SIZE', 10))  # threads for blocking work under gevent/eventlet
+    DB_PROFILE = os.environ.get('DB_PROFILE')  # sqlite, server or plain; follows the database URL when unset
+    SQLITE_BUSY_TIMEOUT_MS = int(os.environ.get('SQLITE_BUSY_TIMEOUT_MS', 5000))  # how long a writer waits for the lock
+    SQLITE_MMAP_SIZE = int(os.environ.get('SQLITE_MMAP_SIZE', 256 * 1024 * 1024))  # bytes of the file read through mmap
+    SQLITE_CACHE_SIZE = int(os.environ.get('SQLITE_CACHE_SIZE', -64000))  # page cache; negative values are KiB
+    DB_POOL_SIZE = int(os.environ.get('DB_POOL_SIZE', 10))  # server profile: connections kept open
+    DB_MAX_OVERFLOW = int(os.environ.get('DB_MAX_OVERFLOW', 20))  # server profile: extra connections under bursts
+    DB_POOL_TIMEOUT = int(os.environ.get('DB_POOL_TIMEOUT', 10))  # server profile: seconds to wait for a free connection
+    DB_POOL_RECYCLE = int(os.environ.get('DB_POOL_RECYCLE', 1800))  # server profile: seconds before a connection is replaced
+    HASH_PROFILE = os.environ.get('HASH_PROFILE', 'standard')  # fast, standard or strong; cost of new password hashes
+    HASH_MAX_CONCURRENCY = int(os.environ.get('HASH_MAX_CONCURRENCY', 2))  # password hashes computed at the same time
+    PROMPT_NEAR_DUPLICATES = os.environ.get('PROMPT_NEAR_DUPLICATES', 'flag')  # flag, merge or off: what bulk imports do with prompts similar to ones already there
+    PROMPT_NEAR_DUPLICATE_THRESHOLD = float(os.environ.get('PROMPT_NEAR_DUPLICATE_THRESHOLD', 0.9))  # estimated Jaccard similarity of 5-character shingles, and of words to merge
+    PROMPT_PACK_PATH = os.environ.get('PROMPT_PACK_PATH', os.path.abspath(os.path.join(os.path.dirname(__file__), '..', 'instance', 'prompts.pack')))  # built by build_prompt_pack.py
@@ -0,0 +1,87 @@
+# convolute/backend/app/counters.py
+
+"""
+Batched updates for hot counters.
+
+Session.student_count (every join) and PromptPointer.current_index (every
+prompt dealt) used to be written through the ORM, one UPDATE per changed
+row. Changes to them are now collected on the database session and written
+when it commits, inside the same transaction, as a few set-based
+statements:
+
+    UPDATE prompt_pointers SET current_index = 7 WHERE id IN (...)
+
+Counts are grouped by delta and pointers by value, so one statement per
+column and value covers however many rows a request changed. Counts are
+applied as deltas (student_count = student_count + n), so workers sharing a
+database never overwrite each other's increments.
+
+Because the updates commit or roll back with the rows that caused them, a
+crash never leaves a counter disagreeing with the students and prompts it
+counts. Code that reads a counter before its transaction commits goes
+through read(), which adds the session's pending changes.
+"""
+from sqlalchemy import event
+from .extensions import db
+
+
+class CounterBatch:
+    def init_app(self, app):
+        if not event.contains(db.session, 'before_commit', self._apply):
+            event.listen(db.session, 'before_commit', self._apply)
+            event.listen(db.session, 'after_soft_rollback', self._discard_pending)
+
+    def add(self, column, row_id, delta=1):
+        """Add delta to a row's counter column (e.g. Session.student_count) when the transaction commits"""
+        rows = self._pending()[0].setdefault(self._key(column), {})
+        rows[row_id] = rows.get(row_id, 0) + delta
+
+    def set(self, column, row_id, value):
+        """Set a row's column to value when the transaction commits, replacing any pending value"""
+        self._pending()[1].setdefault(self._key(column), {})[row_id] = value
+
+    def read(self, row, column):
+        """The row's value of a counter column, including this transaction's pending changes"""
+        key = self._key(column)
+        deltas, values = db.session.info.get('counters', ({}, {}))
+        value = values.get(key, {}).get(row.id, getattr(row, column.key) or 0)
+        return value + deltas.get(key, {}).get(row.id, 0)
+
+    @staticmethod
+    def _pending():
+        """(deltas, values) of the current session, each (table, column) -> {row id: delta or value}"""
+        return db.session.info.setdefault('counters', ({}, {}))
+
+    @staticmethod
+    def _key(column):
+        """Key of a mapped column attribute such as Student.round_count"""
+        return column.class_.__table__.name, column.key
+
+    @staticmethod
+    def _apply(session):
+        """Write the session's pending changes as part of the commit: one UPDATE per column and delta or value"""
+        deltas, values = session.info.pop('counters', ({}, {}))
+        for (table_name, column), rows in deltas.items():
+            table = db.metadata.tables[table_name]
+            for delta, ids in CounterBatch._group(rows).items():
+                if delta:
+                    session.execute(table.update().where(table.c.id.in_(ids)).values({column: table.c[column] + delta}))
+        for (table_name, column), rows in values.items():
+            table = db.metadata.tables[table_name]
+            for value, ids in CounterBatch._group(rows).items():
+                session.execute(table.update().where(table.c.id.in_(ids)).values({column: value}))
+
+    @staticmethod
+    def _discard_pending(session, previous_transaction):
+        session.info.pop('counters', None)
+
+    @staticmethod
+    def _group(rows):
+        """{row id: n} -> {n: [row ids]}"""
+        groups = {}
+        for row_id, n in rows.items():
+            groups.setdefault(n, []).append(row_id)
+        return groups
+
+
+counters = CounterBatch()
@@ -0,0 +1,110 @@
+# convolute/backend/app/database.py
+
+"""
+Engine profiles selected with DB_PROFILE.
+
+    sqlite  WAL journal, synchronous=NORMAL, busy_timeout, mmap_size and
+            cache_size set on every new connection, so readers no longer
+            wait on writers and writers queue instead of failing with
+            "database is locked"
+    server  sized connection pool with pre-ping and recycling, for
+            PostgreSQL/MySQL URLs
+    plain   SQLAlchemy defaults (the behaviour before profiles existed)
+
+When DB_PROFILE is unset the profile follows the database URL scheme.
+"""
+from sqlalchemy import event, inspect, text
+from sqlalchemy.exc import IntegrityError
+
+PROFILES = ('sqlite', 'server', 'plain')
+
+
+def profile_for(app):
+    profile = app.config.get('DB_PROFILE')
+    if profile:
+        if profile not in PROFILES:
+            raise ValueError(f"Unknown DB_PROFILE {profile!r}, expected one of {', '.join(PROFILES)}")
+        return profile
+    return 'sqlite' if app.config['SQLALCHEMY_DATABASE_URI'].startswith('sqlite') else 'server'
+
+
+def configure_engine(app):
+    """Fill in SQLALCHEMY_ENGINE_OPTIONS for the selected profile. Call before db.init_app"""
+    profile = profile_for(app)
+    options = dict(app.config.get('SQLALCHEMY_ENGINE_OPTIONS') or {})
+
+    if profile == 'sqlite':
+        connect_args = dict(options.get('connect_args') or {})
+        connect_args.setdefault('timeout', app.config['SQLITE_BUSY_TIMEOUT_MS'] / 1000)
+        options['connect_args'] = connect_args
+    elif profile == 'server':
+        options.setdefault('pool_size', app.config['DB_POOL_SIZE'])
+        options.setdefault('max_overflow', app.config['DB_MAX_OVERFLOW'])
+        options.setdefault('pool_timeout', app.config['DB_POOL_TIMEOUT'])
+        options.setdefault('pool_recycle', app.config['DB_POOL_RECYCLE'])
+        options.setdefault('pool_pre_ping', True)
+
+    app.config['SQLALCHEMY_ENGINE_OPTIONS'] = options
+    app.config['DB_PROFILE'] = profile
+    return profile
+
+
+def install_pragmas(app, engine):
+    """Set the sqlite profile's pragmas on each new connection of engine"""
+    if app.config['DB_PROFILE'] != 'sqlite' or engine.dialect.name != 'sqlite':
+        return
+
+    pragmas = (
+        ('journal_mode', 'WAL'),
+        ('synchronous', 'NORMAL'),
+        ('busy_timeout', app.config['SQLITE_BUSY_TIMEOUT_MS']),
+        ('mmap_size', app.config['SQLITE_MMAP_SIZE']),
+        ('cache_size', app.config['SQLITE_CACHE_SIZE']),
+    )
+
+    def set_pragmas(dbapi_connection, connection_record):
+        cursor = dbapi_connection.cursor()
+        for name, value in pragmas:
+            cursor.execute(f"PRAGMA {name}={value}")
+        cursor.close()
+
+    event.listen(engine, 'connect', set_pragmas)
+
+
+def create_missing_indexes(engine, metadata):
+    """
+    create_all skips tables that already exist, so add indexes declared on them since.
+    Raises RuntimeError if a unique index cannot be created because existing rows break it:
+    the code relies on those indexes, so starting without one would let the duplicates grow.
+    """
+    for table in metadata.sorted_tables:
+        for index in table.indexes:
+            try:
+                index.create(engine, checkfirst=True)
+            except IntegrityError as e:
+                columns = ', '.join(column.name for column in index.columns)
+                raise RuntimeError(
+                    f"Cannot create unique index {index.name}: table {table.name} has rows with the same "
+                    f"({columns}). Remove or rename the duplicates, then start the app again."
+                ) from e
+
+
+def add_missing_columns(engine, metadata):
+    """
+    create_all skips tables that already exist, so add columns declared on them since.
+    Only nullable columns can be added this way; a missing NOT NULL column raises RuntimeError.
+    """
+    inspector = inspect(engine)
+    quote = engine.dialect.identifier_preparer.quote
+    with engine.begin() as conn:
+        for table in metadata.sorted_tables:
+            if not inspector.has_table(table.name):
+                continue
+            existing = {column['name'] for column in inspector.get_columns(table.name)}
+            for column in table.columns:
+                if column.name in existing:
+                    continue
+                if not column.nullable:
+                    raise RuntimeError(f"Cannot add NOT NULL column {column.name} to existing table {table.name}")
+                conn.execute(text(f"ALTER TABLE {quote(table.name)} ADD COLUMN {quote(column.name)} "
+                                  f"{column.type.compile(dialect=engine.dialect)}"))
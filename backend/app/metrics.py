@@ -0,0 +1,215 @@
+# convolute/backend/app/metrics.py
+
+"""
+In-process metrics exposed in Prometheus text format at /metrics.
+
+Records latency histograms per Flask route and per Socket.IO event,
+SQLAlchemy query counts and durations per request, emit counts per event
+and gauges for connected sockets and active sessions. Recording is a few
+dict operations under a lock, so it is cheap enough for every hot path.
+"""
+import bisect
+import functools
+import threading
+import time
+from flask import Response, g, has_app_context, request
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+
+LATENCY_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+COUNT_BUCKETS = (0, 1, 2, 5, 10, 20, 50, 100, 200, 500, 1000)
+
+
+def _format_labels(names, values, extra=''):
+    parts = [f'{name}="{_escape(value)}"' for name, value in zip(names, values)]
+    if extra:
+        parts.append(extra)
+    return '{' + ','.join(parts) + '}' if parts else ''
+
+
+def _escape(value):
+    return str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+
+class Counter:
+    type = 'counter'
+
+    def __init__(self, name, help, labels=()):
+        self.name, self.help, self.labels = name, help, labels
+        self._values = {}
+        self._lock = threading.Lock()
+
+    def inc(self, *label_values, amount=1):
+        with self._lock:
+            self._values[label_values] = self._values.get(label_values, 0) + amount
+
+    def samples(self):
+        with self._lock:
+            items = list(self._values.items())
+        for label_values, value in items:
+            yield f'{self.name}_total{_format_labels(self.labels, label_values)} {value}'
+
+
+class Histogram:
+    type = 'histogram'
+
+    def __init__(self, name, help, labels=(), buckets=LATENCY_BUCKETS):
+        self.name, self.help, self.labels, self.buckets = name, help, labels, buckets
+        self._values = {}   # label values -> [bucket counts..., sum, count]
+        self._lock = threading.Lock()
+
+    def observe(self, value, *label_values):
+        index = bisect.bisect_left(self.buckets, value)
+        with self._lock:
+            series = self._values.get(label_values)
+            if series is None:
+                series = self._values[label_values] = [0] * (len(self.buckets) + 2)
+            if index < len(self.buckets):
+                series[index] += 1
+            series[-2] += value
+            series[-1] += 1
+
+    def samples(self):
+        with self._lock:
+            items = [(label_values, list(series)) for label_values, series in self._values.items()]
+        for label_values, series in items:
+            cumulative = 0
+            for bound, count in zip(self.buckets, series):
+                cumulative += count
+                labels = _format_labels(self.labels, label_values, 'le="%s"' % bound)
+                yield f'{self.name}_bucket{labels} {cumulative}'
+            labels = _format_labels(self.labels, label_values, 'le="+Inf"')
+            yield f'{self.name}_bucket{labels} {series[-1]}'
+            yield f'{self.name}_sum{_format_labels(self.labels, label_values)} {series[-2]}'
+            yield f'{self.name}_count{_format_labels(self.labels, label_values)} {series[-1]}'
+
+
+class Gauge:
+    """Gauge whose value is read from a callback at scrape time"""
+    type = 'gauge'
+
+    def __init__(self, name, help, read):
+        self.name, self.help, self.read = name, help, read
+
+    def samples(self):
+        yield f'{self.name} {self.read()}'
+
+
+class Metrics:
+    def __init__(self):
+        self._metrics = []
+        self.http_latency = self._add(Histogram(
+            'convolute_http_request_duration_seconds', 'Flask request latency by route',
+            ('route', 'method', 'status')))
+        self.http_exceptions = self._add(Counter(
+            'convolute_http_exceptions', 'Flask requests ended by an unhandled exception',
+            ('route', 'method', 'exception')))
+        self.socket_latency = self._add(Histogram(
+            'convolute_socketio_event_duration_seconds', 'Socket.IO event handler latency', ('event',)))
+        self.db_queries = self._add(Histogram(
+            'convolute_db_queries_per_request', 'SQL statements per request or socket event',
+            ('route',), buckets=COUNT_BUCKETS))
+        self.db_time = self._add(Histogram(
+            'convolute_db_time_per_request_seconds', 'Total SQL time per request or socket event', ('route',)))
+        self.db_query_latency = self._add(Histogram(
+            'convolute_db_query_duration_seconds', 'Latency of individual SQL statements'))
+        self.emits = self._add(Counter(
+            'convolute_socketio_emits', 'Socket.IO emits by event', ('event',)))
+        self.fanout_latency = self._add(Histogram(
+            'convolute_fanout_batch_duration_seconds', 'Time to emit one fan-out batch'))
+        self.fanout_queued = self._add(Histogram(
+            'convolute_fanout_queue_seconds', 'Time a fan-out batch waited before emitting started'))
+        self._socketio = None
+        self._add(Gauge('convolute_connected_sockets', 'Open Engine.IO connections',
+                        lambda: len(self._socketio.server.eio.sockets) if self._socketio else 0))
+        self._add(Gauge('convolute_present_students', 'Students with a connected socket',
+                        lambda: self._presence_counts()['students']))
+        self._add(Gauge('convolute_active_sessions', 'Sessions with at least one connected student',
+                        lambda: self._presence_counts()['sessions']))
+
+    def _add(self, metric):
+        self._metrics.append(metric)
+        return metric
+
+    def init_app(self, app, socketio):
+        self._socketio = socketio
+        app.before_request(self._start_request)
+        app.after_request(self._response_status)
+        app.teardown_request(self._finish_request)
+        app.add_url_rule('/metrics', 'metrics', self.render)
+
+        # Every emit (handlers, notifications, fan-out) goes through the server
+        server_emit = socketio.server.emit
+
+        @functools.wraps(server_emit)
+        def counting_emit(event, *args, **kwargs):
+            self.emits.inc(event)
+            return server_emit(event, *args, **kwargs)
+        socketio.server.emit = counting_emit
+
+        if not event.contains(Engine, 'before_cursor_execute', self._before_cursor_execute):
+            event.listen(Engine, 'before_cursor_execute', self._before_cursor_execute)
+            event.listen(Engine, 'after_cursor_execute', self._after_cursor_execute)
+
+    def timed_event(self, name, handler):
+        """Wrap a Socket.IO handler to record its latency and query counts"""
+        @functools.wraps(handler)
+        def wrapper(*args):
+            self._start_request()
+            try:
+                return handler(*args)
+            finally:
+                self.socket_latency.observe(time.perf_counter() - g._metrics_started, name)
+                self._observe_queries(f'socket:{name}')
+        return wrapper
+
+    def render(self):
+        lines = []
+        for metric in self._metrics:
+            lines.append(f'# HELP {metric.name} {metric.help}')
+            lines.append(f'# TYPE {metric.name} {metric.type}')
+            lines.extend(metric.samples())
+        return Response('\n'.join(lines) + '\n', mimetype='text/plain; version=0.0.4')
+
+    @staticmethod
+    def _presence_counts():
+        from .socket_events.presence import presence
+        return presence.counts()
+
+    def _start_request(self):
+        g._metrics_started = time.perf_counter()
+        g._metrics_queries = 0
+        g._metrics_query_time = 0.0
+
+    @staticmethod
+    def _response_status(response):
+        g._metrics_status = response.status_code
+        return response
+
+    def _finish_request(self, exc):
+        """Record the request at teardown, which also runs when the view raised (counted as a 500)"""
+        started = g.get('_metrics_started')
+        if started is not None and request.endpoint != 'metrics':
+            route = request.url_rule.rule if request.url_rule else 'unmatched'
+            status = 500 if exc is not None else g.get('_metrics_status', 500)
+            self.http_latency.observe(time.perf_counter() - started, route, request.method, status)
+            self._observe_queries(route)
+            if exc is not None:
+                self.http_exceptions.inc(route, request.method, type(exc).__name__)
+
+    def _observe_queries(self, route):
+        self.db_queries.observe(g._metrics_queries, route)
+        self.db_time.observe(g._metrics_query_time, route)
+
+    def _before_cursor_execute(self, conn, cursor, statement, parameters, context, executemany):
+        conn.info.setdefault('_metrics_started', []).append(time.perf_counter())
+
+    def _after_cursor_execute(self, conn, cursor, statement, parameters, context, executemany):
+        elapsed = time.perf_counter() - conn.info['_metrics_started'].pop()
+        self.db_query_latency.observe(elapsed)
+        if has_app_context() and '_metrics_queries' in g:
+            g._metrics_queries += 1
+            g._metrics_query_time += elapsed
+
+
+metrics = Metrics()
@@ -18,6 +18,9 @@ class Session(db.Model):
     end_time = db.Column(db.DateTime, nullable=True)
     student_count = db.Column(db.Integer, default=0)    # total number of students who have been in session
 
+    # Instructor session listing pages through (instructor_id, id) newest first
+    __table_args__ = (db.Index('ix_session_instructor_id', 'instructor_id', 'id'),)
+
 
 class Keyword(db.Model):
     id = db.Column(db.Integer, primary_key=True)
@@ -35,6 +38,9 @@ class Student(db.Model):
     session_id = db.Column(db.Integer, db.ForeignKey("session.id"))
     round_count = db.Column(db.Integer, default=0)  # rounds student has participated in
 
+    # A name joins a session once; also serves lookups of a session's students
+    __table_args__ = (db.Index('ux_student_session_name', 'session_id', 'name', unique=True),)
+
 
 class Pairing(db.Model):
     id = db.Column(db.Integer, primary_key=True)
@@ -56,6 +62,19 @@ class Tag(db.Model):
     public = db.Column(db.Boolean, default=True, nullable=False)
 
 
+class PromptSignature(db.Model):
+    __tablename__ = 'prompt_signatures'
+    prompt_id = db.Column(db.Integer, db.ForeignKey('prompt.id'), primary_key=True)
+    signature = db.Column(db.LargeBinary, nullable=False)   # packed MinHash signature (see prompts/near_duplicates.py)
+    near_duplicate_of = db.Column(db.Integer, db.ForeignKey('prompt.id'), nullable=True)    # flagged at import
+
+
+class PromptBucket(db.Model):
+    __tablename__ = 'prompt_lsh_buckets'
+    bucket = db.Column(db.BigInteger, primary_key=True)    # LSH band key of the prompt's signature
+    prompt_id = db.Column(db.Integer, db.ForeignKey('prompt.id'), primary_key=True)
+
+
 class PromptTag(db.Model):
     __tablename__ = 'prompt_tags'
     prompt_id = db.Column(db.Integer, db.ForeignKey('prompt.id'), primary_key=True)
@@ -71,3 +90,65 @@ class PromptPointer(db.Model):
     
     # Unique constraint to ensure one pointer per session-tag combination
     __table_args__ = (db.UniqueConstraint('session_id', 'tag_filter', name='unique_session_tag_pointer'),)
+
+
+class RoundState(db.Model):
+    __tablename__ = 'round_states'
+    id = db.Column(db.Integer, primary_key=True)
+    session_id = db.Column(db.Integer, db.ForeignKey('session.id'), nullable=False, unique=True)
+    round_number = db.Column(db.Integer, nullable=False)
+    pairing_objects = db.Column(db.Text, nullable=False)  # JSON string: pairing objects sent to the instructor
+    phase = db.Column(db.String(10), nullable=True)       # 'pairing' (or NULL) until discussion begins, then 'talking'
+
+
+class SessionStats(db.Model):
+    __tablename__ = 'session_stats'
+    session_id = db.Column(db.Integer, db.ForeignKey('session.id'), primary_key=True)
+    rounds = db.Column(db.Integer, default=0, nullable=False)    # rounds of pairings created
+
+
+class StudentStats(db.Model):
+    __tablename__ = 'student_stats'
+    id = db.Column(db.Integer, primary_key=True)
+    session_id = db.Column(db.Integer, db.ForeignKey('session.id'), nullable=False)
+    student_id = db.Column(db.Integer, nullable=False)   # kept after the student row is deleted
+    name = db.Column(db.String(100), nullable=False)
+    rounds = db.Column(db.Integer, default=0, nullable=False)
+    breaks = db.Column(db.Integer, default=0, nullable=False)    # rounds without a partner
+    partners = db.Column(db.Integer, default=0, nullable=False)  # distinct students paired with
+
+    __table_args__ = (db.UniqueConstraint('session_id', 'student_id', name='unique_session_student_stats'),)
+
+
+class PartnerPair(db.Model):
+    __tablename__ = 'partner_pairs'
+    session_id = db.Column(db.Integer, db.ForeignKey('session.id'), primary_key=True)
+    student_a = db.Column(db.Integer, primary_key=True)  # lower student id of the pair
+    student_b = db.Column(db.Integer, primary_key=True)
+
+
+class FilterStats(db.Model):
+    __tablename__ = 'filter_stats'
+    session_id = db.Column(db.Integer, db.ForeignKey('session.id'), primary_key=True)
+    tag_filter = db.Column(db.String(50), primary_key=True)
+    prompts_served = db.Column(db.Integer, default=0, nullable=False)
+
+
+class DealtPrompt(db.Model):
+    __tablename__ = 'dealt_prompts'
+    id = db.Column(db.Integer, primary_key=True)
+    session_id = db.Column(db.Integer, db.ForeignKey('session.id'), nullable=False)
+    round_number = db.Column(db.Integer, nullable=False)
+    leader_id = db.Column(db.Integer, nullable=False)   # student who received the prompt
+    prompt = db.Column(db.Text, nullable=False)
+
+    __table_args__ = (db.Index('ix_dealt_prompts_session_round', 'session_id', 'round_number'),)
+
+
+class Checkpoint(db.Model):
+    __tablename__ = 'checkpoints'
+    kind = db.Column(db.String(20), primary_key=True)   # which in-memory store the state belongs to (see checkpoints.py)
+    key = db.Column(db.String(100), primary_key=True)   # usually the session keyword
+    data = db.Column(db.Text, nullable=False)           # JSON string: the store's state for the key
+    owner = db.Column(db.String(100), nullable=True)    # worker that holds the state; only it writes or deletes the row
+    lease_until = db.Column(db.Float, nullable=True)    # epoch seconds; once past, another worker may claim the row
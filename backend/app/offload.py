@@ -0,0 +1,79 @@
+# convolute/backend/app/offload.py
+
+"""
+Run blocking work off the event loop.
+
+Under gevent every socket on a worker shares one OS thread, so a blocking
+call (SQLite I/O, slow KDFs) stalls them all. Work passed through run()
+executes on a bounded pool of real threads while the calling greenlet
+waits. Socket emits must happen on the event loop thread, so code in the
+pool hands them back with call_soon(). In threading mode each request
+already has its own thread and everything runs inline.
+"""
+import contextvars
+import functools
+from flask import request
+
+
+class Offloader:
+    def __init__(self):
+        self.async_mode = 'threading'
+        self.size = 0
+        self._pool = None
+        self._loop = None
+        self._loop_thread = None
+        self._get_ident = None
+
+    def init_app(self, app, async_mode):
+        self.async_mode = async_mode
+        self.size = app.config.get('DB_THREADPOOL_SIZE', 10)
+
+        if async_mode == 'gevent':
+            import gevent
+            from gevent.monkey import get_original
+            from gevent.threadpool import ThreadPool
+            self._pool = ThreadPool(self.size)
+            self._loop = gevent.get_hub().loop
+            self._get_ident = get_original('threading', 'get_ident')
+            self._loop_thread = self._get_ident()
+        else:
+            self._pool = None
+
+    def run(self, fn, *args, **kwargs):
+        """Call fn with the caller's app/request context, on the pool if there is one"""
+        if self._pool is None:
+            return fn(*args, **kwargs)
+
+        context = contextvars.copy_context()
+        return self._pool.apply(context.run, (fn,) + args, kwargs)
+
+    def call_soon(self, fn, *args):
+        """Run fn on the event loop thread: now if already there, otherwise as soon as the loop gets to it"""
+        if self._pool is None or self._get_ident() == self._loop_thread:
+            fn(*args)
+        else:
+            self._loop.run_callback_threadsafe(fn, *args)
+
+    def wrap(self, fn):
+        """Decorate a view so its body runs through run()"""
+        @functools.wraps(fn)
+        def wrapper(*args, **kwargs):
+            # The client socket belongs to the event loop; buffer the body here so the view can parse it
+            request.get_data(cache=True)
+            return self.run(fn, *args, **kwargs)
+        return wrapper
+
+    def inline(self, view):
+        """Mark a view that stays on the event loop and passes its own blocking work to run(), so it is not wrapped"""
+        view.offload_inline = True
+        return view
+
+    def on_loop(self, fn):
+        """Decorate a fire-and-forget function (e.g. a socket notification) so it runs through call_soon()"""
+        @functools.wraps(fn)
+        def wrapper(*args):
+            self.call_soon(fn, *args)
+        return wrapper
+
+
+offload = Offloader()
@@ -1,14 +1,150 @@
 # File: monolith_app/app/prompts/client.py
 
+"""
+Client for the external prompt service (PROMPT_SERVICE_URL).
+
+Requests share one pooled session and have strict connect/read timeouts.
+After PROMPT_SERVICE_FAILURE_THRESHOLD consecutive failures a circuit
+breaker opens and calls go straight to the in-process PromptService for
+PROMPT_SERVICE_RESET_SECONDS, after which a single trial request decides
+whether the service is back.
+
+Service contract: GET <url>?category=<tag> returns {"text": "..."};
+adding count=<n> returns {"texts": ["...", ...]}. The service answers at
+most PROMPT_SERVICE_MAX_COUNT prompts per request, so larger counts are
+split into several requests. The local fallback fetches however many
+prompts are missing with a few queries rather than one per prompt.
+"""
+import threading
+import time
 import requests
+from requests.adapters import HTTPAdapter
 from flask import current_app
 
+
+class CircuitBreaker:
+    def __init__(self, failure_threshold=3, reset_seconds=30):
+        self.failure_threshold = failure_threshold
+        self.reset_seconds = reset_seconds
+        self.failures = 0
+        self.opened_at = None
+        self._trial_running = False
+        self._lock = threading.Lock()
+
+    @property
+    def state(self):
+        if self.opened_at is None:
+            return 'closed'
+        if time.monotonic() - self.opened_at >= self.reset_seconds:
+            return 'half-open'
+        return 'open'
+
+    def allow(self):
+        """Whether a request may go to the service now"""
+        with self._lock:
+            state = self.state
+            if state == 'closed':
+                return True
+            if state == 'half-open' and not self._trial_running:
+                self._trial_running = True
+                return True
+            return False
+
+    def record_success(self):
+        with self._lock:
+            self.failures = 0
+            self.opened_at = None
+            self._trial_running = False
+
+    def record_failure(self):
+        with self._lock:
+            self.failures += 1
+            self._trial_running = False
+            if self.failures >= self.failure_threshold:
+                self.opened_at = time.monotonic()
+
+
+class PromptClient:
+    def __init__(self, url, connect_timeout=0.5, read_timeout=1.0, pool_size=10,
+                 failure_threshold=3, reset_seconds=30, max_count=100):
+        self.url = url
+        self.max_count = max_count
+        self.timeout = (connect_timeout, read_timeout)
+        self.breaker = CircuitBreaker(failure_threshold, reset_seconds)
+        self.session = requests.Session()
+        adapter = HTTPAdapter(pool_connections=1, pool_maxsize=pool_size, max_retries=0)
+        self.session.mount('http://', adapter)
+        self.session.mount('https://', adapter)
+
+    @classmethod
+    def from_config(cls, config):
+        return cls(
+            config['PROMPT_SERVICE_URL'],
+            connect_timeout=config.get('PROMPT_SERVICE_CONNECT_TIMEOUT', 0.5),
+            read_timeout=config.get('PROMPT_SERVICE_READ_TIMEOUT', 1.0),
+            pool_size=config.get('PROMPT_SERVICE_POOL_SIZE', 10),
+            failure_threshold=config.get('PROMPT_SERVICE_FAILURE_THRESHOLD', 3),
+            reset_seconds=config.get('PROMPT_SERVICE_RESET_SECONDS', 30),
+            max_count=config.get('PROMPT_SERVICE_MAX_COUNT', 100)
+        )
+
+    def get_prompts(self, count, category=None):
+        """
+        Fetch count prompts in requests of at most max_count, falling back to the local database
+        for whatever the service did not supply
+        """
+        if count <= 0:
+            return []
+
+        texts = []
+        while len(texts) < count and self.breaker.allow():
+            wanted = min(count - len(texts), self.max_count)
+            params = {"count": wanted}
+            if category:
+                params["category"] = category
+            try:
+                resp = self.session.get(self.url, params=params, timeout=self.timeout)
+                resp.raise_for_status()
+                batch = resp.json()["texts"]
+                self.breaker.record_success()
+            except (requests.RequestException, ValueError, KeyError, TypeError):
+                self.breaker.record_failure()
+                break
+            texts.extend(batch[:wanted])
+            if len(batch) < wanted:
+                break    # the service has no more to give; the rest comes from the database
+
+        if len(texts) < count:
+            texts.extend(self._local_prompts(count - len(texts), category))
+        return texts
+
+    @staticmethod
+    def _local_prompts(count, category):
+        """Prompts from the in-process PromptService, fetched together"""
+        from ..services.prompt_service import PromptService
+
+        texts = PromptService.get_prompts_by_tags([category] if category else [], count)
+        return texts or ["No prompt available."] * count
+
+
+_clients = {}
+_clients_lock = threading.Lock()
+
+
+def _client():
+    """The PromptClient for the current app, created on first use"""
+    app = current_app._get_current_object()
+    client = _clients.get(app)
+    if client is None:
+        with _clients_lock:
+            client = _clients.setdefault(app, PromptClient.from_config(app.config))
+    return client
+
+
+def get_random_prompts(count, category=None):
+    """Get count prompts with a single service request"""
+    return _client().get_prompts(count, category)
+
+
 def get_random_prompt(category=None):
-    try:
-        params = {"category": category} if category else {}
-        resp = requests.get(current_app.config["PROMPT_SERVICE_URL"], params=params)
-        if resp.status_code == 200:
-            return resp.json()["text"]
-        return "No prompt available."
-    except Exception as e:
-        return "Prompt service error."
+    return get_random_prompts(1, category)[0]
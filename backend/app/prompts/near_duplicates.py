@@ -0,0 +1,140 @@
+# convolute/backend/app/prompts/near_duplicates.py
+
+"""
+MinHash signatures and LSH banding for near-duplicate prompts.
+
+A prompt is normalized (lowercase, curly quotes straightened, common
+contractions expanded, punctuation dropped) and cut into overlapping
+character 5-grams. Its signature keeps, for each of NUM_PERM hash
+functions, the smallest hash of any shingle. The share of positions where
+two signatures agree estimates the Jaccard similarity of their shingle
+sets, so "What's the first thing you do after waking up?" and "What is
+the first thing you do after waking up" compare as equal.
+
+Shingles also match across a single changed word: "Do you usually take a
+shower before work?" and "... before bed?" score about 0.85. Near-duplicates
+are therefore only merged when word_similarity(), the Jaccard similarity of
+the two prompts' normalized word sets, also reaches the threshold; that one
+changed word drops it to 0.78.
+
+The signature is cut into BANDS bands of ROWS values, and each band is
+hashed into a bucket key. Prompts that share a bucket are candidates, and
+similarity() then decides. With 20 bands of 5 rows, a pair at similarity
+0.75 shares a bucket 99.5% of the time (one at 0.9 all but always) and one
+at 0.3 only 5% of the time. Only the MAX_CANDIDATES candidates sharing the
+most buckets are compared, so a templated pack whose prompts all share some
+buckets still costs a bounded amount of work per prompt. Finding the near-duplicates of n new
+prompts therefore costs n lookups instead of comparing every pair.
+
+Signatures and bucket keys are stored with the prompts (prompt_signatures,
+prompt_lsh_buckets) and must come out the same in every process and
+release: the hash functions are fixed by SEED, and shingles are hashed
+with crc32 rather than hash(). Changing NUM_PERM, BANDS, ROWS or SEED
+means deleting both tables so they are rebuilt.
+"""
+import collections
+import hashlib
+import operator
+import random
+import re
+import struct
+import zlib
+
+NUM_PERM = 100
+BANDS = 20
+ROWS = 5
+SHINGLE = 5
+SEED = 20240611
+MAX_CANDIDATES = 10
+
+_PRIME = (1 << 61) - 1
+_MAX_HASH = (1 << 32) - 1
+_rng = random.Random(SEED)
+_PERMUTATIONS = [(_rng.randrange(1, _PRIME), _rng.randrange(0, _PRIME)) for _ in range(NUM_PERM)]
+_PACK = struct.Struct(f'<{NUM_PERM}I')
+
+_CONTRACTIONS = (
+    (re.compile(r"\b(what|where|who|how|that|it|there|here)'s\b"), r'\1 is'),
+    (re.compile(r"n't\b"), ' not'),
+    (re.compile(r"'re\b"), ' are'),
+    (re.compile(r"'ve\b"), ' have'),
+    (re.compile(r"'ll\b"), ' will'),
+    (re.compile(r"'d\b"), ' would'),
+    (re.compile(r"\bi'm\b"), 'i am'),
+)
+_NON_WORD = re.compile(r"[^\w\s]")
+
+
+def normalize(text):
+    text = text.lower().replace('’', "'").replace('‘', "'")
+    for pattern, replacement in _CONTRACTIONS:
+        text = pattern.sub(replacement, text)
+    return ' '.join(_NON_WORD.sub(' ', text).split())
+
+
+def signature(text):
+    """MinHash signature of a prompt's text, as a tuple of NUM_PERM ints"""
+    text = normalize(text)
+    hashes = {zlib.crc32(text[i:i + SHINGLE].encode()) for i in range(max(1, len(text) - SHINGLE + 1))}
+    return tuple(min((a * h + b) % _PRIME for h in hashes) & _MAX_HASH for a, b in _PERMUTATIONS)
+
+
+def similarity(a, b):
+    """Estimated Jaccard similarity of the shingle sets behind two signatures"""
+    return sum(map(operator.eq, a, b)) / NUM_PERM
+
+
+def word_similarity(a, b):
+    """Jaccard similarity of the normalized word sets of two prompt texts"""
+    a, b = set(normalize(a).split()), set(normalize(b).split())
+    return len(a & b) / len(a | b) if a | b else 1.0
+
+
+def band_keys(sig):
+    """The signature's BANDS bucket keys, as signed 64-bit ints so every database can store them"""
+    packed = _PACK.pack(*sig)
+    keys = []
+    for band in range(BANDS):
+        digest = hashlib.blake2b(bytes([band]) + packed[band * ROWS * 4:(band + 1) * ROWS * 4], digest_size=8).digest()
+        keys.append(int.from_bytes(digest, 'little', signed=True))
+    return keys
+
+
+def best_match(sig, shared, signatures, threshold):
+    """
+    (key, similarity) of the most similar candidate at or above threshold, or None.
+    shared counts the buckets each candidate key shares with sig; signatures maps keys to signatures.
+    """
+    best = None
+    for key, _ in shared.most_common(MAX_CANDIDATES):
+        if key in signatures:
+            score = similarity(sig, signatures[key])
+            if score >= threshold and (best is None or score > best[1]):
+                best = (key, score)
+    return best
+
+
+def pack(sig):
+    return _PACK.pack(*sig)
+
+
+def unpack(data):
+    return _PACK.unpack(data)
+
+
+class LSHIndex:
+    """Bucket index in memory, for prompts that are not stored yet (earlier rows of the same import)"""
+
+    def __init__(self):
+        self._buckets = {}
+        self._signatures = {}
+
+    def add(self, key, sig):
+        self._signatures[key] = sig
+        for bucket in band_keys(sig):
+            self._buckets.setdefault(bucket, []).append(key)
+
+    def best_match(self, sig, threshold):
+        """(key, similarity) of the most similar indexed prompt at or above threshold, or None"""
+        shared = collections.Counter(key for bucket in band_keys(sig) for key in self._buckets.get(bucket, ()))
+        return best_match(sig, shared, self._signatures, threshold)
@@ -0,0 +1,130 @@
+# convolute/backend/app/prompts/pack.py
+
+"""
+Compiled prompt pack: an immutable binary file that prompt servers
+memory-map, so every process on a host shares one physical copy.
+
+Layout (little-endian):
+
+    header      magic "CVPK", version, prompt count, tag count,
+                then the file offsets of the four sections below
+    offsets     (prompt count + 1) u64 offsets into the text blob
+    text        prompt texts, UTF-8, back to back
+    tags        per tag, sorted by name: name offset (u64), name length (u32),
+                postings offset (u64), postings count (u32); names follow
+    postings    per tag, sorted u32 prompt indexes
+
+A prompt is a slice of the text blob between two offsets and a tag is a
+slice of the postings, so lookups decode only the one prompt returned.
+"""
+import mmap
+import os
+import random
+import struct
+
+MAGIC = b'CVPK'
+VERSION = 1
+HEADER = struct.Struct('<4sIII4Q')
+TAG_ENTRY = struct.Struct('<QIQI')
+
+
+def build_pack(prompts, path):
+    """
+    Write a pack to path from (text, tags) pairs. Duplicate texts are merged.
+    The file is written next to path and renamed over it, so readers never see a partial pack.
+    """
+    texts = []
+    tags_of = {}
+    for text, tags in prompts:
+        text = text.strip()
+        if not text:
+            continue
+        if text not in tags_of:
+            tags_of[text] = set()
+            texts.append(text)
+        tags_of[text].update(tag.strip() for tag in tags if tag and tag.strip())
+
+    postings = {}
+    for index, text in enumerate(texts):
+        for tag in tags_of[text]:
+            postings.setdefault(tag, []).append(index)
+    tag_names = sorted(postings)
+
+    encoded = [text.encode('utf-8') for text in texts]
+    offsets = [0]
+    for data in encoded:
+        offsets.append(offsets[-1] + len(data))
+
+    offsets_at = HEADER.size
+    text_at = offsets_at + 8 * len(offsets)
+    tags_at = text_at + offsets[-1]
+    names = [name.encode('utf-8') for name in tag_names]
+    names_at = tags_at + TAG_ENTRY.size * len(tag_names)
+    postings_at = names_at + sum(len(name) for name in names)
+
+    entries = []
+    name_offset, posting_offset = names_at, postings_at
+    for name, data in zip(tag_names, names):
+        entries.append(TAG_ENTRY.pack(name_offset, len(data), posting_offset, len(postings[name])))
+        name_offset += len(data)
+        posting_offset += 4 * len(postings[name])
+
+    tmp_path = f"{path}.tmp{os.getpid()}"
+    with open(tmp_path, 'wb') as f:
+        f.write(HEADER.pack(MAGIC, VERSION, len(texts), len(tag_names), offsets_at, text_at, tags_at, postings_at))
+        f.write(struct.pack(f'<{len(offsets)}Q', *offsets))
+        f.writelines(encoded)
+        f.writelines(entries)
+        f.writelines(names)
+        for name in tag_names:
+            f.write(struct.pack(f'<{len(postings[name])}I', *postings[name]))
+    os.replace(tmp_path, path)
+
+    return {'prompts': len(texts), 'tags': len(tag_names), 'bytes': posting_offset}
+
+
+class PromptPack:
+    """Read-only view of a pack file"""
+
+    def __init__(self, path):
+        self.path = path
+        with open(path, 'rb') as f:
+            self._mm = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+
+        magic, version, self.count, tag_count, offsets_at, self._text_at, tags_at, _ = HEADER.unpack_from(self._mm, 0)
+        if magic != MAGIC or version != VERSION:
+            raise ValueError(f"{path} is not a version {VERSION} prompt pack")
+
+        self._offsets = memoryview(self._mm)[offsets_at:offsets_at + 8 * (self.count + 1)].cast('Q')
+        self._tags = {}    # name -> postings (u32 view over the map)
+        for i in range(tag_count):
+            name_at, name_len, postings_at, postings_count = TAG_ENTRY.unpack_from(self._mm, tags_at + i * TAG_ENTRY.size)
+            name = self._mm[name_at:name_at + name_len].decode('utf-8')
+            self._tags[name] = memoryview(self._mm)[postings_at:postings_at + 4 * postings_count].cast('I')
+
+    @property
+    def tags(self):
+        return sorted(self._tags)
+
+    def has_tag(self, tag):
+        return tag in self._tags
+
+    def text(self, index):
+        start = self._text_at + self._offsets[index]
+        end = self._text_at + self._offsets[index + 1]
+        return self._mm[start:end].decode('utf-8')
+
+    def random_prompt(self, tag=None, rng=random):
+        """A random prompt, from the tag's prompts when tag is given. None if there are none"""
+        if tag is None:
+            return self.text(rng.randrange(self.count)) if self.count else None
+        postings = self._tags.get(tag)
+        if not postings:
+            return None
+        return self.text(postings[rng.randrange(len(postings))])
+
+    def close(self):
+        self._offsets.release()
+        for postings in self._tags.values():
+            postings.release()
+        self._mm.close()
@@ -0,0 +1,157 @@
+# convolute/backend/app/query_budget.py
+
+"""
+Per-request SQL statement budgets.
+
+Every Flask request and Socket.IO event records how many statements it ran
+and how often each statement shape ran (the SQL with its parameter lists
+collapsed, so "WHERE id IN (?, ?)" and "WHERE id IN (?, ?, ?)" count as
+one shape). A view or handler declares what it may run with @budget(n);
+the rest get QUERY_BUDGET_DEFAULT. A request over its budget is logged
+with its most repeated shapes, which is where a query in a loop shows up:
+
+    POST /api/session/<keyword>/end ran 48 statements (budget 15)
+      40x DELETE FROM student WHERE student.id = ?
+
+assert_within_budget() runs a request through a test client and raises
+AssertionError with the same report, for tests that pin an endpoint to its
+declared budget.
+"""
+import collections
+import contextlib
+import contextvars
+import functools
+import logging
+import re
+from flask import current_app, g, has_app_context, request
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+
+logger = logging.getLogger(__name__)
+
+# A parenthesized list of bind parameters in any paramstyle, and a run of them (multi-row VALUES)
+_PARAMS = re.compile(r'\(\s*(?:\?|%s|%\(\w+\)s|:\w+)(?:\s*,\s*(?:\?|%s|%\(\w+\)s|:\w+))*\s*\)')
+_PARAM_ROWS = re.compile(r'\(\.\.\.\)(?:\s*,\s*\(\.\.\.\))+')
+
+# Query logs opened by recording(), seen by every statement run in the same context
+_recording = contextvars.ContextVar('query_budget_recording', default=())
+
+
+def budget(statements):
+    """Declare the most SQL statements a view or socket handler may run"""
+    def decorate(fn):
+        fn.query_budget = statements
+        return fn
+    return decorate
+
+
+def statement_shape(statement):
+    """The statement with whitespace and parameter lists collapsed"""
+    shape = _PARAMS.sub('(...)', ' '.join(statement.split()))
+    return _PARAM_ROWS.sub('(...)', shape)
+
+
+class QueryLog:
+    """Statements run in one request, socket event or recording() block"""
+
+    def __init__(self):
+        self.count = 0
+        self.shapes = collections.Counter()
+
+    def add(self, statement):
+        self.count += 1
+        self.shapes[statement_shape(statement)] += 1
+
+    def repeated(self, limit):
+        """Shapes run more than limit times, most repeated first"""
+        return [(shape, n) for shape, n in self.shapes.most_common() if n > limit]
+
+    def report(self, scope, budget, limit):
+        lines = [f"{scope} ran {self.count} statements (budget {budget})"]
+        lines.extend(f"  {n}x {shape[:200]}" for shape, n in self.repeated(limit))
+        return '\n'.join(lines)
+
+
+class QueryBudget:
+    def __init__(self):
+        self.default = 25
+        self.repeat_limit = 3
+
+    def init_app(self, app):
+        self.default = app.config.get('QUERY_BUDGET_DEFAULT', 25)
+        self.repeat_limit = app.config.get('QUERY_REPEAT_LIMIT', 3)
+        app.before_request(self._start)
+        app.after_request(self._finish_request)
+
+        if not event.contains(Engine, 'before_cursor_execute', self._before_cursor_execute):
+            event.listen(Engine, 'before_cursor_execute', self._before_cursor_execute)
+
+    def watch_event(self, name, handler):
+        """Wrap a Socket.IO handler to check its statements against its budget"""
+        @functools.wraps(handler)
+        def wrapper(*args):
+            self._start()
+            try:
+                return handler(*args)
+            finally:
+                self._check(f'socket:{name}', g._query_log, self.budget_of(handler))
+        return wrapper
+
+    def budget_of(self, fn):
+        budget = getattr(fn, 'query_budget', None)
+        return self.default if budget is None else budget
+
+    def endpoint_budget(self, app, method, path):
+        """The declared budget of the view that serves method and path"""
+        endpoint, _ = app.url_map.bind('localhost').match(path.split('?')[0], method=method)
+        return endpoint, self.budget_of(app.view_functions[endpoint])
+
+    def _start(self):
+        g._query_log = QueryLog()
+
+    def _finish_request(self, response):
+        log = g.get('_query_log')
+        if log is not None and request.endpoint in current_app.view_functions:
+            route = request.url_rule.rule if request.url_rule else request.path
+            self._check(f'{request.method} {route}', log, self.budget_of(current_app.view_functions[request.endpoint]))
+        return response
+
+    def _check(self, scope, log, budget):
+        if log.count > budget:
+            logger.warning(log.report(scope, budget, self.repeat_limit))
+
+    def _before_cursor_execute(self, conn, cursor, statement, parameters, context, executemany):
+        if has_app_context():
+            log = g.get('_query_log')
+            if log is not None:
+                log.add(statement)
+        for log in _recording.get():
+            log.add(statement)
+
+
+query_budget = QueryBudget()
+
+
+@contextlib.contextmanager
+def recording():
+    """Record every statement run in this block, including inside requests made from it"""
+    log = QueryLog()
+    token = _recording.set(_recording.get() + (log,))
+    try:
+        yield log
+    finally:
+        _recording.reset(token)
+
+
+def assert_within_budget(client, method, path, **kwargs):
+    """
+    Make a request with a Flask test client and fail if it ran more statements than its view's budget.
+    Returns the response.
+    """
+    app = client.application
+    endpoint, budget = query_budget.endpoint_budget(app, method, path)
+    with recording() as log:
+        response = client.open(path, method=method, **kwargs)
+    if log.count > budget:
+        raise AssertionError(log.report(f'{method} {path} ({endpoint})', budget, query_budget.repeat_limit))
+    return response
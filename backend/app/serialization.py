@@ -0,0 +1,93 @@
+# convolute/backend/app/serialization.py
+
+"""
+JSON encoding for REST responses, Socket.IO packets and JSON columns.
+
+Uses orjson when it is installed and the standard json module otherwise;
+both produce the same output for the types this app sends. Socket.IO
+clients that connect with auth {"encoding": "msgpack"} get fan-out payloads
+as msgpack binary attachments instead, when msgpack is installed.
+"""
+import json
+import threading
+from flask.json.provider import DefaultJSONProvider
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+try:
+    import msgpack
+except ImportError:
+    msgpack = None
+
+BACKEND = 'orjson' if orjson else 'json'
+
+
+def dumps(obj, default=None, sort_keys=False):
+    """Encode obj as a JSON string"""
+    if orjson:
+        option = orjson.OPT_NON_STR_KEYS | orjson.OPT_PASSTHROUGH_DATETIME
+        if sort_keys:
+            option |= orjson.OPT_SORT_KEYS
+        return orjson.dumps(obj, default=default, option=option).decode()
+    return json.dumps(obj, default=default, sort_keys=sort_keys, separators=(',', ':'), ensure_ascii=False)
+
+
+def loads(data):
+    """Decode a JSON string or bytes"""
+    if orjson:
+        return orjson.loads(data)
+    return json.loads(data)
+
+
+class FastJSONProvider(DefaultJSONProvider):
+    """Flask JSON provider backed by dumps/loads, keeping Flask's handling of dates, UUIDs and dataclasses"""
+
+    def dumps(self, obj, **kwargs):
+        return dumps(obj, default=self.default, sort_keys=self.sort_keys)
+
+    def loads(self, s, **kwargs):
+        return loads(s)
+
+
+class SocketJSON:
+    """json-module stand-in for python-socketio/engineio packet encoding"""
+
+    @staticmethod
+    def dumps(obj, **kwargs):
+        return dumps(obj)
+
+    @staticmethod
+    def loads(data, **kwargs):
+        return loads(data)
+
+
+class SocketCodec:
+    """Per-connection payload encoding negotiated at connect time"""
+
+    def __init__(self):
+        self._binary = set()   # sids that asked for msgpack payloads
+        self._lock = threading.Lock()
+
+    def negotiate(self, sid, auth):
+        """Record the encoding a client asked for. Returns the encoding it will get"""
+        if msgpack and isinstance(auth, dict) and auth.get('encoding') == 'msgpack':
+            with self._lock:
+                self._binary.add(sid)
+            return 'msgpack'
+        return 'json'
+
+    def forget(self, sid):
+        with self._lock:
+            self._binary.discard(sid)
+
+    def encode(self, recipient, payload):
+        """Payload to emit to a recipient: msgpack bytes for clients that negotiated it, otherwise unchanged"""
+        if recipient in self._binary:
+            return msgpack.packb(payload, use_bin_type=True)
+        return payload
+
+
+socket_codec = SocketCodec()
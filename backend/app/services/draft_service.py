@@ -0,0 +1,236 @@
+# convolute_app/app/services/draft_service.py
+
+"""
+Draft service for working out a session's next round ahead of time.
+
+Once discussion starts the instructor has nothing to do until they ask for
+the next round, so the pairings and prompts for it are planned in a
+background task and held here as an uncommitted draft. When the round is
+requested the draft is checked against a fingerprint of everything it was
+planned from and, if nothing changed, committed without planning again.
+Roster changes discard the draft and plan a new one.
+
+Drafts live in process memory; a worker that did not plan a draft (or
+lost it on restart) simply plans the round when it is requested.
+"""
+import threading
+from flask import current_app
+from sqlalchemy import func
+from ..models import Session, Pairing, PromptPointer, Prompt, Instructor
+from ..extensions import db, socketio
+from ..checkpoints import checkpoints
+from ..counters import counters
+from ..offload import offload
+from .pairing_service import PairingService
+from .prompt_service import PromptService
+from .export_service import ExportService
+from .round_state_service import RoundStateService
+
+
+class DraftService:
+    # keyword -> (generation, plan); a draft is only stored if its generation is still current
+    _drafts = {}
+    _generation = {}
+    # keyword -> prompt filter of the last committed round, used for the next draft
+    _filters = {}
+    _lock = threading.Lock()
+
+    @staticmethod
+    def plan_round(session_keyword, prompt_filter):
+        """
+        Work out the next round's pairings and pairing objects (with prompts) without writing anything.
+        Raises ValueError like PairingService.plan_pairings.
+        """
+        session = Session.query.filter_by(keyword=session_keyword).first()
+        if not session:
+            raise ValueError("Session not found")
+
+        fingerprint = DraftService._fingerprint(session, prompt_filter)
+        pairing_plan = PairingService.plan_pairings(session_keyword)
+
+        instructor_participating = fingerprint['instructor_participating']
+        prompt_count = sum(1 for a, b in pairing_plan['pairs'] if (a != 0 and b != 0) or instructor_participating)
+        prompts, _, next_index = PromptService.peek_prompts_for_filter(prompt_filter, session.id, prompt_count)
+
+        return {
+            'keyword': session_keyword,
+            'prompt_filter': prompt_filter,
+            'fingerprint': fingerprint,
+            'pairing_plan': pairing_plan,
+            'prompt_count': prompt_count,
+            'next_prompt_index': next_index,
+            'pairing_objects': DraftService._pairing_objects(pairing_plan, instructor_participating, prompts)
+        }
+
+    @staticmethod
+    def commit_round(plan):
+        """
+        Save a round planned by plan_round and make it the session's current round, in one transaction.
+        Returns the pairing objects
+        """
+        session_id = plan['pairing_plan']['session_id']
+        if plan['next_prompt_index'] is not None:
+            PromptService.advance_prompt_pointer(plan['prompt_filter'], session_id, plan['next_prompt_index'],
+                                                 plan['prompt_count'])
+        PairingService.commit_pairings(plan['pairing_plan'])
+
+        # Keep the round on the server so later phases only need the round number. save_round's commit
+        # is the only one: the pairing, counts, stats, pointer and dealt prompts are saved with the round
+        # state or not at all
+        ExportService.record_prompts(session_id, plan['pairing_objects'])
+        RoundStateService.save_round(session_id, plan['pairing_plan']['round_number'], plan['pairing_objects'])
+
+        with DraftService._lock:
+            DraftService._filters[plan['keyword']] = plan['prompt_filter']
+        checkpoints.mark('prompt_filter', plan['keyword'])
+        return plan['pairing_objects']
+
+    @staticmethod
+    def take(session_keyword, prompt_filter):
+        """
+        Remove and return the session's draft if it was planned for prompt_filter and still matches
+        the session's state, otherwise None
+        """
+        with DraftService._lock:
+            DraftService._bump(session_keyword)
+            draft = DraftService._drafts.pop(session_keyword, None)
+        if not draft:
+            return None
+
+        plan = draft[1]
+        session = Session.query.filter_by(keyword=session_keyword).first()
+        if not session or plan['fingerprint'] != DraftService._fingerprint(session, prompt_filter):
+            return None
+        return plan
+
+    @staticmethod
+    def schedule(session_keyword, prompt_filter=None):
+        """Plan the session's next round in a background task (prompt_filter defaults to the last round's)"""
+        with DraftService._lock:
+            if prompt_filter is None:
+                prompt_filter = DraftService._filters.get(session_keyword, 'general')
+            generation = DraftService._bump(session_keyword)
+            DraftService._drafts.pop(session_keyword, None)
+
+        app = current_app._get_current_object()
+        offload.call_soon(socketio.start_background_task, DraftService._build, app, session_keyword, prompt_filter,
+                          generation)
+
+    @staticmethod
+    def prompt_filter(session_keyword):
+        """Prompt filter of the session's last committed round"""
+        with DraftService._lock:
+            return DraftService._filters.get(session_keyword, 'general')
+
+    @staticmethod
+    def roster_changed(session_keyword):
+        """Discard the session's draft, planning a new one if there was one or one was being planned"""
+        with DraftService._lock:
+            pending = session_keyword in DraftService._drafts or session_keyword in DraftService._generation
+        if pending:
+            DraftService.schedule(session_keyword)
+
+    @staticmethod
+    def discard(session_keyword):
+        """Forget the session's draft and any draft being planned"""
+        with DraftService._lock:
+            DraftService._drafts.pop(session_keyword, None)
+            DraftService._generation.pop(session_keyword, None)
+            DraftService._filters.pop(session_keyword, None)
+        checkpoints.mark('prompt_filter', session_keyword)
+
+    @staticmethod
+    def _bump(session_keyword):
+        """Invalidate drafts being planned for the session. Call with _lock held"""
+        generation = DraftService._generation.get(session_keyword, 0) + 1
+        DraftService._generation[session_keyword] = generation
+        return generation
+
+    @staticmethod
+    def _build(app, session_keyword, prompt_filter, generation):
+        """Background task: plan a draft and keep it unless the session changed meanwhile"""
+        def plan():
+            with app.app_context():
+                return DraftService.plan_round(session_keyword, prompt_filter)
+
+        try:
+            draft = offload.run(plan)
+        except ValueError:
+            return    # session ended or too few students; the round request will report it
+        except Exception:
+            app.logger.exception("Planning a draft round for %s failed", session_keyword)
+            return
+
+        with DraftService._lock:
+            if DraftService._generation.get(session_keyword) == generation:
+                DraftService._drafts[session_keyword] = (generation, draft)
+
+    @staticmethod
+    def _fingerprint(session, prompt_filter):
+        """Cheap summary of everything a plan depends on; a draft is stale when it changes"""
+        student_ids = [student.id for student in PairingService.students_in_order(session.id)]
+        latest_pairing_id = db.session.query(Pairing.id).filter_by(session_id=session.id) \
+            .order_by(Pairing.round_number.desc()).limit(1).scalar()
+        pointer = PromptPointer.query.filter_by(session_id=session.id, tag_filter=prompt_filter).first()
+        pointer_index = counters.read(pointer, PromptPointer.current_index) if pointer else None
+        instructor = db.session.get(Instructor, session.instructor_id) if session.instructor_id is not None else None
+
+        return {
+            'students': student_ids,
+            'latest_pairing_id': latest_pairing_id,
+            'prompt_filter': prompt_filter,
+            'pointer_index': pointer_index,
+            'last_prompt_id': db.session.query(func.max(Prompt.id)).scalar(),
+            'instructor_participating': instructor.participating if instructor else False
+        }
+
+    @staticmethod
+    def _pairing_objects(pairing_plan, instructor_participating, prompts):
+        """Pairing objects for a planned round, dealing prompts in pair order"""
+        round_number = pairing_plan['round_number']
+        student_map = dict(pairing_plan['students'])
+        prompts = iter(prompts)
+
+        pairing_objects = []
+        for leader_id, talker_id in pairing_plan['pairs']:
+            # Handle dummy (0) pairing
+            if leader_id == 0 or talker_id == 0:
+                student_id = leader_id if leader_id != 0 else talker_id
+                student_name = student_map.get(student_id, f'Student {student_id}')
+
+                if instructor_participating:
+                    # Student paired with instructor
+                    pairing_objects.append({
+                        'round': round_number,
+                        'leaderId': student_id,
+                        'leaderName': student_name,
+                        'talkerId': 'instructor',
+                        'talkerName': 'Instructor',
+                        'prompt': next(prompts)
+                    })
+                else:
+                    # Student on break
+                    pairing_objects.append({
+                        'round': round_number,
+                        'onBreakId': student_id,
+                        'onBreakName': student_name
+                    })
+            else:
+                # Regular student-student pairing
+                pairing_objects.append({
+                    'round': round_number,
+                    'leaderId': leader_id,
+                    'leaderName': student_map.get(leader_id, f'Student {leader_id}'),
+                    'talkerId': talker_id,
+                    'talkerName': student_map.get(talker_id, f'Student {talker_id}'),
+                    'prompt': next(prompts)
+                })
+        return pairing_objects
+
+
+def _restore_prompt_filter(keyword, prompt_filter):
+    with DraftService._lock:
+        DraftService._filters[keyword] = prompt_filter
+
+
+checkpoints.register('prompt_filter', lambda keyword: DraftService._filters.get(keyword), _restore_prompt_filter)
@@ -0,0 +1,135 @@
+# convolute_app/app/services/export_service.py
+
+"""
+Export service for streaming a session's full record: roster, every round's
+pairs and roles, and the prompts dealt.
+
+Rows are read through server-side cursors in batches and written out as
+they are produced, so memory use depends on the roster size but not on
+how many rounds a session ran.
+"""
+import csv
+import io
+from ..models import Pairing, DealtPrompt, Student, StudentStats
+from ..extensions import db
+from ..serialization import dumps, loads
+
+FIELDS = ['keyword', 'record', 'round', 'student_id', 'student_name', 'role', 'partner_id', 'partner_name', 'prompt']
+FORMATS = ('csv', 'jsonl')
+BATCH_SIZE = 500
+CHUNK_SIZE = 64 * 1024  # characters buffered before a chunk is sent
+
+
+class ExportService:
+
+    @staticmethod
+    def record_prompts(session_id, pairing_objects):
+        """Keep the prompts dealt in a round for export. Adds to the current transaction; the caller commits"""
+        rows = [{
+            'session_id': session_id,
+            'round_number': pairing_obj['round'],
+            'leader_id': pairing_obj['leaderId'],
+            'prompt': pairing_obj['prompt']
+        } for pairing_obj in pairing_objects if 'prompt' in pairing_obj]
+        if rows:
+            # One executemany; the ORM would insert row by row to read back each id
+            db.session.execute(db.insert(DealtPrompt), rows)
+
+    @staticmethod
+    def stream(session, fmt):
+        """Generate the session's export as text chunks in the given format ('csv' or 'jsonl')"""
+        if fmt not in FORMATS:
+            raise ValueError(f"Unsupported export format: {fmt}")
+
+        buffer = io.StringIO()
+        if fmt == 'csv':
+            writer = csv.DictWriter(buffer, fieldnames=FIELDS)
+            writer.writeheader()
+            write = writer.writerow
+        else:
+            def write(record):
+                buffer.write(dumps(record))
+                buffer.write('\n')
+
+        for record in ExportService.iter_records(session):
+            write(record)
+            if buffer.tell() >= CHUNK_SIZE:
+                yield buffer.getvalue()
+                buffer.seek(0)
+                buffer.truncate()
+
+        if buffer.tell():
+            yield buffer.getvalue()
+
+    @staticmethod
+    def iter_records(session):
+        """Yield one record per student, then one per student per round"""
+        names = ExportService._roster(session.id)
+        for student_id, name in sorted(names.items()):
+            yield ExportService._record(session, 'student', student_id=student_id, student_name=name)
+
+        pairings = db.session.execute(
+            db.select(Pairing.round_number, Pairing.pairs)
+            .filter_by(session_id=session.id)
+            .order_by(Pairing.round_number, Pairing.id)
+            .execution_options(yield_per=BATCH_SIZE)
+        )
+        prompts = iter(db.session.execute(
+            db.select(DealtPrompt.round_number, DealtPrompt.leader_id, DealtPrompt.prompt)
+            .filter_by(session_id=session.id)
+            .order_by(DealtPrompt.round_number, DealtPrompt.id)
+            .execution_options(yield_per=BATCH_SIZE)
+        ))
+
+        # Both cursors are ordered by round, so prompts are merged in without loading either
+        pending = next(prompts, None)
+        for round_number, pairs in pairings:
+            dealt = {}
+            while pending is not None and pending.round_number <= round_number:
+                if pending.round_number == round_number:
+                    dealt[pending.leader_id] = pending.prompt
+                pending = next(prompts, None)
+
+            for leader_id, talker_id in loads(pairs):
+                yield from ExportService._pair_records(session, round_number, leader_id, talker_id, dealt, names)
+
+    @staticmethod
+    def _pair_records(session, round_number, leader_id, talker_id, dealt, names):
+        if leader_id == 0 or talker_id == 0:
+            # Paired with the dummy: with the instructor if a prompt was dealt, otherwise on break
+            student_id = leader_id or talker_id
+            if student_id in dealt:
+                yield ExportService._record(session, 'pairing', round_number, student_id, names.get(student_id),
+                                            'leader', None, 'Instructor', dealt[student_id])
+            else:
+                yield ExportService._record(session, 'pairing', round_number, student_id, names.get(student_id),
+                                            'break')
+            return
+
+        prompt = dealt.get(leader_id)
+        yield ExportService._record(session, 'pairing', round_number, leader_id, names.get(leader_id),
+                                    'leader', talker_id, names.get(talker_id), prompt)
+        yield ExportService._record(session, 'pairing', round_number, talker_id, names.get(talker_id),
+                                    'talker', leader_id, names.get(leader_id), prompt)
+
+    @staticmethod
+    def _roster(session_id):
+        """student id -> name for everyone who joined, including students removed since"""
+        names = dict(db.session.query(StudentStats.student_id, StudentStats.name).filter_by(session_id=session_id))
+        names.update(db.session.query(Student.id, Student.name).filter_by(session_id=session_id))
+        return names
+
+    @staticmethod
+    def _record(session, record, round_number=None, student_id=None, student_name=None, role=None,
+                partner_id=None, partner_name=None, prompt=None):
+        return {
+            'keyword': session.keyword,
+            'record': record,
+            'round': round_number,
+            'student_id': student_id,
+            'student_name': student_name,
+            'role': role,
+            'partner_id': partner_id,
+            'partner_name': partner_name,
+            'prompt': prompt
+        }
@@ -62,12 +62,11 @@ class KeywordService:
         ]
 
         # Add keywords to database (skip if already exists)
-        added_count = 0
-        for word in sample_keywords:
-            if not Keyword.query.filter_by(word=word).first():
-                keyword = Keyword(word=word)
-                db.session.add(keyword)
-                added_count += 1
+        existing = {word for (word,) in db.session.query(Keyword.word).filter(Keyword.word.in_(sample_keywords))}
+        new_words = [word for word in dict.fromkeys(sample_keywords) if word not in existing]
+        if new_words:
+            db.session.execute(db.insert(Keyword), [{'word': word} for word in new_words])
+        added_count = len(new_words)
 
         db.session.commit()
         
@@ -1,25 +1,35 @@
 # convolute_app/app/services/pairing_service.py
 
-import json
+from sqlalchemy import update
 from ..models import Student, Pairing, Session
 from ..extensions import db
+from ..serialization import dumps, loads
 from .prompt_service import PromptService
+from .stats_service import StatsService
 
 
 class PairingService:
-    swap_first_pair = False
-
     @staticmethod
     def create_pairings(session_keyword):
         """
         Create pairings using modified circle method.
         """
+        result = PairingService.commit_pairings(PairingService.plan_pairings(session_keyword))
+        db.session.commit()
+        return result
+
+    @staticmethod
+    def plan_pairings(session_keyword):
+        """
+        Work out the next round's pairings without writing anything.
+        Returns a plan of plain values for commit_pairings.
+        """
         session = Session.query.filter_by(keyword=session_keyword).first()
         if not session:
             raise ValueError("Session not found")
         
         # Get current students in session
-        students = Student.query.filter_by(session_id=session.id).order_by(Student.round_count).all()
+        students = PairingService.students_in_order(session.id)
 
         # Create pairing_list to generate pairs from
         pairing_list = [student.id for student in students]
@@ -37,44 +47,74 @@ class PairingService:
         # Determine next round number
         next_round = 1 if not latest_pairing else latest_pairing.round_number + 1
 
-        # Determine rotation based on previous state
-        if not latest_pairing or json.loads(latest_pairing.pairing_list) != pairing_list:
+        # Determine rotation based on previous state; the session's last round tells whether its first pair was swapped
+        swap_first_pair = swap_before = PairingService._swapped(latest_pairing) if latest_pairing else False
+        if not latest_pairing or loads(latest_pairing.pairing_list) != pairing_list:
             # First round or student list changed - use current pairing_list
             last_rotation = pairing_list
         else:
             # Same student list - rotate from previous
-            PairingService.swap_first_pair = not PairingService.swap_first_pair
-            prev_rotation = json.loads(latest_pairing.rotation)
+            swap_first_pair = not swap_first_pair
+            prev_rotation = loads(latest_pairing.rotation)
             last_rotation = [prev_rotation[0], prev_rotation[-1]] + prev_rotation[1:-1]
 
         # Generate pairings using modified circle method algorithm
-        pairings = PairingService._pair(last_rotation)
+        pairings = PairingService._pair(last_rotation, swap_first_pair)
+
+        return {
+            'session_id': session.id,
+            'students': [(student.id, student.name) for student in students],
+            'latest_pairing_id': latest_pairing.id if latest_pairing else None,
+            'round_number': next_round,
+            'pairing_list': pairing_list,
+            'rotation': last_rotation,
+            'pairs': pairings,
+            'swap_before': swap_before,
+            'swap_first_pair': swap_first_pair
+        }
 
+    @staticmethod
+    def commit_pairings(plan):
+        """Save a round planned by plan_pairings. Adds to the current transaction; the caller commits"""
         # Save pairings to database
         pairing_record = Pairing(
-            session_id=session.id,
-            round_number=next_round,
-            pairing_list=json.dumps(pairing_list),
-            rotation=json.dumps(last_rotation),
-            pairs=json.dumps(pairings)
+            session_id=plan['session_id'],
+            round_number=plan['round_number'],
+            pairing_list=dumps(plan['pairing_list']),
+            rotation=dumps(plan['rotation']),
+            pairs=dumps(plan['pairs'])
         )
         db.session.add(pairing_record)
         
-        # Update student round counts
-        for student in students:
-            student.round_count += 1
+        # Update student round counts in one statement
+        db.session.execute(
+            update(Student).where(Student.session_id == plan['session_id'])
+            .values(round_count=Student.round_count + 1)
+            .execution_options(synchronize_session=False)
+        )
 
-        
-        db.session.commit()
+        # Session analytics are counted in the same transaction
+        StatsService.record_round(plan['session_id'], plan['pairs'])
         
         return {
-            'round_number': next_round,
-            'pairs': pairings
+            'round_number': plan['round_number'],
+            'pairs': plan['pairs']
         }
     
 
     @staticmethod
-    def _pair(pairing_list):
+    def students_in_order(session_id):
+        """A session's students, fewest rounds first"""
+        return Student.query.filter_by(session_id=session_id).order_by(Student.round_count).all()
+
+    @staticmethod
+    def _swapped(pairing):
+        """Whether a stored round's first pair was swapped (its rotation's last student leads)"""
+        rotation, pairs = loads(pairing.rotation), loads(pairing.pairs)
+        return list(pairs[0]) == [rotation[-1], rotation[0]]
+
+    @staticmethod
+    def _pair(pairing_list, swap_first_pair=False):
         """
         Modified circle method pairing algorithm to generate pairs from even lists.
         """
@@ -82,7 +122,7 @@ class PairingService:
         list_len = len(pairing_list)
 
         for i in range(list_len // 2):
-            if i == 0 and PairingService.swap_first_pair:
+            if i == 0 and swap_first_pair:
                 pair = pairing_list[list_len - i - 1], pairing_list[i]
             else:
                 pair = pairing_list[i], pairing_list[list_len - i - 1]
@@ -100,7 +140,7 @@ class PairingService:
         
         result = []
         for pairing in pairings:
-            pairs_data = json.loads(pairing.pairs)
+            pairs_data = loads(pairing.pairs)
             result.append({
                 'round_number': pairing.round_number,
                 'pairs': pairs_data
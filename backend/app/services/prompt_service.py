@@ -1,8 +1,15 @@
 # convolute_app/app/services/prompt_service.py
 
+import collections
 import random
-from ..models import Prompt, Tag, PromptTag, PromptPointer, Session
+from flask import current_app
+from ..models import Prompt, Tag, PromptTag, PromptPointer, PromptSignature, PromptBucket, Session
+from ..prompts import near_duplicates
 from ..extensions import db
+from ..counters import counters
+from .stats_service import StatsService
+
+NEAR_DUPLICATE_MODES = ('flag', 'merge', 'off')
 
 
 class PromptService:
@@ -52,6 +59,48 @@ class PromptService:
         # Final fallback: any random prompt
         return PromptService._get_random_prompt()
     
+    @staticmethod
+    def get_prompts_by_tags(tag_names, count):
+        """
+        Texts of count random prompts chosen like get_prompt_by_tags (a prompt may come up more than once),
+        with a fixed number of queries however large count is
+        """
+        prompt_ids = []
+        tag_ids = [tag_id for tag_id, in db.session.query(Tag.id).filter(Tag.tag.in_(tag_names))] if tag_names else []
+        if tag_ids:
+            # Prompts with all the tags, else with any of them
+            prompt_ids = [prompt_id for prompt_id, in db.session.query(PromptTag.prompt_id)
+                          .filter(PromptTag.tag_id.in_(tag_ids)).group_by(PromptTag.prompt_id)
+                          .having(db.func.count(PromptTag.tag_id) == len(tag_ids))]
+            if not prompt_ids:
+                prompt_ids = [prompt_id for prompt_id, in db.session.query(PromptTag.prompt_id)
+                              .filter(PromptTag.tag_id.in_(tag_ids)).distinct()]
+        if prompt_ids:
+            chosen = random.choices(prompt_ids, k=count)
+            texts = PromptService._select_in(Prompt.id, Prompt.prompt, set(chosen))
+            return [texts[prompt_id] for prompt_id in chosen]
+        return PromptService._random_prompt_texts(count)
+
+    @staticmethod
+    def _random_prompt_texts(count, attempts=5):
+        """
+        Texts of count random prompts from the whole table, drawn as random ids between the smallest and
+        largest; ids that were deleted are drawn again, up to attempts times, then filled in one by one
+        """
+        low, high = db.session.query(db.func.min(Prompt.id), db.func.max(Prompt.id)).one()
+        if low is None:
+            return []
+        texts = []
+        for _ in range(attempts):
+            wanted = [random.randint(low, high) for _ in range(count - len(texts))]
+            found = PromptService._select_in(Prompt.id, Prompt.prompt, set(wanted))
+            texts.extend(found[prompt_id] for prompt_id in wanted if prompt_id in found)
+            if len(texts) == count:
+                return texts
+        while len(texts) < count:
+            texts.append(PromptService._get_random_prompt().prompt)
+        return texts
+
     @staticmethod
     def _get_random_prompt():
         """Get a completely random prompt from the database."""
@@ -93,17 +142,46 @@ class PromptService:
                 current_index=0
             )
             db.session.add(pointer)
+            db.session.flush()
         
         # Get the current prompt
-        current_prompt = prompts[pointer.current_index % len(prompts)]
+        current_index = counters.read(pointer, PromptPointer.current_index)
+        current_prompt = prompts[current_index % len(prompts)]
         
-        # Advance the pointer for next time
-        pointer.current_index = (pointer.current_index + 1) % len(prompts)
+        # Advance the pointer for next time (written at commit, see counters.py)
+        counters.set(PromptPointer.current_index, pointer.id, (current_index + 1) % len(prompts))
+        StatsService.record_prompt(session.id, filter_name)
         
         db.session.commit()
         
         return current_prompt.prompt
     
+    @staticmethod
+    def peek_prompts_for_filter(filter_name, session_id, count):
+        """
+        The next count prompts get_prompt_for_filter_with_session would deal a session, without advancing its pointer.
+        Returns (texts, start_index, next_index); the indexes are None when the filter has no prompts.
+        """
+        pointer = PromptPointer.query.filter_by(session_id=session_id, tag_filter=filter_name).first()
+        start_index = counters.read(pointer, PromptPointer.current_index) if pointer else 0
+        
+        prompts = PromptService._get_prompts_for_filter_ordered(filter_name)
+        if not prompts:
+            return ["Share something interesting you learned recently."] * count, None, None
+        
+        texts = [prompts[(start_index + i) % len(prompts)].prompt for i in range(count)]
+        return texts, start_index, (start_index + count) % len(prompts)
+    
+    @staticmethod
+    def advance_prompt_pointer(filter_name, session_id, next_index, served):
+        """Move a session's pointer past prompts dealt from peek_prompts_for_filter. The caller commits"""
+        pointer = PromptPointer.query.filter_by(session_id=session_id, tag_filter=filter_name).first()
+        if not pointer:
+            db.session.add(PromptPointer(session_id=session_id, tag_filter=filter_name, current_index=next_index))
+        else:
+            counters.set(PromptPointer.current_index, pointer.id, next_index)
+        StatsService.record_prompt(session_id, filter_name, served)
+    
     @staticmethod
     def _get_prompts_for_filter_ordered(filter_name):
         """
@@ -272,19 +350,27 @@ class PromptService:
         return {"message": "Sample prompts and tags populated successfully"}
     
     @staticmethod
-    def bulk_import_prompts(prompts_data):
+    def bulk_import_prompts(prompts_data, near_duplicate_mode=None):
         """
         Bulk import prompts from a list of dictionaries.
         Each dictionary should have 'prompt' and 'tags' keys.
+        near_duplicate_mode ('flag', 'merge' or 'off', default PROMPT_NEAR_DUPLICATES) decides what happens to
+        prompts close to a stored prompt or an earlier row: imported and marked, folded into it (their tags
+        added to it) or not checked. Merging also needs their words to match; others are only marked.
         Returns import statistics.
         """
         if not isinstance(prompts_data, list):
             raise ValueError("prompts_data must be a list")
+        mode = near_duplicate_mode or current_app.config.get('PROMPT_NEAR_DUPLICATES', 'flag')
+        if mode not in NEAR_DUPLICATE_MODES:
+            raise ValueError(f"near_duplicate_mode must be one of {', '.join(NEAR_DUPLICATE_MODES)}")
         
         stats = {
             'total': len(prompts_data),
             'imported': 0,
             'skipped': 0,
+            'merged': 0,
+            'near_duplicates': [],
             'errors': []
         }
         
@@ -295,16 +381,15 @@ class PromptService:
                 all_tags.update(item['tags'])
         
         # Create missing tags
-        for tag_name in all_tags:
-            if tag_name:  # Skip empty tags
-                existing_tag = Tag.query.filter_by(tag=tag_name).first()
-                if not existing_tag:
-                    tag = Tag(tag=tag_name)
-                    db.session.add(tag)
+        existing_tags = PromptService._select_in(Tag.tag, Tag.tag, all_tags)
+        missing_tags = [tag_name for tag_name in all_tags if tag_name and tag_name not in existing_tags]
+        if missing_tags:
+            db.session.execute(db.insert(Tag), [{'tag': tag_name} for tag_name in missing_tags])
         
         db.session.commit()
         
-        # Import prompts
+        # Validate prompts, keeping the first of each text in the file
+        new_prompts = {}    # text -> tag names, in file order
         for idx, prompt_data in enumerate(prompts_data):
             try:
                 # Validate required fields
@@ -313,33 +398,75 @@ class PromptService:
                     continue
                 
                 prompt_text = prompt_data['prompt'].strip()
-                
-                # Check if prompt already exists
-                existing_prompt = Prompt.query.filter_by(prompt=prompt_text).first()
-                if existing_prompt:
+                if prompt_text in new_prompts:
                     stats['skipped'] += 1
                     continue
                 
-                # Create the prompt
-                new_prompt = Prompt(prompt=prompt_text)
-                db.session.add(new_prompt)
-                db.session.flush()  # Get the ID without committing
-                
-                # Associate tags
                 tags = prompt_data.get('tags', [])
-                if isinstance(tags, list):
-                    for tag_name in tags:
-                        if tag_name and tag_name.strip():  # Skip empty tags
-                            tag = Tag.query.filter_by(tag=tag_name.strip()).first()
-                            if tag:
-                                prompt_tag = PromptTag(prompt_id=new_prompt.id, tag_id=tag.id)
-                                db.session.add(prompt_tag)
-                
-                stats['imported'] += 1
+                new_prompts[prompt_text] = [tag_name.strip() for tag_name in tags if tag_name and tag_name.strip()] \
+                    if isinstance(tags, list) else []
                 
             except Exception as e:
                 stats['errors'].append(f"Row {idx + 1}: {str(e)}")
-                db.session.rollback()
+        
+        # Skip prompts already in the database
+        for prompt_text in PromptService._select_in(Prompt.prompt, Prompt.prompt, new_prompts):
+            del new_prompts[prompt_text]
+            stats['skipped'] += 1
+        
+        # Near-duplicates of stored prompts (by id) or of earlier rows (by text)
+        signatures, matches = {}, {}
+        if mode != 'off' and new_prompts:
+            PromptService._sign_unsigned_prompts()
+            signatures = {prompt_text: near_duplicates.signature(prompt_text) for prompt_text in new_prompts}
+            matches = PromptService._near_duplicates(signatures, current_app.config.get(
+                'PROMPT_NEAR_DUPLICATE_THRESHOLD', 0.9), merge=mode == 'merge')
+        
+        stored_texts = PromptService._select_in(Prompt.id, Prompt.prompt,
+                                                {match for match, _, _ in matches.values() if isinstance(match, int)})
+        merged_tags = {}    # stored prompt id -> tag names of the rows folded into it
+        for prompt_text, (match, score, merged) in matches.items():
+            stats['near_duplicates'].append({
+                'prompt': prompt_text,
+                'similar_to': stored_texts[match] if isinstance(match, int) else match,
+                'similarity': round(score, 2),
+                'action': 'merged' if merged else 'flagged'
+            })
+            if merged:
+                tags = new_prompts.pop(prompt_text)
+                if isinstance(match, int):
+                    merged_tags.setdefault(match, set()).update(tags)
+                else:
+                    new_prompts[match].extend(tag_name for tag_name in tags if tag_name not in new_prompts[match])
+                stats['merged'] += 1
+        
+        # Insert the rest and tag them, a statement per table rather than per prompt
+        prompt_tags = set()
+        if new_prompts:
+            db.session.execute(db.insert(Prompt), [{'prompt': prompt_text} for prompt_text in new_prompts])
+            prompt_ids = PromptService._select_in(Prompt.prompt, Prompt.id, new_prompts)
+        tag_ids = PromptService._select_in(Tag.tag, Tag.id, {t for tags in new_prompts.values() for t in tags}
+                                           | {t for tags in merged_tags.values() for t in tags})
+        if new_prompts:
+            prompt_tags = {(prompt_ids[prompt_text], tag_ids[tag_name])
+                           for prompt_text, tags in new_prompts.items() for tag_name in tags if tag_name in tag_ids}
+            stats['imported'] = len(new_prompts)
+        if merged_tags:
+            tagged = set(db.session.query(PromptTag.prompt_id, PromptTag.tag_id)
+                         .filter(PromptTag.prompt_id.in_(list(merged_tags))))
+            prompt_tags.update((prompt_id, tag_ids[tag_name]) for prompt_id, tags in merged_tags.items()
+                               for tag_name in tags if tag_name in tag_ids and (prompt_id, tag_ids[tag_name]) not in tagged)
+        if prompt_tags:
+            db.session.execute(db.insert(PromptTag), [{'prompt_id': prompt_id, 'tag_id': tag_id}
+                                                      for prompt_id, tag_id in prompt_tags])
+        
+        # Keep the new prompts' signatures so later imports compare against them without recomputing
+        if signatures and new_prompts:
+            PromptService._store_signatures(
+                {prompt_ids[prompt_text]: signatures[prompt_text] for prompt_text in new_prompts},
+                {prompt_ids[prompt_text]: match if isinstance(match, int) else prompt_ids[match]
+                 for prompt_text, (match, _, _) in matches.items() if prompt_text in new_prompts}
+            )
         
         try:
             db.session.commit()
@@ -348,3 +475,81 @@ class PromptService:
             stats['errors'].append(f"Database commit error: {str(e)}")
         
         return stats
+
+    @staticmethod
+    def _near_duplicates(signatures, threshold, merge=False):
+        """
+        {text: (stored prompt id or earlier text, similarity, merged)} for the texts (in import order) that
+        are near-duplicates of a stored prompt or of an earlier text. With merge, a text is merged (and not
+        matched against, since it will not be imported) if its words are as similar as its shingles must be;
+        merged is False for the rest.
+        """
+        # Stored prompts sharing an LSH bucket with a new one
+        texts_by_bucket = {}
+        for prompt_text, sig in signatures.items():
+            for bucket in near_duplicates.band_keys(sig):
+                texts_by_bucket.setdefault(bucket, []).append(prompt_text)
+        shared = {prompt_text: collections.Counter() for prompt_text in signatures}
+        buckets = list(texts_by_bucket)
+        for i in range(0, len(buckets), 5000):
+            for bucket, prompt_id in db.session.query(PromptBucket.bucket, PromptBucket.prompt_id) \
+                    .filter(PromptBucket.bucket.in_(buckets[i:i + 5000])):
+                for prompt_text in texts_by_bucket[bucket]:
+                    shared[prompt_text][prompt_id] += 1
+        candidate_ids = {prompt_id for counts in shared.values()
+                         for prompt_id, _ in counts.most_common(near_duplicates.MAX_CANDIDATES)}
+        stored = PromptService._select_in(PromptSignature.prompt_id, PromptSignature.signature, candidate_ids)
+        stored = {prompt_id: near_duplicates.unpack(data) for prompt_id, data in stored.items()}
+        stored_texts = PromptService._select_in(Prompt.id, Prompt.prompt, stored) if merge else {}
+        
+        matches = {}
+        earlier = near_duplicates.LSHIndex()
+        for prompt_text, sig in signatures.items():
+            best = near_duplicates.best_match(sig, shared[prompt_text], stored, threshold)
+            match = earlier.best_match(sig, threshold)
+            if match and (best is None or match[1] > best[1]):
+                best = match
+            merged = bool(best) and merge and near_duplicates.word_similarity(
+                prompt_text, stored_texts.get(best[0], best[0])) >= threshold
+            if best:
+                matches[prompt_text] = (*best, merged)
+            if not merged:
+                earlier.add(prompt_text, sig)
+        return matches
+    
+    @staticmethod
+    def _store_signatures(signatures, near_duplicate_of=None):
+        """Store {prompt id: signature} and its LSH buckets. Adds to the current transaction"""
+        near_duplicate_of = near_duplicate_of or {}
+        # Into the table rather than the model: the ORM's bulk insert starts a new statement
+        # whenever near_duplicate_of switches between None and a value
+        db.session.execute(db.insert(PromptSignature.__table__), [{
+            'prompt_id': prompt_id,
+            'signature': near_duplicates.pack(sig),
+            'near_duplicate_of': near_duplicate_of.get(prompt_id)
+        } for prompt_id, sig in signatures.items()])
+        db.session.execute(db.insert(PromptBucket), [{'bucket': bucket, 'prompt_id': prompt_id}
+                                                     for prompt_id, sig in signatures.items()
+                                                     for bucket in set(near_duplicates.band_keys(sig))])
+    
+    @staticmethod
+    def _sign_unsigned_prompts(batch_size=1000):
+        """Sign prompts stored without a signature (before signatures were kept, or by populate_sample_data)"""
+        while True:
+            rows = db.session.query(Prompt.id, Prompt.prompt) \
+                .outerjoin(PromptSignature, PromptSignature.prompt_id == Prompt.id) \
+                .filter(PromptSignature.prompt_id.is_(None)).limit(batch_size).all()
+            if rows:
+                PromptService._store_signatures({prompt_id: near_duplicates.signature(prompt_text)
+                                                 for prompt_id, prompt_text in rows})
+            if len(rows) < batch_size:
+                return
+    
+    @staticmethod
+    def _select_in(key_column, value_column, keys, chunk_size=500):
+        """{key: value} for rows whose key_column is in keys, a few hundred keys per query"""
+        keys = list(keys)
+        found = {}
+        for i in range(0, len(keys), chunk_size):
+            found.update(db.session.query(key_column, value_column).filter(key_column.in_(keys[i:i + chunk_size])))
+        return found
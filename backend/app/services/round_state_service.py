@@ -0,0 +1,120 @@
+# convolute_app/app/services/round_state_service.py
+
+"""
+Round state service for keeping the current round's pairing objects on the server.
+
+The round_state row is the source of truth. A single worker also keeps a
+copy in memory so begin-discussion does not reload it; with a message
+queue (SOCKETIO_MESSAGE_QUEUE) another worker may save or clear the round
+at any time, so every read goes to the database instead.
+
+Moving a round from pairing to talking is a compare-and-set on the row's
+phase (begin_discussion), so when a manual begin-discussion and a round
+timer, or timers on two workers, race for the same round, exactly one of
+them starts the discussion.
+"""
+import threading
+from flask import current_app
+from sqlalchemy import or_
+from ..models import RoundState
+from ..extensions import db
+from ..serialization import dumps, loads
+
+
+class RoundStateService:
+    # session_id -> (round_number, pairing_objects), single worker only; the database row is authoritative
+    _rounds = {}
+    _lock = threading.Lock()
+
+    @staticmethod
+    def save_round(session_id, round_number, pairing_objects):
+        """
+        Store the pairing objects of a session's current round, replacing the previous round.
+        Commits, together with whatever the caller added to the transaction
+        """
+        state = RoundState.query.filter_by(session_id=session_id).first()
+        if not state:
+            state = RoundState(session_id=session_id)
+            db.session.add(state)
+
+        state.round_number = round_number
+        state.pairing_objects = dumps(pairing_objects)
+        state.phase = 'pairing'
+        db.session.commit()
+
+        if RoundStateService._cached():
+            with RoundStateService._lock:
+                RoundStateService._rounds[session_id] = (round_number, pairing_objects)
+
+    @staticmethod
+    def get_round(session_id, round_number):
+        """
+        Get the pairing objects for a session's round.
+        Returns None if the round is not the session's current round.
+        """
+        current = RoundStateService._load(session_id)
+        if not current or current[0] != round_number:
+            return None
+        return current[1]
+
+    @staticmethod
+    def get_current_round(session_id):
+        """Get the current round number for a session, or None if no round is active"""
+        current = RoundStateService._load(session_id)
+        return current[0] if current else None
+
+    @staticmethod
+    def begin_discussion(session_id, round_number):
+        """
+        Move a session's current round from pairing to talking.
+        Returns True if this call did; False if the round is not current or its discussion already began.
+        """
+        moved = RoundState.query.filter(
+            RoundState.session_id == session_id,
+            RoundState.round_number == round_number,
+            or_(RoundState.phase == 'pairing', RoundState.phase.is_(None))
+        ).update({RoundState.phase: 'talking'}, synchronize_session=False)
+        db.session.commit()
+        return moved > 0
+
+    @staticmethod
+    def clear_round(session_id, round_number=None):
+        """
+        Discard a session's current round state.
+        If round_number is given, only discard it when it matches the current round.
+        Returns True if state was discarded; of several workers clearing the same round only one gets True.
+        """
+        query = RoundState.query.filter_by(session_id=session_id)
+        if round_number is not None:
+            query = query.filter_by(round_number=round_number)
+        deleted = query.delete()
+        db.session.commit()
+
+        with RoundStateService._lock:
+            RoundStateService._rounds.pop(session_id, None)
+        return deleted > 0
+
+    @staticmethod
+    def _load(session_id):
+        """Get (round_number, pairing_objects) from memory, falling back to the database"""
+        cached = RoundStateService._cached()
+        if cached:
+            with RoundStateService._lock:
+                current = RoundStateService._rounds.get(session_id)
+            if current:
+                return current
+
+        state = RoundState.query.filter_by(session_id=session_id).first()
+        if not state:
+            return None
+
+        current = (state.round_number, loads(state.pairing_objects))
+        if cached:
+            with RoundStateService._lock:
+                RoundStateService._rounds[session_id] = current
+        return current
+
+    @staticmethod
+    def _cached():
+        """Whether the in-memory copy can be trusted: not when other workers share the database"""
+        return not current_app.config.get('SOCKETIO_MESSAGE_QUEUE')
@@ -0,0 +1,141 @@
+# convolute_app/app/services/stats_service.py
+
+"""
+Stats service for per-session analytics counters.
+
+Counters are updated in the same transaction as the round or prompt they
+count, so reading them costs one query per table regardless of how many
+rounds a session has run. A round updates the per-student counters with
+one UPDATE per column over the round's students, so it runs the same few
+statements however large the class is.
+"""
+from sqlalchemy import case, func, literal, tuple_, update
+from ..models import Instructor, Session, Student, SessionStats, StudentStats, PartnerPair, FilterStats
+from ..extensions import db
+
+
+class StatsService:
+
+    @staticmethod
+    def record_round(session_id, pairs):
+        """
+        Count a new round of pairs (student id tuples, 0 for the dummy) for the session's current students.
+        Adds to the current transaction; the caller commits.
+        """
+        rounds = db.session.execute(
+            update(SessionStats).where(SessionStats.session_id == session_id)
+            .values(rounds=SessionStats.rounds + 1).execution_options(synchronize_session=False)
+        )
+        if rounds.rowcount == 0:
+            db.session.add(SessionStats(session_id=session_id, rounds=1))
+
+        on_break = set()
+        new_pairs = set()
+        for a, b in pairs:
+            if a == 0 or b == 0:
+                on_break.add(a or b)
+            else:
+                new_pairs.add((min(a, b), max(a, b)))
+
+        # A student paired with the dummy is on break unless the instructor takes part
+        if on_break and db.session.query(Instructor.participating).join(Session) \
+                .filter(Session.id == session_id).scalar():
+            on_break.clear()
+
+        if new_pairs:
+            seen = db.session.query(PartnerPair.student_a, PartnerPair.student_b).filter(
+                PartnerPair.session_id == session_id,
+                tuple_(PartnerPair.student_a, PartnerPair.student_b).in_(new_pairs)
+            ).all()
+            new_pairs.difference_update(seen)
+        if new_pairs:
+            db.session.execute(db.insert(PartnerPair.__table__), [
+                {'session_id': session_id, 'student_a': a, 'student_b': b} for a, b in new_pairs
+            ])
+
+        # Students in their first round get a row, then one UPDATE counts the round for every student.
+        # A student is in one pair per round, so each gains at most one new partner.
+        stats = StudentStats.__table__
+        db.session.execute(stats.insert().from_select(
+            ['session_id', 'student_id', 'name', 'rounds', 'breaks', 'partners'],
+            db.select(Student.session_id, Student.id, Student.name, literal(0), literal(0), literal(0))
+            .where(Student.session_id == session_id,
+                   ~db.select(stats.c.id).where(stats.c.session_id == session_id,
+                                               stats.c.student_id == Student.id).exists())
+        ))
+        with_new_partner = [student_id for pair in new_pairs for student_id in pair]
+        counts = {'rounds': stats.c.rounds + 1}
+        if on_break:
+            counts['breaks'] = stats.c.breaks + case((stats.c.student_id.in_(on_break), 1), else_=0)
+        if with_new_partner:
+            counts['partners'] = stats.c.partners + case((stats.c.student_id.in_(with_new_partner), 1), else_=0)
+        db.session.execute(stats.update().where(
+            stats.c.session_id == session_id,
+            stats.c.student_id.in_(db.select(Student.id).where(Student.session_id == session_id))
+        ).values(counts))
+
+    @staticmethod
+    def record_prompt(session_id, tag_filter, count=1):
+        """Count prompts served for a filter. Adds to the current transaction; the caller commits"""
+        filter_stats = db.session.get(FilterStats, (session_id, tag_filter))
+        if not filter_stats:
+            filter_stats = FilterStats(session_id=session_id, tag_filter=tag_filter, prompts_served=0)
+            db.session.add(filter_stats)
+        filter_stats.prompts_served += count
+
+    @staticmethod
+    def get_stats(session_id):
+        """Rounds run, per-student rounds/breaks/distinct partners and prompts served per filter"""
+        session_stats = db.session.get(SessionStats, session_id)
+        students = StudentStats.query.filter_by(session_id=session_id).order_by(StudentStats.name).all()
+        filters = FilterStats.query.filter_by(session_id=session_id).all()
+
+        return {
+            'rounds': session_stats.rounds if session_stats else 0,
+            'students': [{
+                'id': s.student_id,
+                'name': s.name,
+                'rounds': s.rounds,
+                'breaks': s.breaks,
+                'partners': s.partners
+            } for s in students],
+            'prompts_by_filter': {f.tag_filter: f.prompts_served for f in filters}
+        }
+
+    @staticmethod
+    def list_sessions(instructor_id, status='all', before=None, limit=20):
+        """
+        One page of an instructor's sessions, newest first, with students and rounds per session.
+        status is 'all', 'active' or 'ended'; before is the id of the last session of the previous page.
+        Returns (sessions, id to pass as before for the next page or None).
+        """
+        query = db.session.query(
+            Session.id, Session.keyword, Session.start_time, Session.end_time, Session.student_count,
+            func.coalesce(SessionStats.rounds, 0).label('rounds'),
+            func.count(Student.id).label('present')
+        ).outerjoin(SessionStats, SessionStats.session_id == Session.id) \
+            .outerjoin(Student, Student.session_id == Session.id) \
+            .filter(Session.instructor_id == instructor_id) \
+            .group_by(Session.id)
+
+        if status == 'active':
+            query = query.filter(Session.end_time.is_(None))
+        elif status == 'ended':
+            query = query.filter(Session.end_time.isnot(None))
+        if before is not None:
+            query = query.filter(Session.id < before)
+
+        # One extra row tells whether there is a next page
+        rows = query.order_by(Session.id.desc()).limit(limit + 1).all()
+        next_before = rows[limit - 1].id if len(rows) > limit else None
+
+        return [{
+            'id': row.id,
+            'keyword': row.keyword,
+            'start_time': row.start_time.isoformat() if row.start_time else None,
+            'end_time': row.end_time.isoformat() if row.end_time else None,
+            'active': row.end_time is None,
+            'student_count': row.student_count,
+            'present': row.present,
+            'rounds': row.rounds
+        } for row in rows[:limit]], next_before
@@ -3,14 +3,22 @@
 import json
 import csv
 import io
-from flask import request, jsonify
+from flask import request, jsonify, Response, stream_with_context
 from flask_jwt_extended import jwt_required, get_jwt_identity, verify_jwt_in_request
 from jwt.exceptions import DecodeError
+from sqlalchemy.exc import IntegrityError
 from ..models import Session, Instructor, Student, Tag
 from ..extensions import db
+from ..counters import counters
+from ..query_budget import budget
 from ..services.keyword_service import KeywordService
 from ..services.pairing_service import PairingService
 from ..services.prompt_service import PromptService
+from ..services.round_state_service import RoundStateService
+from ..services.draft_service import DraftService
+from ..services.stats_service import StatsService
+from ..services.export_service import ExportService, FORMATS as EXPORT_FORMATS
+from ..socket_events.round_timers import round_timers
 from ..socket_events.events import notify_student_joined, notify_student_left, notify_student_removed, notify_pairing_created, notify_discussion_started, notify_round_reset
 from . import session_bp
 
@@ -57,17 +65,25 @@ def create_session():
 @session_bp.route('/list', methods=['GET'])
 @jwt_required()
 def list_sessions():
+    """
+    Page through the instructor's sessions, newest first.
+    Query: status=all|active|ended, limit (1-100, default 20), before=<next_before of the previous page>
+    """
     current_user_id = get_jwt_identity()
-    sessions = Session.query.filter_by(instructor_id=current_user_id).all()
-
-    session_list = []
-    for session in sessions:
-        session_list.append({
-            'id': session.id,
-            'keyword': session.keyword
-        })
-
-    return jsonify({'sessions': session_list}), 200
+    
+    status = request.args.get('status', 'all')
+    if status not in ('all', 'active', 'ended'):
+        return jsonify({'message': 'status must be all, active or ended'}), 400
+    try:
+        limit = int(request.args.get('limit', 20))
+        before = request.args.get('before')
+        before = int(before) if before else None
+    except ValueError:
+        return jsonify({'message': 'limit and before must be integers'}), 400
+    limit = max(1, min(limit, 100))
+    
+    sessions, next_before = StatsService.list_sessions(current_user_id, status, before, limit)
+    return jsonify({'sessions': sessions, 'next_before': next_before}), 200
 
 
 @session_bp.route('/<keyword>', methods=['GET'])
@@ -100,6 +116,7 @@ def delete_session(session_id):
 
 
 @session_bp.route('/keywords/populate', methods=['POST'])
+@budget(5)
 def populate_keywords():
     """Populate the keywords table with initial words"""
     result = KeywordService.populate_keywords()
@@ -133,37 +150,38 @@ def add_student(keyword):
         return jsonify({'message': 'Student name cannot be empty'}), 400
     
     # Find the session
-    session = Session.query.filter_by(keyword=keyword).first()
-    if not session:
+    session_id = db.session.query(Session.id).filter_by(keyword=keyword).scalar()
+    if session_id is None:
         return jsonify({'message': 'Session not found'}), 404
     
-    # Check if student already exists in this session
-    existing_student = Student.query.filter_by(name=student_name, session_id=session.id).first()
-    if existing_student:
-        return jsonify({'message': 'Student already exists in this session'}), 409
-    
-    # Add the student
+    # Add the student; the unique (session_id, name) index rejects a name that is already taken,
+    # so concurrent joins under the same name cannot both get in
     student = Student(
         name=student_name, 
-        session_id=session.id
+        session_id=session_id
     )
     db.session.add(student)
-    
-    # Increment student count
-    session.student_count += 1
-    
-    db.session.commit()
-    
-    # Notify instructors via WebSocket
+    try:
+        db.session.flush()
+    except IntegrityError:
+        db.session.rollback()
+        return jsonify({'message': 'Student already exists in this session'}), 409
     student_data = {
         'id': student.id,
         'name': student.name
     }
+    
+    # Increment student count (student_count + 1 in the same transaction, see counters.py)
+    counters.add(Session.student_count, session_id)
+    db.session.commit()
+    
+    # Notify instructors via WebSocket
     notify_student_joined(keyword, student_data)
+    DraftService.roster_changed(keyword)
     
     return jsonify({
-        'id': student.id,
-        'name': student.name,
+        'id': student_data['id'],
+        'name': student_data['name'],
         'message': 'Student added successfully'
     }), 201
 
@@ -212,6 +230,7 @@ def remove_student(keyword, student_id):
     
     # Notify instructors via WebSocket
     notify_student_left(keyword, student_data)
+    DraftService.roster_changed(keyword)
     
     return jsonify({'message': 'Student removed successfully'}), 200
 
@@ -238,11 +257,13 @@ def student_leave_session(keyword, student_name):
     
     # Notify instructors via WebSocket
     notify_student_left(keyword, student_data)
+    DraftService.roster_changed(keyword)
     
     return jsonify({'message': 'Successfully left session'}), 200
 
 
 @session_bp.route('/<keyword>/end', methods=['POST'])
+@budget(15)
 def end_session(keyword):
     """End a session"""
     session = Session.query.filter_by(keyword=keyword).first()
@@ -261,6 +282,11 @@ def end_session(keyword):
     
     db.session.commit()
     
+    # Drop any round still in progress
+    RoundStateService.clear_round(session.id)
+    DraftService.discard(keyword)
+    round_timers.forget(keyword)
+    
     # Notify all students that session ended
     from ..socket_events.events import notify_session_ended
     notify_session_ended(keyword)
@@ -271,7 +297,41 @@ def end_session(keyword):
     }), 200
 
 
+@session_bp.route('/<keyword>/stats', methods=['GET'])
+@jwt_required()
+def session_stats(keyword):
+    """Get analytics for one of the instructor's sessions: rounds run, breaks and distinct partners per student, prompts used per filter"""
+    current_user_id = get_jwt_identity()
+    session = Session.query.filter_by(keyword=keyword, instructor_id=current_user_id).first()
+    if not session:
+        return jsonify({'message': 'Session not found'}), 404
+    
+    return jsonify(StatsService.get_stats(session.id)), 200
+
+
+@session_bp.route('/<keyword>/export', methods=['GET'])
+@jwt_required()
+def export_session(keyword):
+    """Stream one of the instructor's sessions (roster, rounds, roles and prompts) as CSV or JSON lines"""
+    export_format = request.args.get('format', 'csv')
+    if export_format not in EXPORT_FORMATS:
+        return jsonify({'message': 'Unsupported export format. Use csv or jsonl.'}), 400
+    
+    current_user_id = get_jwt_identity()
+    session = Session.query.filter_by(keyword=keyword, instructor_id=current_user_id).first()
+    if not session:
+        return jsonify({'message': 'Session not found'}), 404
+    
+    mimetype = 'text/csv' if export_format == 'csv' else 'application/x-ndjson'
+    return Response(
+        stream_with_context(ExportService.stream(session, export_format)),
+        mimetype=mimetype,
+        headers={'Content-Disposition': f'attachment; filename="{keyword}.{export_format}"'}
+    )
+
+
 @session_bp.route('/<keyword>/pairings', methods=['POST'])
+@budget(35)
 def create_pairings(keyword):
     """Create pairings for the next round"""
     try:
@@ -310,75 +370,26 @@ def update_instructor_participation(keyword):
     
     instructor.participating = data['participating']
     db.session.commit()
+    DraftService.roster_changed(keyword)
     
     return jsonify({'message': 'Participation setting updated'}), 200
 
 
 @session_bp.route('/<keyword>/pairings-with-prompts', methods=['POST'])
+@budget(35)
 def create_pairings_with_prompts(keyword):
     """Create new pairings and return with prompts and names"""
     try:
         data = request.get_json() or {}
         prompt_filter = data.get('prompt_filter', 'general')
         
-        # Create fresh pairings
-        pairing_result = PairingService.create_pairings(keyword)
-        
-        # Get session and students for names
-        session = Session.query.filter_by(keyword=keyword).first()
-        if not session:
-            return jsonify({'message': 'Session not found'}), 404
-            
-        students = Student.query.filter_by(session_id=session.id).all()
-        student_map = {s.id: s.name for s in students}
-        
-        # Get instructor participation status
-        instructor = Instructor.query.get(session.instructor_id)
-        instructor_participating = instructor.participating if instructor else False
-        
-        # Build simple array of pairing objects
-        pairing_objects = []
-        for pair in pairing_result['pairs']:
-            leader_id, talker_id = pair
-            
-            # Handle dummy (0) pairing
-            if leader_id == 0 or talker_id == 0:
-                student_id = leader_id if leader_id != 0 else talker_id
-                student_name = student_map.get(student_id, f'Student {student_id}')
-                
-                if instructor_participating:
-                    # Student paired with instructor
-                    pairing_objects.append({
-                        'round': pairing_result['round_number'],
-                        'leaderId': student_id,
-                        'leaderName': student_name,
-                        'talkerId': 'instructor',
-                        'talkerName': 'Instructor',
-                        'prompt': PromptService.get_prompt_for_filter_with_session(prompt_filter, keyword)
-                    })
-                else:
-                    # Student on break
-                    pairing_objects.append({
-                        'round': pairing_result['round_number'],
-                        'onBreakId': student_id,
-                        'onBreakName': student_name
-                    })
-            else:
-                # Regular student-student pairing
-                leader_name = student_map.get(leader_id, f'Student {leader_id}')
-                talker_name = student_map.get(talker_id, f'Student {talker_id}')
-                
-                pairing_objects.append({
-                    'round': pairing_result['round_number'],
-                    'leaderId': leader_id,
-                    'leaderName': leader_name,
-                    'talkerId': talker_id,
-                    'talkerName': talker_name,
-                    'prompt': PromptService.get_prompt_for_filter_with_session(prompt_filter, keyword)
-                })
+        # Commit the round planned during the last discussion if it is still valid, else plan it now
+        plan = DraftService.take(keyword, prompt_filter) or DraftService.plan_round(keyword, prompt_filter)
+        pairing_objects = DraftService.commit_round(plan)
         
         # Notify students of their pairing assignments
         notify_pairing_created(keyword, pairing_objects)
+        round_timers.phase_started(keyword, 'pairing', plan['pairing_plan']['round_number'])
         
         return jsonify({'pairings': pairing_objects}), 201
     except ValueError as e:
@@ -391,16 +402,35 @@ def create_pairings_with_prompts(keyword):
 def begin_discussion(keyword):
     """Start discussion phase - send prompts to leaders only"""
     try:
-        data = request.get_json() or {}
-        pairing_objects = data.get('pairing_objects', [])
+        data = request.get_json(silent=True) or {}
+        round_number = data.get('round')
         
+        if round_number is None:
+            return jsonify({'message': 'Round number is required'}), 400
+        
+        session = Session.query.filter_by(keyword=keyword).first()
+        if not session:
+            return jsonify({'message': 'Session not found'}), 404
+        
+        # Pairing objects were stored when the round was created
+        pairing_objects = RoundStateService.get_round(session.id, int(round_number))
         if not pairing_objects:
-            return jsonify({'message': 'No pairing objects provided'}), 400
+            return jsonify({'message': f'Round {round_number} is not the current round'}), 409
+        
+        # Only one of a repeated request and the pairing timer (on any worker) starts the discussion
+        if not RoundStateService.begin_discussion(session.id, int(round_number)):
+            return jsonify({'message': 'Discussion already started'}), 200
         
         # Notify students to begin discussion (prompts to leaders only)
         notify_discussion_started(keyword, pairing_objects)
+        round_timers.phase_started(keyword, 'talking', int(round_number))
+        
+        # Plan the next round while the students talk
+        DraftService.schedule(keyword)
         
         return jsonify({'message': 'Discussion started successfully'}), 200
+    except (TypeError, ValueError):
+        return jsonify({'message': 'Round number must be an integer'}), 400
     except Exception as e:
         return jsonify({'message': 'Error starting discussion'}), 500
 
@@ -409,19 +439,71 @@ def begin_discussion(keyword):
 def reset_round(keyword):
     """Reset the round - notify students to clear their state"""
     try:
+        data = request.get_json(silent=True) or {}
+        round_number = data.get('round')
+        
         # Verify session exists
         session = Session.query.filter_by(keyword=keyword).first()
         if not session:
             return jsonify({'message': 'Session not found'}), 404
         
+        # Discard the finished round (a reset without a round number discards whatever is current)
+        RoundStateService.clear_round(session.id, int(round_number) if round_number is not None else None)
+        round_timers.stop(keyword)
+        
         # Notify students to reset their state
         notify_round_reset(keyword)
         
         return jsonify({'message': 'Round reset successfully'}), 200
+    except (TypeError, ValueError):
+        return jsonify({'message': 'Round number must be an integer'}), 400
     except Exception as e:
         return jsonify({'message': 'Error resetting round'}), 500
 
 
+@session_bp.route('/<keyword>/timer', methods=['GET'])
+def get_round_timer(keyword):
+    """Get the session's phase durations and running round timer"""
+    if not Session.query.filter_by(keyword=keyword).first():
+        return jsonify({'message': 'Session not found'}), 404
+    return jsonify(round_timers.status(keyword)), 200
+
+
+@session_bp.route('/<keyword>/timer', methods=['PUT'])
+def configure_round_timer(keyword):
+    """Time the session's pairing and talking phases on the server (0 or null leaves a phase untimed)"""
+    data = request.get_json(silent=True) or {}
+    try:
+        pairing_seconds = int(data.get('pairing_seconds') or 0)
+        talking_seconds = int(data.get('talking_seconds') or 0)
+    except (TypeError, ValueError):
+        return jsonify({'message': 'Phase durations must be whole seconds'}), 400
+    if pairing_seconds < 0 or talking_seconds < 0:
+        return jsonify({'message': 'Phase durations cannot be negative'}), 400
+    
+    if not Session.query.filter_by(keyword=keyword).first():
+        return jsonify({'message': 'Session not found'}), 404
+    
+    round_timers.configure(keyword, pairing_seconds, talking_seconds, data.get('auto_pair', False))
+    return jsonify(round_timers.status(keyword)), 200
+
+
+@session_bp.route('/<keyword>/timer/pause', methods=['POST'])
+def pause_round_timer(keyword):
+    """Freeze the running phase timer"""
+    if not round_timers.pause(keyword):
+        return jsonify({'message': 'No running timer'}), 409
+    return jsonify(round_timers.status(keyword)), 200
+
+
+@session_bp.route('/<keyword>/timer/resume', methods=['POST'])
+def resume_round_timer(keyword):
+    """Continue a paused phase timer"""
+    if not round_timers.resume(keyword):
+        return jsonify({'message': 'No paused timer'}), 409
+    return jsonify(round_timers.status(keyword)), 200
+
+
 @session_bp.route('/prompts/populate', methods=['POST'])
 def populate_prompts():
     """Populate the database with sample prompts and tags"""
@@ -433,6 +515,7 @@ def populate_prompts():
 
 
 @session_bp.route('/prompts/bulk-import', methods=['POST'])
+@budget(30)
 def bulk_import_prompts():
     """
     Bulk import prompts from uploaded JSON or CSV file.
@@ -440,6 +523,8 @@ def bulk_import_prompts():
     Expected formats:
     JSON: [{"prompt": "text", "tags": ["tag1", "tag2"]}, ...]
     CSV: prompt,tags (where tags are comma-separated in the tags column)
+    
+    Optional form field near_duplicates=flag|merge|off overrides PROMPT_NEAR_DUPLICATES for this import.
     """
     try:
         # Check if file was uploaded
@@ -492,7 +577,7 @@ def bulk_import_prompts():
             return jsonify({'message': 'No prompts found in file'}), 400
         
         # Import prompts
-        stats = PromptService.bulk_import_prompts(prompts_data)
+        stats = PromptService.bulk_import_prompts(prompts_data, request.form.get('near_duplicates'))
         
         # Prepare response
         response = {
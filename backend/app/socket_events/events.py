@@ -1,18 +1,43 @@
 # monolith_app/app/socket_events/events.py
 
+import functools
+import logging
 from flask import request
 from flask_socketio import emit, join_room, leave_room
-from ..prompts.client import get_random_prompt
+from ..prompts.client import get_random_prompts
+from ..checkpoints import checkpoints
 from ..models import Student, Session
-from ..extensions import socketio
+from ..extensions import db, socketio
+from ..metrics import metrics
+from ..query_budget import query_budget
+from ..offload import offload
+from ..serialization import socket_codec
+from ..services.round_state_service import RoundStateService
+from .fanout import fanout
+from .presence import presence
+from .roster import individual_room, instructor_room, roster
+from .snapshots import snapshots
 
-sessions = {}
+logger = logging.getLogger(__name__)
 
 
 def register_socket_events(socketio):
     # File: monolith_app/app/socket_events/events.py
 
-    @socketio.on("join_session")
+    def on(event):
+        """Register a handler with latency and query metrics and its query budget, marking its socket active"""
+        return lambda handler: socketio.on(event)(
+            metrics.timed_event(event, query_budget.watch_event(event, active(handler))))
+
+    def active(handler):
+        """Mark the sending socket as active in presence before the handler runs"""
+        @functools.wraps(handler)
+        def wrapper(*args):
+            presence.touch(request.sid)
+            return handler(*args)
+        return wrapper
+
+    @on("join_session")
     def handle_join(data):
         keyword = data["keyword"]
         username = data.get("username", "Guest")
@@ -20,84 +45,95 @@ def register_socket_events(socketio):
 
         join_room(keyword)
 
-        if keyword not in sessions:
-            sessions[keyword] = []
+        # Student notifications are addressed to the sids registered here
+        presence.join(keyword, username, sid)
+        if presence.clustered:
+            join_room(presence.room_for(keyword, username))
+        emit("joined", {"sid": sid, "username": username, "count": presence.count(keyword)}, to=keyword)
 
-        sessions[keyword].append({"sid": sid, "username": username})
-        emit("joined", {"sid": sid, "username": username, "count": len(sessions[keyword])}, to=keyword)
-        
-        # Also join student-specific room for removal notifications
-        student_room = f"student_{keyword}_{username}"
-        join_room(student_room)
-        print(f"[DEBUG] Student '{username}' joined room: '{student_room}'")
+        # A reconnecting student gets back their part of the current round in one event
+        if presence.clustered:
+            # Another worker may be running the round, so its stored copy is the one to trust
+            snapshot = offload.run(_stored_slice, keyword, username)
+        else:
+            snapshot = snapshots.slice(keyword, username)
+        if snapshot:
+            emit("resync", snapshot, to=sid)
+
+    @on("connect")
+    def handle_connect(auth=None):
+        """Clients may ask for msgpack payloads with auth {"encoding": "msgpack"}"""
+        socket_codec.negotiate(request.sid, auth)
+
+    @on("disconnect")
+    def handle_disconnect(reason=None):
+        """Forget the socket so presence only tracks live connections"""
+        presence.leave(request.sid)
+        socket_codec.forget(request.sid)
 
-    @socketio.on("start_session")
+    @on("start_session")
     def handle_start(data):
         keyword = data["keyword"]
-        room = sessions.get(keyword, [])
+        room = presence.students(keyword)
 
         if len(room) < 2:
             emit("error", {"message": "Not enough students"}, to=request.sid)
             return
 
+        # One service request for the whole room rather than one per pair
+        prompts = get_random_prompts(len(room) // 2)
         for i in range(0, len(room) - 1, 2):
-            s1, s2 = room[i], room[i+1]
-            prompt = get_random_prompt()
-            emit("prompt", {"role": "asker", "prompt": prompt}, to=s1)
-            emit("prompt", {"role": "responder", "prompt": prompt}, to=s2)
+            (_, s1_sids), (_, s2_sids) = room[i], room[i+1]
+            prompt = prompts[i // 2]
+            emit("prompt", {"role": "asker", "prompt": prompt}, to=s1_sids)
+            emit("prompt", {"role": "responder", "prompt": prompt}, to=s2_sids)
 
-    @socketio.on("join_instructor_room")
+    @on("join_instructor_room")
     def handle_instructor_join(data):
         """Instructor joins their session room to receive real-time updates"""
         keyword = data["keyword"]
         sid = request.sid
         
-        # Join the instructor room (separate from student room)
-        instructor_room = f"instructor_{keyword}"
-        print(f"[DEBUG] Instructor {sid} joining room: {instructor_room}")
-        join_room(instructor_room)
+        # Join the instructor room (separate from student room). Clients that ask for
+        # {"roster": "individual"} get every join/leave as its own event instead of roster_delta batches
+        room = individual_room(keyword) if data.get("roster") == "individual" else instructor_room(keyword)
+        join_room(room)
         
         emit("instructor_joined", {"message": "Connected to session updates"}, to=sid)
-        print(f"[DEBUG] Instructor {sid} successfully joined room: {instructor_room}")
+        logger.debug("Instructor %s joined room %s", sid, room)
 
-    @socketio.on("leave_instructor_room") 
+    @on("leave_instructor_room") 
     def handle_instructor_leave(data):
         """Instructor leaves their session room"""
         keyword = data["keyword"]
-        instructor_room = f"instructor_{keyword}"
-        leave_room(instructor_room)
+        leave_room(instructor_room(keyword))
+        leave_room(individual_room(keyword))
 
 
+@offload.on_loop
 def notify_student_joined(keyword, student_data):
-    """Emit event when student joins session"""
-    instructor_room = f"instructor_{keyword}"
-    print(f"[DEBUG] Emitting student_joined to room: {instructor_room}")
-    print(f"[DEBUG] Student data: {student_data}")
-    socketio.emit("student_joined", {
-        "student": student_data,
-        "message": f"{student_data['name']} joined the session"
-    }, room=instructor_room)
+    """Emit event when student joins session (coalesced into roster_delta during join storms)"""
+    roster.joined(keyword, student_data)
 
 
+@offload.on_loop
 def notify_student_left(keyword, student_data):
-    """Emit event when student leaves session"""  
-    instructor_room = f"instructor_{keyword}"
-    socketio.emit("student_left", {
-        "student": student_data,
-        "message": f"{student_data['name']} left the session"
-    }, room=instructor_room)
+    """Emit event when student leaves session (coalesced into roster_delta during join storms)"""
+    roster.left(keyword, student_data)
 
 
+@offload.on_loop
 def notify_student_removed(keyword, student_name, reason="removed by instructor"):
     """Notify specific student they were removed from session"""
-    student_room = f"student_{keyword}_{student_name}"
-    print(f"[DEBUG] Notifying student removal to room: {student_room}")
-    socketio.emit("student_removed", {
-        "message": f"You have been {reason}",
-        "reason": reason
-    }, room=student_room)
+    recipients = presence.recipients(keyword, student_name)
+    if recipients:
+        socketio.emit("student_removed", {
+            "message": f"You have been {reason}",
+            "reason": reason
+        }, to=recipients)
 
 
+@offload.on_loop
 def notify_session_ended(keyword):
     """Notify all students that the session has ended"""
     # Notify all students in the main session room
@@ -105,84 +141,118 @@ def notify_session_ended(keyword):
         "message": "Session has been ended by the instructor",
         "keyword": keyword
     }, room=keyword)
-    print(f"[DEBUG] Session ended notification sent to room: {keyword}")
+    presence.drop_session(keyword)
+    snapshots.clear(keyword)
+    roster.forget(keyword)
 
 
+@offload.on_loop
 def notify_pairing_created(keyword, pairing_objects):
     """Notify students of their pairing assignments and roles"""
+    payloads = _assignments(pairing_objects)
+    round_number = _round_of(pairing_objects)
+    snapshots.start_round(keyword, round_number, {username: payload for username, (_, payload) in payloads.items()})
+    fanout.send(keyword, round_number, _address(keyword, payloads))
+
+
+def _assignments(pairing_objects):
+    """{username: ("pairing_assignment", payload)} for every student of a round"""
+    payloads = {}
     for pairing_obj in pairing_objects:
+        round_number = pairing_obj['round']
         if 'onBreakId' in pairing_obj:
             # Student on break
-            student_room = f"student_{keyword}_{pairing_obj['onBreakName']}"
-            socketio.emit("pairing_assignment", {
+            payloads[pairing_obj['onBreakName']] = ("pairing_assignment", {
                 "type": "break",
-                "round": pairing_obj['round'],
-                "message": f"You are taking a break this round (Round {pairing_obj['round']})"
-            }, room=student_room)
-            print(f"[DEBUG] Break notification sent to: {student_room}")
+                "round": round_number,
+                "message": f"You are taking a break this round (Round {round_number})"
+            })
         else:
-            # Regular pairing
-            leader_room = f"student_{keyword}_{pairing_obj['leaderName']}"
-            talker_room = f"student_{keyword}_{pairing_obj['talkerName']}"
-
-            # Notify leader
-            socketio.emit("pairing_assignment", {
+            # Regular pairing - notify leader and talker
+            payloads[pairing_obj['leaderName']] = ("pairing_assignment", {
                 "type": "leader",
-                "round": pairing_obj['round'],
+                "round": round_number,
                 "partner": pairing_obj['talkerName'],
                 "role": "Leader",
-                "message": f"Round {pairing_obj['round']}: You are the LEADER paired with {pairing_obj['talkerName']}"
-            }, room=leader_room)
-
-            # Notify talker
-            socketio.emit("pairing_assignment", {
+                "message": f"Round {round_number}: You are the LEADER paired with {pairing_obj['talkerName']}"
+            })
+            payloads[pairing_obj['talkerName']] = ("pairing_assignment", {
                 "type": "talker",
-                "round": pairing_obj['round'],
+                "round": round_number,
                 "partner": pairing_obj['leaderName'],
                 "role": "Talker",
-                "message": f"Round {pairing_obj['round']}: You are the TALKER paired with {pairing_obj['leaderName']}"
-            }, room=talker_room)
+                "message": f"Round {round_number}: You are the TALKER paired with {pairing_obj['leaderName']}"
+            })
+    return payloads
+
 
-            print(f"[DEBUG] Pairing notifications sent to: {leader_room} and {talker_room}")
+def _stored_slice(keyword, username):
+    """
+    A student's resync payload read from the database, for a round another worker may run.
+    The round's checkpoint has its phase and prompts; until it is written the student gets their assignment.
+    """
+    session_id = db.session.query(Session.id).filter_by(keyword=keyword, end_time=None).scalar()
+    round_number = RoundStateService.get_current_round(session_id) if session_id is not None else None
+    if round_number is None:
+        return None
 
+    snapshot = checkpoints.read('snapshot', keyword)
+    if not snapshot or snapshot['round'] != round_number:
+        pairing_objects = RoundStateService.get_round(session_id, round_number) or []
+        snapshot = snapshots.new_round(round_number, {
+            username: payload for username, (_, payload) in _assignments(pairing_objects).items()
+        })
+    return snapshots.slice_of(snapshot, username)
 
+
+@offload.on_loop
 def notify_discussion_started(keyword, pairing_objects):
     """Send prompts to leaders and start notifications to talkers"""
-    print(f"[DEBUG] notify_discussion_started called for keyword: {keyword}")
-    print(f"[DEBUG] pairing_objects: {pairing_objects}")
-    
+    payloads = {}
     for pairing_obj in pairing_objects:
-        print(f"[DEBUG] Processing pairing object: {pairing_obj}")
         if 'onBreakId' not in pairing_obj and 'prompt' in pairing_obj:
-            leader_room = f"student_{keyword}_{pairing_obj['leaderName']}"
-            talker_room = f"student_{keyword}_{pairing_obj['talkerName']}"
-            
             # Send prompt to leader
-            socketio.emit("discussion_prompt", {
+            payloads[pairing_obj['leaderName']] = ("discussion_prompt", {
                 "round": pairing_obj['round'],
                 "prompt": pairing_obj['prompt'],
                 "partner": pairing_obj['talkerName'],
                 "message": f"Discussion started! Here's your prompt to discuss with {pairing_obj['talkerName']}:"
-            }, room=leader_room)
-            
+            })
             # Send start notification to talker
-            socketio.emit("discussion_started", {
+            payloads[pairing_obj['talkerName']] = ("discussion_started", {
                 "round": pairing_obj['round'],
                 "partner": pairing_obj['leaderName'],
                 "message": f"Discussion has started. Please answer {pairing_obj['leaderName']}'s prompt."
-            }, room=talker_room)
-            
-            print(f"[DEBUG] Prompt sent to leader: {leader_room}")
-            print(f"[DEBUG] Discussion start notification sent to talker: {talker_room}")
+            })
+
+    round_number = _round_of(pairing_objects)
+    snapshots.start_discussion(keyword, round_number,
+                               {username: payload for username, (_, payload) in _assignments(pairing_objects).items()},
+                               {username: payload for username, (_, payload) in payloads.items()})
+    fanout.send(keyword, round_number, _address(keyword, payloads))
 
 
+def _address(keyword, payloads):
+    """Turn {username: (event, payload)} into fan-out messages for every connected socket of each student"""
+    return [
+        (recipient, event, payload)
+        for username, (event, payload) in payloads.items()
+        for recipient in presence.recipients(keyword, username)
+    ]
+
+
+def _round_of(pairing_objects):
+    """Round number shared by a list of pairing objects"""
+    return pairing_objects[0]['round'] if pairing_objects else None
+
+
+@offload.on_loop
 def notify_round_reset(keyword):
     """Notify all students that a new round is starting - reset their state"""
-    print(f"[DEBUG] notify_round_reset called for keyword: {keyword}")
+    snapshots.clear(keyword)
     
-    # Send reset notification to all students in the session
-    socketio.emit("round_reset", {
+    # Sent through the fan-out queue so it cannot overtake the round's pending notifications
+    fanout.send(keyword, None, [(keyword, "round_reset", {
         "message": "New round starting - please wait for pairings...",
         "keyword": keyword
-    }, room=keyword)
-    print(f"[DEBUG] Round reset notification sent to room: {keyword}")
+    })])
@@ -0,0 +1,96 @@
+# convolute/backend/app/socket_events/fanout.py
+
+"""
+Batched Socket.IO fan-out.
+
+Notifications for a whole round are grouped per recipient and handed to one
+background task, so the HTTP handler that triggered them returns right away.
+Batches for the same keyword are delivered in the order they were sent.
+"""
+import logging
+import threading
+import time
+from collections import deque
+from ..metrics import metrics
+from ..serialization import socket_codec
+
+logger = logging.getLogger(__name__)
+
+
+class Fanout:
+    def __init__(self):
+        self.socketio = None
+        self._slots = threading.BoundedSemaphore(4)
+        self._lock = threading.Lock()
+        self._pending = {}   # keyword -> deque of batches waiting for that keyword's drain task
+        self.reports = deque(maxlen=100)   # most recent delivery reports, newest last
+
+    def init_app(self, app, socketio):
+        self.socketio = socketio
+        self._slots = threading.BoundedSemaphore(app.config.get('FANOUT_MAX_CONCURRENCY', 4))
+
+    def send(self, keyword, round_number, messages):
+        """
+        Queue a round's messages for delivery and return immediately.
+        messages is an iterable of (recipient, event, payload) tuples.
+        """
+        batch = {}
+        for recipient, event, payload in messages:
+            batch.setdefault(recipient, []).append((event, payload))
+
+        if not batch:
+            return
+
+        with self._lock:
+            pending = self._pending.setdefault(keyword, deque())
+            pending.append((round_number, batch, time.perf_counter()))
+            if len(pending) > 1:
+                return  # the keyword's drain task will pick it up
+
+        self.socketio.start_background_task(self._drain, keyword)
+
+    def _drain(self, keyword):
+        """Deliver a keyword's batches one after another until none are left"""
+        while True:
+            with self._lock:
+                round_number, batch, queued_at = self._pending[keyword][0]
+
+            try:
+                self._deliver(keyword, round_number, batch, queued_at)
+            except Exception:
+                logger.exception("Fan-out %s round %s failed", keyword, round_number)
+
+            with self._lock:
+                pending = self._pending[keyword]
+                pending.popleft()
+                if not pending:
+                    del self._pending[keyword]
+                    return
+
+    def _deliver(self, keyword, round_number, batch, queued_at):
+        """Emit a batch, holding one of the bounded delivery slots while doing so"""
+        with self._slots:
+            started = time.perf_counter()
+            emits = 0
+            for recipient, events in batch.items():
+                for event, payload in events:
+                    self.socketio.emit(event, socket_codec.encode(recipient, payload), to=recipient)
+                    emits += 1
+            finished = time.perf_counter()
+
+        report = {
+            'keyword': keyword,
+            'round': round_number,
+            'recipients': len(batch),
+            'emits': emits,
+            'queued_ms': round((started - queued_at) * 1000, 3),
+            'emit_ms': round((finished - started) * 1000, 3)
+        }
+        self.reports.append(report)
+        metrics.fanout_latency.observe(finished - started)
+        metrics.fanout_queued.observe(started - queued_at)
+        logger.info("Fan-out %s round %s: %d emits to %d recipients in %.1f ms (queued %.1f ms)",
+                    keyword, round_number, emits, len(batch), report['emit_ms'], report['queued_ms'])
+
+
+fanout = Fanout()
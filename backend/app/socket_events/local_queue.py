@@ -0,0 +1,163 @@
+# convolute/backend/app/socket_events/local_queue.py
+
+"""
+Local stand-in for a Socket.IO message queue.
+
+A tiny broker relays pubsub messages between server processes over a
+localhost socket, so the multi-process emit path can be exercised on one
+machine without Redis. Start it with a shared secret:
+
+    LOCAL_QUEUE_AUTHKEY=secret python -m app.socket_events.local_queue --port 6391
+
+and point every worker at it with SOCKETIO_MESSAGE_QUEUE=local://:secret@127.0.0.1:6391
+
+Connections authenticate with the secret before anything is exchanged,
+and messages travel as JSON (app.serialization), never pickle, so a peer
+can send data but not code. Binary payloads (msgpack clients) are carried
+as base64.
+"""
+import argparse
+import base64
+import os
+import threading
+import time
+from multiprocessing.connection import Client, Listener
+from urllib.parse import unquote, urlparse
+
+import socketio
+from ..serialization import dumps, loads
+
+DEFAULT_PORT = 6391
+_BYTES = '__bytes__'
+
+
+def encode(data):
+    """A pubsub message as JSON bytes"""
+    return dumps(data, default=_encode_bytes).encode()
+
+
+def decode(message):
+    return _decode_bytes(loads(message))
+
+
+def _encode_bytes(value):
+    if isinstance(value, (bytes, bytearray)):
+        return {_BYTES: base64.b64encode(value).decode()}
+    raise TypeError(f"{type(value).__name__} cannot be sent through the local message queue")
+
+
+def _decode_bytes(value):
+    if isinstance(value, dict):
+        if len(value) == 1 and _BYTES in value:
+            return base64.b64decode(value[_BYTES])
+        return {key: _decode_bytes(item) for key, item in value.items()}
+    if isinstance(value, list):
+        return [_decode_bytes(item) for item in value]
+    return value
+
+
+def _authkey(secret):
+    if not secret:
+        raise ValueError("The local message queue needs a secret: local://:secret@host:port for workers, "
+                         "--authkey or LOCAL_QUEUE_AUTHKEY for the broker")
+    return secret.encode()
+
+
+class LocalQueueManager(socketio.PubSubManager):
+    """Client manager that publishes through the local broker"""
+    name = 'local'
+
+    def __init__(self, url, channel='flask-socketio', write_only=False, logger=None):
+        parsed = urlparse(url)
+        self.address = (parsed.hostname or '127.0.0.1', parsed.port or DEFAULT_PORT)
+        self.authkey = _authkey(unquote(parsed.password or ''))
+        self._publisher = None
+        self._publish_lock = threading.Lock()
+        super().__init__(channel=channel, write_only=write_only, logger=logger)
+
+    def _publish(self, data):
+        message = encode(data)
+        with self._publish_lock:
+            # One reconnect attempt covers a broker restart between publishes
+            for attempt in range(2):
+                try:
+                    if self._publisher is None:
+                        self._publisher = Client(self.address, authkey=self.authkey)
+                        self._publisher.send_bytes(encode(['publish', self.channel]))
+                    self._publisher.send_bytes(message)
+                    return
+                except (OSError, EOFError):
+                    self._publisher = None
+                    if attempt:
+                        raise
+
+    def _listen(self):
+        while True:
+            try:
+                connection = Client(self.address, authkey=self.authkey)
+                connection.send_bytes(encode(['subscribe', self.channel]))
+                while True:
+                    yield decode(connection.recv_bytes())
+            except (OSError, EOFError):
+                self._get_logger().error('Cannot receive from local message queue at %s:%s, retrying in 1s',
+                                         *self.address)
+                time.sleep(1)
+
+
+def create_client_manager(url, channel='flask-socketio', write_only=False):
+    """Build the client manager for a local:// message queue URL"""
+    return LocalQueueManager(url, channel=channel, write_only=write_only)
+
+
+def serve(authkey, host='127.0.0.1', port=DEFAULT_PORT):
+    """Run the broker: every message published on a channel goes to all of its subscribers"""
+    listener = Listener((host, port), authkey=_authkey(authkey))
+    subscribers = {}   # channel -> {connection: send lock}
+    lock = threading.Lock()
+
+    def relay(channel, message):
+        with lock:
+            targets = list(subscribers.get(channel, {}).items())
+        for connection, send_lock in targets:
+            try:
+                with send_lock:
+                    connection.send_bytes(message)
+            except OSError:
+                with lock:
+                    subscribers.get(channel, {}).pop(connection, None)
+
+    def handle(connection):
+        channel = None
+        try:
+            kind, channel = decode(connection.recv_bytes())
+            if kind == 'subscribe':
+                with lock:
+                    subscribers.setdefault(channel, {})[connection] = threading.Lock()
+                connection.recv_bytes()   # subscribers never send; this returns when they go away
+            else:
+                while True:
+                    relay(channel, connection.recv_bytes())
+        except (OSError, EOFError, ValueError):
+            pass
+        finally:
+            with lock:
+                subscribers.get(channel, {}).pop(connection, None)
+            connection.close()
+
+    print(f"Local message queue listening on {host}:{port}")
+    while True:
+        try:
+            connection = listener.accept()
+        except Exception:
+            continue  # failed handshake (wrong authkey); keep serving
+        threading.Thread(target=handle, args=(connection,), daemon=True).start()
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Local Socket.IO message queue broker')
+    parser.add_argument('--host', default='127.0.0.1')
+    parser.add_argument('--port', type=int, default=DEFAULT_PORT)
+    parser.add_argument('--authkey', default=os.environ.get('LOCAL_QUEUE_AUTHKEY'),
+                        help='shared secret (default: $LOCAL_QUEUE_AUTHKEY); required')
+    args = parser.parse_args()
+    serve(args.authkey, args.host, args.port)
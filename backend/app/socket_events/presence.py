@@ -0,0 +1,138 @@
+# convolute/backend/app/socket_events/presence.py
+
+"""
+Presence registry: which student sockets are connected to which session.
+
+Maps keyword -> username -> sids. Entries are removed when their socket
+disconnects; entries left behind by a lost disconnect are expired once they
+have been idle for longer than the TTL and the socket is no longer connected.
+Every Socket.IO event a socket sends marks it active (touch), and joins and
+touches run the expiry sweep at most once per TTL period.
+
+The registry is per process. When workers share a message queue a student's
+socket may live on another worker, so notifications are addressed to a
+per-student room instead, which the queue delivers wherever the socket is.
+"""
+import threading
+import time
+
+
+class PresenceRegistry:
+    def __init__(self):
+        self.ttl = 1800
+        self.clustered = False
+        self._is_connected = lambda sid: False
+        self._lock = threading.Lock()
+        self._sessions = {}   # keyword -> {username: {sid: last_seen}}, usernames in join order
+        self._sids = {}       # sid -> (keyword, username)
+        self._last_sweep = time.monotonic()
+
+    def init_app(self, app, socketio):
+        self.ttl = app.config.get('PRESENCE_TTL_SECONDS', 1800)
+        self.clustered = bool(app.config.get('SOCKETIO_MESSAGE_QUEUE'))
+        self._is_connected = lambda sid: socketio.server.manager.is_connected(sid, '/')
+
+    def join(self, keyword, username, sid):
+        """Register a student's socket, moving it if the sid was registered elsewhere"""
+        with self._lock:
+            self._remove(sid)
+            self._sessions.setdefault(keyword, {}).setdefault(username, {})[sid] = time.monotonic()
+            self._sids[sid] = (keyword, username)
+        self._maybe_sweep()
+
+    def leave(self, sid):
+        """Forget a socket. Returns (keyword, username) if it was registered"""
+        with self._lock:
+            return self._remove(sid)
+
+    def touch(self, sid):
+        """Mark a socket as active"""
+        with self._lock:
+            entry = self._sids.get(sid)
+            if entry:
+                self._sessions[entry[0]][entry[1]][sid] = time.monotonic()
+        self._maybe_sweep()
+
+    def sids_for(self, keyword, username):
+        """Get the connected sids of a student"""
+        with self._lock:
+            return list(self._sessions.get(keyword, {}).get(username, ()))
+
+    def recipients(self, keyword, username):
+        """Where to send a student's notifications: their sids, or their room when clustered"""
+        if self.clustered:
+            return [self.room_for(keyword, username)]
+        return self.sids_for(keyword, username)
+
+    @staticmethod
+    def room_for(keyword, username):
+        """Per-student room, only joined when clustered"""
+        return f"student:{keyword}:{username}"
+
+    def students(self, keyword):
+        """Get [(username, [sids])] for a session, in join order"""
+        with self._lock:
+            return [(username, list(sids)) for username, sids in self._sessions.get(keyword, {}).items()]
+
+    def drop_session(self, keyword):
+        """Forget every socket of a session"""
+        with self._lock:
+            for sids in self._sessions.pop(keyword, {}).values():
+                for sid in sids:
+                    self._sids.pop(sid, None)
+
+    def count(self, keyword):
+        """Number of students with at least one connected socket in a session"""
+        with self._lock:
+            return len(self._sessions.get(keyword, ()))
+
+    def counts(self):
+        """Totals across all sessions"""
+        with self._lock:
+            return {
+                'sessions': len(self._sessions),
+                'students': sum(len(users) for users in self._sessions.values()),
+                'sockets': len(self._sids)
+            }
+
+    def expire(self, now=None):
+        """Drop entries idle for longer than the TTL whose socket is gone. Returns how many were dropped"""
+        now = time.monotonic() if now is None else now
+        with self._lock:
+            stale = [
+                sid
+                for users in self._sessions.values()
+                for sids in users.values()
+                for sid, last_seen in sids.items()
+                if now - last_seen > self.ttl
+            ]
+        stale = [sid for sid in stale if not self._is_connected(sid)]
+        with self._lock:
+            for sid in stale:
+                self._remove(sid)
+            self._last_sweep = now
+        return len(stale)
+
+    def _maybe_sweep(self):
+        """Expire stale entries at most once per TTL period"""
+        if time.monotonic() - self._last_sweep > self.ttl:
+            self.expire()
+
+    def _remove(self, sid):
+        """Remove a sid and any empty parents. Caller must hold the lock"""
+        entry = self._sids.pop(sid, None)
+        if not entry:
+            return None
+
+        keyword, username = entry
+        users = self._sessions.get(keyword, {})
+        sids = users.get(username, {})
+        sids.pop(sid, None)
+        if not sids:
+            users.pop(username, None)
+        if not users:
+            self._sessions.pop(keyword, None)
+        return entry
+
+
+presence = PresenceRegistry()
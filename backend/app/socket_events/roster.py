@@ -0,0 +1,85 @@
+# convolute/backend/app/socket_events/roster.py
+
+"""
+Coalesced roster updates for instructor rooms.
+
+A join or leave in a quiet room goes out immediately as an individual
+student_joined/student_left event. Further changes within the debounce
+window are collected and sent as one roster_delta event when it closes, so
+a join storm costs the Dashboard one re-render per window instead of one
+per student. Instructors that join with {"roster": "individual"} get every
+change as its own event instead.
+"""
+import threading
+import time
+
+
+def instructor_room(keyword):
+    return f"instructor_{keyword}"
+
+
+def individual_room(keyword):
+    return f"instructor_{keyword}_individual"
+
+
+class RosterAggregator:
+    def __init__(self):
+        self.socketio = None
+        self.window = 0.1
+        self._lock = threading.Lock()
+        self._pending = {}      # keyword -> {'joined': [...], 'left': [...]} collected since the last send
+        self._last_sent = {}    # keyword -> monotonic time of the last send
+
+    def init_app(self, app, socketio):
+        self.socketio = socketio
+        self.window = app.config.get('ROSTER_DEBOUNCE_MS', 100) / 1000
+
+    def joined(self, keyword, student_data):
+        self._record(keyword, 'joined', "student_joined", {
+            "student": student_data,
+            "message": f"{student_data['name']} joined the session"
+        })
+
+    def left(self, keyword, student_data):
+        self._record(keyword, 'left', "student_left", {
+            "student": student_data,
+            "message": f"{student_data['name']} left the session"
+        })
+
+    def _record(self, keyword, change, event, payload):
+        # Opted-in clients always get the individual event
+        self.socketio.emit(event, payload, room=individual_room(keyword))
+
+        now = time.monotonic()
+        with self._lock:
+            pending = self._pending.get(keyword)
+            if pending is None and now - self._last_sent.get(keyword, 0) >= self.window:
+                # Quiet room: send right away
+                self._last_sent[keyword] = now
+                immediate = True
+            else:
+                immediate = False
+                if pending is None:
+                    pending = self._pending[keyword] = {'joined': [], 'left': []}
+                    self.socketio.start_background_task(self._flush_later, keyword)
+                pending[change].append(payload['student'])
+
+        if immediate:
+            self.socketio.emit(event, payload, room=instructor_room(keyword))
+
+    def _flush_later(self, keyword):
+        """Send everything collected for a keyword once the debounce window closes"""
+        self.socketio.sleep(self.window)
+        with self._lock:
+            pending = self._pending.pop(keyword, None)
+            self._last_sent[keyword] = time.monotonic()
+        if pending:
+            self.socketio.emit("roster_delta", pending, room=instructor_room(keyword))
+
+    def forget(self, keyword):
+        """Drop a keyword's bookkeeping once its session ends"""
+        with self._lock:
+            self._last_sent.pop(keyword, None)
+
+
+roster = RosterAggregator()
@@ -0,0 +1,284 @@
+# convolute/backend/app/socket_events/round_timers.py
+
+"""
+Server-side round timers.
+
+Sessions that set phase durations (PUT /api/session/<keyword>/timer) have
+their pairing and talking phases timed here instead of by the instructor's
+browser, so a closed Dashboard tab no longer stalls the class. When pairing
+time runs out discussion begins; when talking time runs out the round is
+reset and, with auto_pair, the next round is paired.
+
+Every running timer is one entry in a heap ordered by its next wake-up,
+served by a single background task, so thousands of sessions cost one
+task rather than one thread each. Stale entries (after a pause, reset or
+new phase) are skipped when they surface instead of being searched for.
+Each wake-up before the deadline sends a compact tick to the session's
+students and instructors:
+
+    tick  [round, phase, seconds_remaining, paused]
+
+with phase 'p' (pairing), 't' (talking) or 'i' (idle: the round was reset
+and seconds_remaining is the next pairing time). Timers live on the
+worker that started the phase; with a message queue the ticks still reach
+every worker's clients. Settings and running timers are checkpointed (see
+checkpoints.py) with wall-clock deadlines, so a restarted worker carries on
+and ends any phase whose time ran out while it was down.
+"""
+import heapq
+import itertools
+import logging
+import math
+import threading
+import time
+from ..checkpoints import checkpoints
+from ..models import Session
+from ..offload import offload
+from ..services.draft_service import DraftService
+from ..services.round_state_service import RoundStateService
+from .events import notify_discussion_started, notify_pairing_created, notify_round_reset
+from .roster import instructor_room, individual_room
+
+logger = logging.getLogger(__name__)
+
+PHASES = {'pairing': 'p', 'talking': 't'}
+
+
+class RoundTimers:
+    def __init__(self):
+        self.app = None
+        self.socketio = None
+        self.tick_seconds = 5
+        self._lock = threading.Lock()
+        self._settings = {}    # keyword -> {'pairing_seconds', 'talking_seconds', 'auto_pair'}
+        self._timers = {}      # keyword -> {'phase', 'round', 'ends_at', 'remaining', 'generation'}
+        self._heap = []        # (wake_at, generation, keyword); generation also orders ties
+        self._generations = itertools.count(1)
+        self._wakeup = None
+        self._running = False
+
+    def init_app(self, app, socketio):
+        self.app = app
+        self.socketio = socketio
+        self.tick_seconds = app.config.get('ROUND_TIMER_TICK_SECONDS', 5)
+
+    def configure(self, keyword, pairing_seconds=None, talking_seconds=None, auto_pair=False):
+        """Set a session's phase durations; a phase without a duration is not timed"""
+        with self._lock:
+            self._settings[keyword] = {
+                'pairing_seconds': pairing_seconds or None,
+                'talking_seconds': talking_seconds or None,
+                'auto_pair': bool(auto_pair)
+            }
+        checkpoints.mark('timer', keyword)
+
+    def phase_started(self, keyword, phase, round_number):
+        """Time a phase that just began, replacing the session's running timer. No-op for untimed phases"""
+        with self._lock:
+            seconds = self._settings.get(keyword, {}).get(f'{phase}_seconds')
+            if not seconds:
+                self._timers.pop(keyword, None)
+                timer = None
+            else:
+                timer = {'phase': phase, 'round': round_number, 'ends_at': time.monotonic() + seconds,
+                         'remaining': seconds}
+                self._schedule(keyword, timer, time.monotonic())
+        checkpoints.mark('timer', keyword)
+        if timer:
+            self._send(keyword, timer)
+
+    def pause(self, keyword):
+        """Freeze the session's running timer. Returns False if there is none"""
+        with self._lock:
+            timer = self._timers.get(keyword)
+            if not timer or timer['ends_at'] is None:
+                return False
+            timer['remaining'] = max(0.0, timer['ends_at'] - time.monotonic())
+            timer['ends_at'] = None
+            timer['generation'] = next(self._generations)    # drops its heap entry
+        checkpoints.mark('timer', keyword)
+        self._send(keyword, timer)
+        return True
+
+    def resume(self, keyword):
+        """Restart a paused timer with the time it had left. Returns False if there is none"""
+        with self._lock:
+            timer = self._timers.get(keyword)
+            if not timer or timer['ends_at'] is not None:
+                return False
+            now = time.monotonic()
+            timer['ends_at'] = now + timer['remaining']
+            self._schedule(keyword, timer, now)
+        checkpoints.mark('timer', keyword)
+        self._send(keyword, timer)
+        return True
+
+    def stop(self, keyword):
+        """Cancel the session's running timer (the round was reset by hand)"""
+        with self._lock:
+            self._timers.pop(keyword, None)
+        checkpoints.mark('timer', keyword)
+
+    def forget(self, keyword):
+        """Drop a session's timer and settings once it ends"""
+        with self._lock:
+            self._timers.pop(keyword, None)
+            self._settings.pop(keyword, None)
+        checkpoints.mark('timer', keyword)
+
+    def status(self, keyword):
+        """The session's settings and running timer, for the REST API"""
+        with self._lock:
+            settings = dict(self._settings.get(keyword) or {'pairing_seconds': None, 'talking_seconds': None,
+                                                            'auto_pair': False})
+            timer = self._timers.get(keyword)
+            if timer:
+                settings.update({'phase': timer['phase'], 'round': timer['round'],
+                                 'remaining': math.ceil(self._remaining(timer)), 'paused': timer['ends_at'] is None})
+            else:
+                settings.update({'phase': None, 'round': None, 'remaining': None, 'paused': False})
+        return settings
+
+    def export(self, keyword):
+        """A session's settings and running timer for checkpointing, with the deadline as wall-clock time"""
+        with self._lock:
+            settings = self._settings.get(keyword)
+            timer = self._timers.get(keyword)
+            if not settings and not timer:
+                return None
+            state = {'settings': settings, 'timer': None}
+            if timer:
+                state['timer'] = {'phase': timer['phase'], 'round': timer['round'],
+                                  'remaining': self._remaining(timer), 'paused': timer['ends_at'] is None,
+                                  'ends_at': time.time() + self._remaining(timer)}
+            return state
+
+    def restore(self, keyword, state):
+        with self._lock:
+            if state['settings']:
+                self._settings[keyword] = state['settings']
+            saved = state['timer']
+            if saved:
+                now = time.monotonic()
+                remaining = saved['remaining'] if saved['paused'] else max(0.0, saved['ends_at'] - time.time())
+                timer = {'phase': saved['phase'], 'round': saved['round'], 'remaining': remaining,
+                         'ends_at': None if saved['paused'] else now + remaining}
+                if saved['paused']:
+                    timer['generation'] = next(self._generations)
+                    self._timers[keyword] = timer
+                else:
+                    self._schedule(keyword, timer, now)
+
+    def _schedule(self, keyword, timer, now):
+        """Make timer the session's running timer and queue its next wake-up. Call with _lock held"""
+        timer['generation'] = next(self._generations)
+        self._timers[keyword] = timer
+        wake_at = min(timer['ends_at'], now + self.tick_seconds)
+        first = not self._heap or wake_at < self._heap[0][0]
+        heapq.heappush(self._heap, (wake_at, timer['generation'], keyword))
+        if first:
+            # The loop may be asleep waiting for a later entry
+            offload.call_soon(self._wake)
+
+    def _wake(self):
+        if not self._running:
+            self._running = True
+            self._wakeup = self.socketio.server.eio.create_event()
+            self.socketio.start_background_task(self._run)
+        else:
+            self._wakeup.set()
+
+    def _run(self):
+        """The one background task: sleep until the earliest wake-up, then tick or expire what is due"""
+        while True:
+            self._wakeup.clear()
+            now = time.monotonic()
+            ticks, expired = [], []
+            with self._lock:
+                while self._heap and self._heap[0][0] <= now:
+                    _, generation, keyword = heapq.heappop(self._heap)
+                    timer = self._timers.get(keyword)
+                    if not timer or timer['generation'] != generation:
+                        continue    # paused, replaced or stopped since it was queued
+                    if timer['ends_at'] <= now:
+                        del self._timers[keyword]
+                        expired.append((keyword, timer))
+                        checkpoints.mark('timer', keyword)
+                    else:
+                        heapq.heappush(self._heap, (min(timer['ends_at'], now + self.tick_seconds), generation, keyword))
+                        ticks.append((keyword, timer))
+                wait = self._heap[0][0] - now if self._heap else None
+
+            for keyword, timer in ticks:
+                self._send(keyword, timer)
+            if expired:
+                self.socketio.start_background_task(self._expire, expired)
+
+            self._wakeup.wait(wait)
+
+    def _expire(self, expired):
+        """Run what the end of each phase triggers, off the timer task (one task per batch of expiries)"""
+        for keyword, timer in expired:
+            try:
+                offload.run(self._advance, keyword, timer)
+            except Exception:
+                logger.exception("Round timer for %s round %s (%s) failed", keyword, timer['round'], timer['phase'])
+
+    def _advance(self, keyword, timer):
+        with self.app.app_context():
+            session = Session.query.filter_by(keyword=keyword).first()
+            if not session or session.end_time is not None:
+                return
+
+            if timer['phase'] == 'pairing':
+                if not RoundStateService.begin_discussion(session.id, timer['round']):
+                    return    # begun by hand or on another worker, or reset meanwhile
+                pairing_objects = RoundStateService.get_round(session.id, timer['round'])
+                if not pairing_objects:
+                    return    # reset by hand meanwhile
+                notify_discussion_started(keyword, pairing_objects)
+                DraftService.schedule(keyword)
+                self.phase_started(keyword, 'talking', timer['round'])
+                return
+
+            if not RoundStateService.clear_round(session.id, timer['round']):
+                return
+            notify_round_reset(keyword)
+            with self._lock:
+                settings = dict(self._settings.get(keyword) or {})
+            if not settings.get('auto_pair'):
+                self._tick(keyword, [timer['round'], 'i', settings.get('pairing_seconds') or 0, 0])
+                return
+
+            prompt_filter = DraftService.prompt_filter(keyword)
+            try:
+                plan = DraftService.take(keyword, prompt_filter) or DraftService.plan_round(keyword, prompt_filter)
+            except ValueError:
+                return    # too few students left to pair
+            pairing_objects = DraftService.commit_round(plan)
+            notify_pairing_created(keyword, pairing_objects)
+            self.phase_started(keyword, 'pairing', plan['pairing_plan']['round_number'])
+
+    def _send(self, keyword, timer):
+        self._tick(keyword, [
+            timer['round'],
+            PHASES[timer['phase']],
+            math.ceil(self._remaining(timer)),
+            1 if timer['ends_at'] is None else 0
+        ])
+
+    def _tick(self, keyword, payload):
+        offload.call_soon(self._emit_tick, keyword, payload)
+
+    def _emit_tick(self, keyword, payload):
+        self.socketio.emit("tick", payload, to=[keyword, instructor_room(keyword), individual_room(keyword)])
+
+    @staticmethod
+    def _remaining(timer):
+        if timer['ends_at'] is None:
+            return timer['remaining']
+        return max(0.0, timer['ends_at'] - time.monotonic())
+
+
+round_timers = RoundTimers()
+checkpoints.register('timer', round_timers.export, round_timers.restore)
@@ -0,0 +1,94 @@
+# convolute/backend/app/socket_events/snapshots.py
+
+"""
+Per-session round snapshot for reconnect resync.
+
+Holds, for each keyword, the current round, its phase and each student's
+latest notifications (pairing assignment and, once discussion has started,
+their prompt or start notice). A reconnecting student gets their own slice
+in a single resync event instead of the instructor re-running the round.
+Snapshots are checkpointed (see checkpoints.py), so they survive a restart.
+
+With a message queue the rounds of a session may run on several workers,
+so a reconnect is answered from the database instead (see
+events.handle_join): the session's checkpoint when it is for the current
+round, else the pairing phase rebuilt from the stored round_state. The
+checkpoint trails the round by up to CHECKPOINT_SECONDS.
+"""
+import copy
+import threading
+from ..checkpoints import checkpoints
+
+PAIRING = 'pairing'
+DISCUSSION = 'discussion'
+
+
+class SnapshotStore:
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._sessions = {}   # keyword -> {'round', 'phase', 'students': {username: {'assignment', 'discussion'}}}
+
+    def start_round(self, keyword, round_number, assignments):
+        """Replace a session's snapshot with a new round. assignments maps username -> pairing_assignment payload"""
+        with self._lock:
+            self._sessions[keyword] = self.new_round(round_number, assignments)
+        checkpoints.mark('snapshot', keyword)
+
+    @staticmethod
+    def new_round(round_number, assignments):
+        """The snapshot of a round in its pairing phase"""
+        students = {username: {'assignment': payload, 'discussion': None} for username, payload in assignments.items()}
+        return {'round': round_number, 'phase': PAIRING, 'students': students}
+
+    def start_discussion(self, keyword, round_number, assignments, discussions):
+        """
+        Move a round to discussion. discussions maps username -> discussion_prompt/discussion_started payload;
+        assignments (as for start_round) start the snapshot when the round was paired on another worker.
+        """
+        with self._lock:
+            snapshot = self._sessions.get(keyword)
+            if not snapshot or snapshot['round'] != round_number:
+                snapshot = self._sessions[keyword] = self.new_round(round_number, assignments)
+            snapshot['phase'] = DISCUSSION
+            for username, payload in discussions.items():
+                student = snapshot['students'].get(username)
+                if student:
+                    student['discussion'] = payload
+        checkpoints.mark('snapshot', keyword)
+
+    def clear(self, keyword):
+        """Forget a session's round (round reset or session ended)"""
+        with self._lock:
+            self._sessions.pop(keyword, None)
+        checkpoints.mark('snapshot', keyword)
+
+    def slice(self, keyword, username):
+        """A student's resync payload, or None if they have nothing to restore"""
+        with self._lock:
+            return self.slice_of(self._sessions.get(keyword), username)
+
+    @staticmethod
+    def slice_of(snapshot, username):
+        """A student's resync payload from a snapshot (or None), or None if they are not in it"""
+        student = snapshot and snapshot['students'].get(username)
+        if not student:
+            return None
+        return {
+            'round': snapshot['round'],
+            'phase': snapshot['phase'],
+            'assignment': student['assignment'],
+            'discussion': student['discussion']
+        }
+
+    def export(self, keyword):
+        """A session's snapshot for checkpointing, or None"""
+        with self._lock:
+            return copy.deepcopy(self._sessions.get(keyword))
+
+    def restore(self, keyword, snapshot):
+        with self._lock:
+            self._sessions[keyword] = snapshot
+
+
+snapshots = SnapshotStore()
+checkpoints.register('snapshot', snapshots.export, snapshots.restore)
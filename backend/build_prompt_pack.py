@@ -0,0 +1,72 @@
+#!/usr/bin/env python3
+
+# convolute/backend/build_prompt_pack.py
+"""
+Compile the data/*.json prompt files and the database's prompts into one
+prompt pack for prompt_server.py. Rebuild after importing prompts; running
+servers pick up the new pack when restarted.
+
+    python build_prompt_pack.py                  # data files + database -> PROMPT_PACK_PATH
+    python build_prompt_pack.py --no-db -o prompts.pack
+"""
+
+import argparse
+import glob
+import os
+import sys
+
+# Add the project root to Python path
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+
+from app.config import Config
+from app.prompts.pack import build_pack
+from app.serialization import loads
+
+DATA_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'data')
+
+
+def data_file_prompts():
+    """(text, tags) from every data/*.json file"""
+    for json_file in sorted(glob.glob(os.path.join(DATA_DIR, '*.json'))):
+        with open(json_file, 'rb') as f:
+            for item in loads(f.read()):
+                if isinstance(item, dict) and item.get('prompt'):
+                    yield item['prompt'], item.get('tags') or []
+
+
+def database_prompts():
+    """(text, tags) for every prompt in the database"""
+    from app import create_app
+    from app.extensions import db
+    from app.models import Prompt, PromptTag, Tag
+
+    app = create_app()
+    with app.app_context():
+        tags_of = {}
+        for prompt_id, tag in db.session.query(PromptTag.prompt_id, Tag.tag).join(Tag, Tag.id == PromptTag.tag_id):
+            tags_of.setdefault(prompt_id, []).append(tag)
+
+        rows = db.session.execute(db.select(Prompt.id, Prompt.prompt).order_by(Prompt.id).execution_options(yield_per=1000))
+        for prompt_id, text in rows:
+            yield text, tags_of.get(prompt_id, [])
+
+
+def main():
+    """Build the prompt pack"""
+    parser = argparse.ArgumentParser(description=__doc__.split('\n\n')[0])
+    parser.add_argument('-o', '--output', default=Config.PROMPT_PACK_PATH)
+    parser.add_argument('--no-db', action='store_true', help='only compile the data files')
+    args = parser.parse_args()
+
+    def prompts():
+        yield from data_file_prompts()
+        if not args.no_db:
+            yield from database_prompts()
+
+    os.makedirs(os.path.dirname(os.path.abspath(args.output)), exist_ok=True)
+    stats = build_pack(prompts(), args.output)
+    print(f"Wrote {args.output}: {stats['prompts']} prompts, {stats['tags']} tags, {stats['bytes']} bytes")
+
+
+if __name__ == '__main__':
+    main()
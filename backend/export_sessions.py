@@ -0,0 +1,62 @@
+#!/usr/bin/env python3
+
+# convolute/backend/export_sessions.py
+"""
+Export every ended session to its own file.
+Writes <out>/<keyword>-<session id>.<format>, streaming each session the
+same way as GET /api/session/<keyword>/export.
+
+    python export_sessions.py --out exports --format jsonl
+"""
+
+import argparse
+import os
+import sys
+
+# Add the project root to Python path
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+
+from app import create_app
+from app.extensions import db
+from app.models import Session
+from app.services.export_service import ExportService, FORMATS
+
+
+def main():
+    """Export all ended sessions"""
+    parser = argparse.ArgumentParser(description=__doc__.split('\n')[1])
+    parser.add_argument('--out', default='exports', help='directory to write the files to')
+    parser.add_argument('--format', choices=FORMATS, default='csv')
+    parser.add_argument('--overwrite', action='store_true', help='replace files that already exist')
+    args = parser.parse_args()
+
+    app = create_app()
+    os.makedirs(args.out, exist_ok=True)
+
+    with app.app_context():
+        sessions = db.session.execute(
+            db.select(Session.id, Session.keyword)
+            .where(Session.end_time.isnot(None))
+            .order_by(Session.id)
+        ).all()
+
+        written = skipped = 0
+        for session_id, keyword in sessions:
+            path = os.path.join(args.out, f"{keyword}-{session_id}.{args.format}")
+            if os.path.exists(path) and not args.overwrite:
+                skipped += 1
+                continue
+
+            session = db.session.get(Session, session_id)
+            with open(path, 'w', newline='', encoding='utf-8') as f:
+                for chunk in ExportService.stream(session, args.format):
+                    f.write(chunk)
+            db.session.expunge_all()
+            written += 1
+            print(f"Exported {keyword} -> {path}")
+
+        print(f"\n{written} sessions exported, {skipped} already present")
+
+
+if __name__ == '__main__':
+    main()
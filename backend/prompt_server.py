@@ -0,0 +1,106 @@
+#!/usr/bin/env python3
+
+# convolute/backend/prompt_server.py
+"""
+Prompt service backed by a memory-mapped prompt pack (see build_prompt_pack.py).
+
+Serves the contract the backend's prompt client expects at
+PROMPT_SERVICE_URL:
+
+    GET /api/prompt?category=<tag>            -> {"text": "..."}
+    GET /api/prompt?category=<tag>&count=<n>  -> {"texts": ["...", ...]}
+
+count may be at most MAX_COUNT; larger counts get 400 rather than fewer
+prompts than asked for (the backend's client splits its requests).
+
+An unknown or missing category draws from every prompt. The pack is
+mapped read-only, so any number of server processes on a host share one
+copy of it in the page cache:
+
+    python prompt_server.py --port 5001
+    gunicorn -k gevent -w 4 -b 0.0.0.0:5001 'prompt_server:create_prompt_app()'
+"""
+
+import argparse
+import os
+import sys
+from urllib.parse import parse_qs
+
+# Add the project root to Python path
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+
+from app.config import Config
+from app.prompts.pack import PromptPack
+from app.serialization import dumps
+
+MAX_COUNT = 100
+
+
+def create_prompt_app(pack_path=None):
+    """WSGI app serving prompts from the pack at pack_path (default PROMPT_PACK_PATH)"""
+    pack = PromptPack(pack_path or Config.PROMPT_PACK_PATH)
+
+    def reply(start_response, status, body):
+        data = dumps(body).encode()
+        start_response(status, [('Content-Type', 'application/json'), ('Content-Length', str(len(data)))])
+        return [data]
+
+    def app(environ, start_response):
+        if environ['PATH_INFO'] == '/health':
+            return reply(start_response, '200 OK', {'prompts': pack.count, 'tags': len(pack.tags)})
+        if environ['PATH_INFO'] != '/api/prompt':
+            return reply(start_response, '404 Not Found', {'error': 'not found'})
+        if not pack.count:
+            return reply(start_response, '503 Service Unavailable', {'error': 'prompt pack is empty'})
+
+        query = parse_qs(environ.get('QUERY_STRING', ''))
+        category = query.get('category', [None])[0]
+        if not pack.has_tag(category):
+            category = None
+
+        if 'count' not in query:
+            return reply(start_response, '200 OK', {'text': pack.random_prompt(category)})
+
+        try:
+            count = int(query['count'][0])
+        except ValueError:
+            return reply(start_response, '400 Bad Request', {'error': 'count must be an integer'})
+        if count > MAX_COUNT:
+            return reply(start_response, '400 Bad Request', {'error': f'count must be at most {MAX_COUNT}'})
+        count = max(1, count)
+        return reply(start_response, '200 OK', {'texts': [pack.random_prompt(category) for _ in range(count)]})
+
+    app.pack = pack
+    return app
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split('\n\n')[0])
+    parser.add_argument('--host', default='127.0.0.1')
+    parser.add_argument('--port', type=int, default=5001)
+    parser.add_argument('--pack', default=Config.PROMPT_PACK_PATH)
+    args = parser.parse_args()
+
+    app = create_prompt_app(args.pack)
+    print(f"Serving {app.pack.count} prompts from {args.pack} on http://{args.host}:{args.port}/api/prompt")
+
+    try:
+        from gevent import socket
+        from gevent.pywsgi import WSGIServer
+    except ImportError:
+        from wsgiref.simple_server import make_server
+        make_server(args.host, args.port, app).serve_forever()
+        return
+
+    # pywsgi sends headers and body as separate writes; without TCP_NODELAY (inherited
+    # by accepted sockets) Nagle and delayed ACKs add ~40 ms to every keep-alive request
+    listener = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+    listener.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+    listener.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+    listener.bind((args.host, args.port))
+    listener.listen(1024)
+    WSGIServer(listener, app, log=None).serve_forever()
+
+
+if __name__ == '__main__':
+    main()
@@ -7,5 +7,9 @@ from app.extensions import socketio
 app = create_app()
 
 if __name__ == '__main__':
+    # Pick up live classroom state from before the restart (see app/checkpoints.py), in the reloader's child only
+    if os.environ.get('WERKZEUG_RUN_MAIN') == 'true':
+        from app.checkpoints import checkpoints
+        checkpoints.restore()
     port = int(os.environ.get('PORT', 5000))
     socketio.run(app, host='0.0.0.0', port=port, debug=True, allow_unsafe_werkzeug=True)
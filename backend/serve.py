@@ -0,0 +1,34 @@
+# convolute/backend/serve.py
+
+"""
+Production entry point.
+
+Serves HTTP and Socket.IO from gevent, so an open websocket costs a
+greenlet instead of a thread, and runs without the Werkzeug debugger and
+reloader. REST handlers run on a pool of DB_THREADPOOL_SIZE threads so
+database work doesn't block the event loop. See DEPLOYMENT.md.
+
+    python serve.py
+    gunicorn -k gevent -w 1 --worker-connections 2000 serve:app
+"""
+
+import os
+
+# Patch the standard library before anything else imports it
+from gevent import monkey
+monkey.patch_all()
+
+os.environ['SOCKETIO_ASYNC_MODE'] = 'gevent'
+
+from app import create_app
+from app.extensions import socketio
+
+app = create_app()
+
+# Pick up live classroom state from before the restart (see app/checkpoints.py)
+from app.checkpoints import checkpoints
+checkpoints.restore()
+
+if __name__ == '__main__':
+    port = int(os.environ.get('PORT', 5000))
+    socketio.run(app, host='0.0.0.0', port=port, log_output=os.environ.get('ACCESS_LOG') == '1')
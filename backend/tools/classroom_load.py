@@ -0,0 +1,307 @@
+#!/usr/bin/env python3
+
+# convolute/backend/tools/classroom_load.py
+"""
+Synthetic classroom load against a running server.
+
+Starts --sessions guest sessions at once, each with an instructor socket
+and --students students, and drives the real flow for --rounds rounds:
+
+    create -> students (REST) -> join_session (socket)
+    -> pairings-with-prompts -> begin-discussion -> reset-round
+
+Reports p50/p95/p99 latency for every step and the end-to-end delivery
+time of socket notifications (from the moment the triggering request is
+sent until each client receives its event) as JSON, so runs can be diffed.
+
+Student sockets connect over the websocket transport, which needs
+websocket-client (pip install -r tools/requirements.txt).
+
+    python tools/classroom_load.py --url http://127.0.0.1:5000 --sessions 10 --students 30 --rounds 3 -o run.json
+"""
+
+import argparse
+import json
+import platform
+import sys
+import threading
+import time
+from collections import defaultdict
+from concurrent.futures import ThreadPoolExecutor
+
+import requests
+import socketio
+
+STUDENT_EVENTS = ('joined', 'pairing_assignment', 'discussion_prompt', 'discussion_started', 'round_reset')
+DISCUSSION_EVENTS = ('discussion_prompt', 'discussion_started')
+
+
+class Recorder:
+    """Latency samples shared by all session threads"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.steps = defaultdict(list)
+        self.deliveries = defaultdict(list)
+        self.errors = defaultdict(list)
+
+    def step(self, name, seconds):
+        with self._lock:
+            self.steps[name].append(seconds)
+
+    def delivery(self, name, seconds):
+        with self._lock:
+            self.deliveries[name].append(seconds)
+
+    def error(self, name, message):
+        with self._lock:
+            self.errors[name].append(message)
+
+    def report(self):
+        return {
+            'steps': {name: summarize(samples) for name, samples in sorted(self.steps.items())},
+            'delivery': {name: summarize(samples) for name, samples in sorted(self.deliveries.items())},
+            'errors': {name: {'count': len(messages), 'examples': sorted(set(messages))[:3]}
+                       for name, messages in sorted(self.errors.items())},
+        }
+
+
+def summarize(samples):
+    samples = sorted(samples)
+
+    def pct(p):
+        return round(samples[min(len(samples) - 1, int(len(samples) * p))] * 1000, 2)
+
+    return {
+        'count': len(samples),
+        'p50_ms': pct(0.50),
+        'p95_ms': pct(0.95),
+        'p99_ms': pct(0.99),
+        'max_ms': round(samples[-1] * 1000, 2),
+    }
+
+
+class Client:
+    """A Socket.IO connection that timestamps the events it receives"""
+
+    def __init__(self, url, origin, events):
+        self.url = url
+        # The server only accepts its CORS origins, so present the frontend's
+        self.sio = socketio.Client(reconnection=False, websocket_extra_options={'origin': origin})
+        self._cond = threading.Condition()
+        self._received = defaultdict(list)    # event -> [(perf_counter, data)]
+        for event in events:
+            self.sio.on(event, self._handler(event))
+
+    def _handler(self, event):
+        def record(data=None):
+            with self._cond:
+                self._received[event].append((time.perf_counter(), data))
+                self._cond.notify_all()
+        return record
+
+    def connect(self):
+        self.sio.connect(self.url, transports=['websocket'], wait_timeout=10)
+
+    def mark(self):
+        """Number of events received so far, to wait for the next ones"""
+        with self._cond:
+            return {event: len(items) for event, items in self._received.items()}
+
+    def wait(self, events, since, timeout, match=None):
+        """(event, time, data) of the first of events received after the since mark, or None on timeout"""
+        deadline = time.monotonic() + timeout
+        with self._cond:
+            while True:
+                for event in events:
+                    for received_at, data in self._received[event][since.get(event, 0):]:
+                        if match is None or match(data):
+                            return event, received_at, data
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    return None
+                self._cond.wait(remaining)
+
+    def close(self):
+        try:
+            self.sio.disconnect()
+        except Exception:
+            pass
+
+
+class Classroom:
+    def __init__(self, args, recorder):
+        self.api = args.url.rstrip('/') + '/api/session'
+        self.url = args.url
+        self.args = args
+        self.recorder = recorder
+        self.http = requests.Session()
+        self.keyword = None
+        self.instructor = None
+        self.students = {}
+
+    def timed(self, step, method, path, **kwargs):
+        """Send a request, recording its latency. Returns (sent_at, response) or (sent_at, None) on failure"""
+        sent_at = time.perf_counter()
+        try:
+            resp = self.http.request(method, self.api + path, timeout=self.args.timeout, **kwargs)
+        except requests.RequestException as e:
+            self.recorder.error(step, type(e).__name__)
+            return sent_at, None
+        self.recorder.step(step, time.perf_counter() - sent_at)
+        if resp.status_code >= 400:
+            self.recorder.error(step, f"HTTP {resp.status_code}")
+            return sent_at, None
+        return sent_at, resp
+
+    def run(self):
+        try:
+            _, resp = self.timed('create', 'POST', '/create')
+            if resp is None:
+                return
+            self.keyword = resp.json()['keyword']
+
+            self.instructor = Client(self.url, self.args.origin, ('instructor_joined', 'student_joined', 'roster_delta'))
+            try:
+                self.instructor.connect()
+            except Exception as e:
+                self.recorder.error('join_instructor_room', type(e).__name__)
+                return
+            since = self.instructor.mark()
+            self.instructor.sio.emit('join_instructor_room', {'keyword': self.keyword})
+            if not self.instructor.wait(('instructor_joined',), since, self.args.timeout):
+                self.recorder.error('join_instructor_room', 'no instructor_joined event')
+                return
+
+            for i in range(self.args.students):
+                self.join(f"student{i:04d}")
+
+            for _ in range(self.args.rounds):
+                if self.play_round() is None:
+                    return
+        finally:
+            # Disconnects wait for the client's reader thread, so close them all at once
+            clients = [client for client in list(self.students.values()) + [self.instructor] if client]
+            with ThreadPoolExecutor(max_workers=max(1, len(clients))) as pool:
+                list(pool.map(Client.close, clients))
+
+    def join(self, name):
+        """POST the student, then connect their socket and join the session room, as Join.jsx and Room.jsx do"""
+        mark = self.instructor.mark()
+        sent_at, resp = self.timed('students', 'POST', f'/{self.keyword}/students', json={'name': name})
+        if resp is None:
+            return
+
+        def announced(data):
+            """student_joined carries one student, roster_delta a batch"""
+            if 'joined' in data:
+                return any(s['name'] == name for s in data['joined'])
+            return data.get('student', {}).get('name') == name
+
+        student = Client(self.url, self.args.origin, STUDENT_EVENTS)
+        try:
+            student.connect()
+        except Exception as e:
+            self.recorder.error('join_session', type(e).__name__)
+            return
+        self.students[name] = student
+
+        since = student.mark()
+        started = time.perf_counter()
+        student.sio.emit('join_session', {'keyword': self.keyword, 'username': name})
+        sid = student.sio.get_sid()
+        got = student.wait(('joined',), since, self.args.timeout, match=lambda data: data.get('sid') == sid)
+        if got:
+            self.recorder.step('join_session', got[1] - started)
+        else:
+            self.recorder.error('join_session', 'no joined event')
+
+        got = self.instructor.wait(('student_joined', 'roster_delta'), mark, self.args.timeout, match=announced)
+        if got:
+            self.recorder.delivery('roster_update', got[1] - sent_at)
+        else:
+            self.recorder.error('roster_update', 'not announced')
+
+    def broadcast(self, step, path, body, expect):
+        """Send a round request and time delivery of the resulting notifications to every expected student"""
+        marks = {name: client.mark() for name, client in self.students.items()}
+        sent_at, resp = self.timed(step, 'POST', path, json=body)
+        if resp is None:
+            return None, {}
+
+        received = {}
+        for name, events in expect.items():
+            got = self.students[name].wait(events, marks[name], self.args.timeout)
+            if got:
+                event, received_at, data = got
+                self.recorder.delivery(event, received_at - sent_at)
+                received[name] = data
+            else:
+                self.recorder.error(step, f"{'/'.join(events)} not delivered")
+        return resp, received
+
+    def play_round(self):
+        everyone = {name: ('pairing_assignment',) for name in self.students}
+        resp, assignments = self.broadcast('pairings_with_prompts', f'/{self.keyword}/pairings-with-prompts',
+                                           {'prompt_filter': self.args.prompt_filter}, everyone)
+        if resp is None:
+            return None
+        pairings = resp.json()['pairings']
+        round_number = pairings[0]['round'] if pairings else None
+
+        paired = {name: DISCUSSION_EVENTS for name, data in assignments.items() if data.get('type') != 'break'}
+        self.broadcast('begin_discussion', f'/{self.keyword}/begin-discussion', {'round': round_number}, paired)
+
+        time.sleep(self.args.think)
+
+        self.broadcast('reset_round', f'/{self.keyword}/reset-round', {'round': round_number},
+                       {name: ('round_reset',) for name in self.students})
+        return round_number
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split('\n\n')[0])
+    parser.add_argument('--url', default='http://127.0.0.1:5000')
+    parser.add_argument('--origin', default='http://localhost:5173', help='Origin header; must be one of the server\'s CORS_ORIGINS')
+    parser.add_argument('--sessions', type=int, default=5)
+    parser.add_argument('--students', type=int, default=20, help='students per session')
+    parser.add_argument('--rounds', type=int, default=3)
+    parser.add_argument('--prompt-filter', default='general')
+    parser.add_argument('--think', type=float, default=0.5, help='seconds of discussion before each reset')
+    parser.add_argument('--timeout', type=float, default=10.0, help='seconds to wait for a response or notification')
+    parser.add_argument('-o', '--output', help='write the JSON report here instead of stdout')
+    args = parser.parse_args()
+
+    recorder = Recorder()
+    started_at = time.strftime('%Y-%m-%dT%H:%M:%S')
+    started = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=args.sessions) as pool:
+        for future in [pool.submit(Classroom(args, recorder).run) for _ in range(args.sessions)]:
+            future.result()
+
+    report = {
+        'config': {
+            'url': args.url,
+            'origin': args.origin,
+            'sessions': args.sessions,
+            'students': args.students,
+            'rounds': args.rounds,
+            'prompt_filter': args.prompt_filter,
+            'think': args.think,
+        },
+        'host': platform.node(),
+        'started_at': started_at,
+        'duration_s': round(time.perf_counter() - started, 2),
+        **recorder.report(),
+    }
+
+    if args.output:
+        with open(args.output, 'w') as f:
+            json.dump(report, f, indent=2)
+    else:
+        json.dump(report, sys.stdout, indent=2)
+        print()
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,144 @@
+#!/usr/bin/env python3
+
+# convolute/backend/tools/db_profiles.py
+"""
+Compare database engine profiles under concurrent joins and reads.
+
+For each profile, builds the schema in a fresh database, then runs
+--threads workers that each perform --ops operations against one shared
+session: a join (insert a Student, bump Session.student_count, commit) or,
+with probability --read-ratio, a roster read. Reports throughput, latency
+percentiles and how many operations failed (e.g. "database is locked").
+
+SQLite profiles get a fresh temporary file; pass --url to run the server
+profile against a PostgreSQL/MySQL database (its tables are dropped first).
+
+    python tools/db_profiles.py --profiles plain sqlite --threads 16 --ops 200
+"""
+
+import argparse
+import json
+import os
+import random
+import statistics
+import sys
+import tempfile
+import threading
+import time
+
+sys.path.append(os.path.join(os.path.dirname(__file__), '..'))
+
+from flask import Flask
+from sqlalchemy.exc import OperationalError
+
+from app.config import Config
+from app.database import configure_engine, install_pragmas
+from app.extensions import db
+from app.models import Session, Student
+
+
+def make_app(profile, url):
+    app = Flask(__name__)
+    app.config.from_object(Config)
+    app.config['SQLALCHEMY_DATABASE_URI'] = url
+    app.config['DB_PROFILE'] = profile
+    app.config['SQLALCHEMY_ENGINE_OPTIONS'] = {}
+    configure_engine(app)
+    db.init_app(app)
+    with app.app_context():
+        install_pragmas(app, db.engine)
+        db.drop_all()
+        db.create_all()
+        session = Session(keyword='bench')
+        db.session.add(session)
+        db.session.commit()
+    return app
+
+
+def worker(app, session_id, ops, read_ratio, latencies, errors, start):
+    rng = random.Random()
+    with app.app_context():
+        start.wait()
+        for i in range(ops):
+            began = time.perf_counter()
+            try:
+                if rng.random() < read_ratio:
+                    Student.query.filter_by(session_id=session_id).all()
+                    db.session.rollback()
+                else:
+                    db.session.add(Student(name=f"s{threading.get_ident()}-{i}", session_id=session_id))
+                    session = db.session.get(Session, session_id)
+                    session.student_count = (session.student_count or 0) + 1
+                    db.session.commit()
+                latencies.append(time.perf_counter() - began)
+            except OperationalError as e:
+                db.session.rollback()
+                errors.append(str(e.orig))
+        db.session.remove()
+
+
+def run(profile, url, threads, ops, read_ratio):
+    app = make_app(profile, url)
+    with app.app_context():
+        session_id = Session.query.filter_by(keyword='bench').first().id
+
+    latencies, errors = [], []
+    start = threading.Barrier(threads + 1)
+    pool = [threading.Thread(target=worker, args=(app, session_id, ops, read_ratio, latencies, errors, start))
+            for _ in range(threads)]
+    for t in pool:
+        t.start()
+    start.wait()
+    began = time.perf_counter()
+    for t in pool:
+        t.join()
+    elapsed = time.perf_counter() - began
+
+    with app.app_context():
+        db.engine.dispose()
+
+    latencies.sort()
+
+    def pct(p):
+        return round(latencies[min(len(latencies) - 1, int(len(latencies) * p))] * 1000, 2) if latencies else None
+
+    return {
+        'profile': profile,
+        'threads': threads,
+        'operations': threads * ops,
+        'completed': len(latencies),
+        'failed': len(errors),
+        'errors': sorted(set(errors))[:3],
+        'ops_per_sec': round(len(latencies) / elapsed, 1),
+        'p50_ms': pct(0.50),
+        'p95_ms': pct(0.95),
+        'p99_ms': pct(0.99),
+        'mean_ms': round(statistics.mean(latencies) * 1000, 2) if latencies else None,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split('\n\n')[0])
+    parser.add_argument('--profiles', nargs='+', default=['plain', 'sqlite'], choices=['plain', 'sqlite', 'server'])
+    parser.add_argument('--url', help='database URL for the server profile')
+    parser.add_argument('--threads', type=int, default=16)
+    parser.add_argument('--ops', type=int, default=200, help='operations per thread')
+    parser.add_argument('--read-ratio', type=float, default=0.5)
+    args = parser.parse_args()
+
+    results = []
+    for profile in args.profiles:
+        if profile == 'server':
+            if not args.url:
+                parser.error('the server profile needs --url')
+            url = args.url
+        else:
+            url = 'sqlite:///' + os.path.join(tempfile.mkdtemp(), 'bench.sqlite3')
+        results.append(run(profile, url, args.threads, args.ops, args.read_ratio))
+
+    json.dump(results, sys.stdout, indent=2)
+    print()
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,159 @@
+#!/usr/bin/env python3
+
+# convolute/backend/tools/join_storm.py
+"""
+Fire a storm of parallel joins at one session and check the final state.
+
+Creates a guest session, then sends --joins POST /api/session/<keyword>/students
+requests from --threads threads at once. Every name is asked for
+--attempts times, so the same name races itself. Afterwards each name must
+be on the roster exactly once, exactly one request per name must have got
+201 and the rest 409, and Session.student_count must equal the number of
+names. Exits non-zero if any check fails.
+
+By default the app runs in this process on a fresh SQLite file, and the
+count is read from the database. With
+--url the joins go to a running server and only the roster is checked,
+because the count is not exposed to guests.
+
+    python tools/join_storm.py --joins 1000 --threads 64
+    python tools/join_storm.py --url http://127.0.0.1:5000 --joins 1000
+
+The same storm runs as a test (1,000 joins over 64 threads, in process),
+failing with the report of the checks that did not hold:
+
+    python -m pytest tools/join_storm.py
+"""
+
+import argparse
+import json
+import os
+import statistics
+import sys
+import tempfile
+import threading
+import time
+from collections import Counter
+from concurrent.futures import ThreadPoolExecutor
+
+sys.path.append(os.path.join(os.path.dirname(__file__), '..'))
+
+
+class LocalClient:
+    """The app in this process, on a fresh SQLite database"""
+
+    def __init__(self):
+        os.environ['DATABASE_URL'] = 'sqlite:///' + os.path.join(tempfile.mkdtemp(), 'storm.sqlite3')
+        from app import create_app
+        self.app = create_app()
+        self._local = threading.local()
+
+    def request(self, method, path, json=None):
+        client = getattr(self._local, 'client', None)
+        if client is None:
+            client = self._local.client = self.app.test_client()
+        resp = client.open(path, method=method, json=json)
+        return resp.status_code, resp.get_json()
+
+    def student_count(self, keyword):
+        from app.extensions import db
+        from app.models import Session
+        with self.app.app_context():
+            return db.session.query(Session.student_count).filter_by(keyword=keyword).scalar()
+
+
+class RemoteClient:
+    """A running server"""
+
+    def __init__(self, url, timeout):
+        import requests
+        self.url = url.rstrip('/')
+        self.timeout = timeout
+        self.http = requests.Session()
+        self.http.mount('http://', requests.adapters.HTTPAdapter(pool_maxsize=256))
+
+    def request(self, method, path, json=None):
+        resp = self.http.request(method, self.url + path, json=json, timeout=self.timeout)
+        return resp.status_code, resp.json()
+
+    def student_count(self, keyword):
+        return None
+
+
+def join(client, keyword, name):
+    started = time.perf_counter()
+    status, _ = client.request('POST', f'/api/session/{keyword}/students', json={'name': name})
+    return name, status, (time.perf_counter() - started) * 1000
+
+
+def run_storm(client, joins, attempts, threads):
+    """Run the storm against a new session and return its report, including the outcome of each check"""
+    status, body = client.request('POST', '/api/session/create')
+    if status != 201:
+        raise RuntimeError(f'create failed: HTTP {status}')
+    keyword = body['keyword']
+
+    names = [f'student-{i // attempts}' for i in range(joins)]
+    started = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=threads) as pool:
+        results = list(pool.map(lambda name: join(client, keyword, name), names))
+    elapsed = time.perf_counter() - started
+
+    _, roster = client.request('GET', f'/api/session/{keyword}/students')
+    on_roster = Counter(student['name'] for student in roster['students'])
+    added = Counter(name for name, status, _ in results if status == 201)
+    statuses = Counter(status for _, status, _ in results)
+    expected = set(names)
+    student_count = client.student_count(keyword)
+
+    checks = {
+        'every_name_on_roster_once': set(on_roster) == expected and all(n == 1 for n in on_roster.values()),
+        'one_201_per_name': set(added) == expected and all(n == 1 for n in added.values()),
+        'others_409': statuses[409] == len(names) - len(expected),
+        'student_count_matches': student_count is None or student_count == len(expected),
+    }
+    latencies = sorted(ms for _, _, ms in results)
+
+    return {
+        'joins': len(names),
+        'names': len(expected),
+        'threads': threads,
+        'elapsed_s': round(elapsed, 2),
+        'joins_per_sec': round(len(names) / elapsed, 1),
+        'p50_ms': round(latencies[len(latencies) // 2], 2),
+        'p99_ms': round(latencies[min(len(latencies) - 1, int(len(latencies) * 0.99))], 2),
+        'mean_ms': round(statistics.mean(latencies), 2),
+        'statuses': dict(statuses),
+        'roster': sum(on_roster.values()),
+        'student_count': student_count,
+        'checks': checks,
+    }
+
+
+def test_join_storm():
+    report = run_storm(LocalClient(), joins=1000, attempts=2, threads=64)
+    failed = [name for name, ok in report['checks'].items() if not ok]
+    assert not failed, f"checks failed: {', '.join(failed)}\n{json.dumps(report, indent=2)}"
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split('\n\n')[0])
+    parser.add_argument('--url', help='server to test instead of an in-process app')
+    parser.add_argument('--joins', type=int, default=1000, help='join requests in the storm')
+    parser.add_argument('--attempts', type=int, default=2, help='requests per name')
+    parser.add_argument('--threads', type=int, default=64)
+    parser.add_argument('--timeout', type=float, default=60.0)
+    args = parser.parse_args()
+
+    client = RemoteClient(args.url, args.timeout) if args.url else LocalClient()
+    try:
+        report = run_storm(client, args.joins, args.attempts, args.threads)
+    except RuntimeError as e:
+        sys.exit(str(e))
+    json.dump(report, sys.stdout, indent=2)
+    print()
+    sys.exit(0 if all(report['checks'].values()) else 1)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,119 @@
+#!/usr/bin/env python3
+
+# convolute/backend/tools/login_burst.py
+"""
+Measure socket latency while a burst of logins hashes passwords.
+
+Registers one instructor, then times join_instructor_room round trips on
+an open websocket, first with the server idle and then while --logins
+concurrent POST /api/auth/login requests run. Password hashing runs on its
+own bounded pool (HASH_MAX_CONCURRENCY), so socket round trips should stay
+close to the idle figures while logins queue for a hash slot.
+
+Requires websocket-client (pip install websocket-client).
+
+    python tools/login_burst.py --url http://127.0.0.1:5000 --logins 100
+"""
+
+import argparse
+import json
+import statistics
+import sys
+import threading
+import time
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+
+import requests
+
+from socket_capacity import join_round_trip, open_socket
+
+
+def summarize(samples):
+    samples = sorted(samples)
+    if not samples:
+        return {'count': 0}
+
+    def pct(p):
+        return round(samples[min(len(samples) - 1, int(len(samples) * p))], 2)
+
+    return {
+        'count': len(samples),
+        'p50_ms': pct(0.50),
+        'p95_ms': pct(0.95),
+        'p99_ms': pct(0.99),
+        'max_ms': round(samples[-1], 2),
+        'mean_ms': round(statistics.mean(samples), 2),
+    }
+
+
+def probe(ws, keyword, interval, stop, samples):
+    """Time round trips on ws until stop is set"""
+    while not stop.is_set():
+        samples.append(join_round_trip(ws, keyword))
+        time.sleep(interval)
+
+
+def probe_for(ws, keyword, interval, seconds):
+    samples, stop = [], threading.Event()
+    thread = threading.Thread(target=probe, args=(ws, keyword, interval, stop, samples))
+    thread.start()
+    time.sleep(seconds)
+    stop.set()
+    thread.join()
+    return samples
+
+
+def login(url, email, password, timeout):
+    started = time.perf_counter()
+    resp = requests.post(f'{url}/api/auth/login', json={'email': email, 'password': password}, timeout=timeout)
+    return (time.perf_counter() - started) * 1000, resp.status_code
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split('\n\n')[0])
+    parser.add_argument('--url', default='http://127.0.0.1:5000')
+    parser.add_argument('--logins', type=int, default=50, help='concurrent logins in the burst')
+    parser.add_argument('--idle', type=float, default=3.0, help='seconds of probing before the burst')
+    parser.add_argument('--interval', type=float, default=0.01, help='pause between probe round trips')
+    parser.add_argument('--timeout', type=float, default=60.0)
+    args = parser.parse_args()
+
+    url = args.url.rstrip('/')
+    email, password = f'burst-{uuid.uuid4().hex[:8]}@example.com', 'burst-password'
+    resp = requests.post(f'{url}/api/auth/register', json={'email': email, 'password': password}, timeout=args.timeout)
+    if resp.status_code != 201:
+        sys.exit(f'register failed: HTTP {resp.status_code}')
+
+    ws_url = url.replace('http', 'ws', 1) + '/socket.io/?EIO=4&transport=websocket'
+    ws = open_socket(ws_url, args.timeout)
+    keyword = f'BURST{uuid.uuid4().hex[:4]}'
+
+    idle = probe_for(ws, keyword, args.interval, args.idle)
+
+    burst, stop = [], threading.Event()
+    thread = threading.Thread(target=probe, args=(ws, keyword, args.interval, stop, burst))
+    thread.start()
+    started = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=args.logins) as pool:
+        logins = list(pool.map(lambda _: login(url, email, password, args.timeout), range(args.logins)))
+    elapsed = time.perf_counter() - started
+    stop.set()
+    thread.join()
+    ws.close()
+
+    report = {
+        'url': url,
+        'logins': args.logins,
+        'burst_s': round(elapsed, 2),
+        'failed_logins': sum(1 for _, status in logins if status != 200),
+        'login': summarize([ms for ms, _ in logins]),
+        'socket_idle': summarize(idle),
+        'socket_during_burst': summarize(burst),
+    }
+    json.dump(report, sys.stdout, indent=2)
+    print()
+
+
+if __name__ == '__main__':
+    main()
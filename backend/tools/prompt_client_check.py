@@ -0,0 +1,189 @@
+#!/usr/bin/env python3
+
+# convolute/backend/tools/prompt_client_check.py
+"""
+Check the prompt client's circuit breaker and fallback against the stub service.
+
+Starts tools/prompt_stub.py in this process on a free port, switching it
+between healthy and failing (503) as needed, and an app on a fresh SQLite
+file for the local fallback. The checks:
+
+    breaker_opens        after failure_threshold failed requests the breaker
+                         opens and further calls do not reach the service
+    breaker_half_opens   after reset_seconds one trial request is let
+                         through; a failed trial reopens the breaker and a
+                         successful one closes it
+    fallback_count       while the service fails, is unreachable or returns
+                         too few texts, get_prompts still returns the
+                         requested number of prompts
+
+    python tools/prompt_client_check.py
+    python -m pytest tools/prompt_client_check.py
+"""
+
+import os
+import sys
+import tempfile
+import threading
+import time
+from http.server import ThreadingHTTPServer
+
+sys.path.append(os.path.join(os.path.dirname(__file__), '..'))
+sys.path.append(os.path.dirname(__file__))
+
+from prompt_stub import PROMPTS, make_handler  # noqa: E402
+
+RESET_SECONDS = 0.3
+
+
+class Stub:
+    """The prompt stub on a free port, counting the requests it answers"""
+
+    def __init__(self):
+        self.requests = 0
+        self.server = ThreadingHTTPServer(('127.0.0.1', 0), self._handler(0.0))
+        self.url = f'http://127.0.0.1:{self.server.server_address[1]}/api/prompt'
+        threading.Thread(target=self.server.serve_forever, daemon=True).start()
+
+    def _handler(self, fail_rate):
+        stub = self
+
+        class CountingHandler(make_handler(0.0, fail_rate)):
+            def do_GET(self):
+                stub.requests += 1
+                super().do_GET()
+        return CountingHandler
+
+    def failing(self, failing):
+        self.server.RequestHandlerClass = self._handler(1.0 if failing else 0.0)
+
+    def close(self):
+        self.server.shutdown()
+        self.server.server_close()
+
+
+_app = None
+
+
+def app():
+    """An app on a fresh SQLite file, for PromptService to fall back to"""
+    global _app
+    if _app is None:
+        os.environ['DATABASE_URL'] = 'sqlite:///' + os.path.join(tempfile.mkdtemp(), 'prompts.sqlite3')
+        from app import create_app
+        _app = create_app()
+    return _app
+
+
+def client(url, failure_threshold=3):
+    from app.prompts.client import PromptClient
+    return PromptClient(url, failure_threshold=failure_threshold, reset_seconds=RESET_SECONDS)
+
+
+def test_breaker_opens():
+    stub = Stub()
+    try:
+        with app().app_context():
+            prompts = client(stub.url)
+            stub.failing(True)
+            for _ in range(3):
+                prompts.get_prompts(2)
+            assert stub.requests == 3, f'{stub.requests} requests before the breaker opened, expected 3'
+            assert prompts.breaker.state == 'open', prompts.breaker.state
+
+            stub.failing(False)
+            prompts.get_prompts(2)
+            assert stub.requests == 3, 'a request reached the service while the breaker was open'
+    finally:
+        stub.close()
+
+
+def test_breaker_half_opens():
+    stub = Stub()
+    try:
+        with app().app_context():
+            prompts = client(stub.url)
+            stub.failing(True)
+            for _ in range(3):
+                prompts.get_prompts(1)
+            time.sleep(RESET_SECONDS * 1.2)
+            assert prompts.breaker.state == 'half-open', prompts.breaker.state
+
+            # Only one trial goes through; a failed one opens the breaker for another reset_seconds
+            assert prompts.breaker.allow() and not prompts.breaker.allow(), 'half-open breaker allowed two trials'
+            prompts.breaker.record_failure()
+            assert prompts.breaker.state == 'open', prompts.breaker.state
+            prompts.get_prompts(1)
+            assert stub.requests == 3, 'a request reached the service after a failed trial'
+
+            # A successful trial closes it
+            stub.failing(False)
+            time.sleep(RESET_SECONDS * 1.2)
+            texts = prompts.get_prompts(2)
+            assert stub.requests == 4, f'{stub.requests - 3} trial requests, expected 1'
+            assert prompts.breaker.state == 'closed', prompts.breaker.state
+            assert all(map(_from_stub, texts)), f'trial answer not from the service: {texts}'
+    finally:
+        stub.close()
+
+
+def test_fallback_count():
+    stub = Stub()
+    try:
+        with app().app_context():
+            # Failing service, then an open breaker
+            prompts = client(stub.url, failure_threshold=2)
+            stub.failing(True)
+            for count in (1, 5, 3, 7):
+                texts = prompts.get_prompts(count, 'daily_life')
+                assert len(texts) == count, f'asked for {count}, got {len(texts)}'
+                assert not any(_from_stub(text) for text in texts), 'fallback returned stub prompts'
+            assert prompts.breaker.state == 'open', prompts.breaker.state
+
+            # Nothing listening
+            unreachable = client('http://127.0.0.1:9/api/prompt')
+            assert len(unreachable.get_prompts(4)) == 4
+
+            # A service that returns fewer texts than asked for is topped up locally
+            short = client(stub.url)
+            stub.failing(False)
+            short.session.get = _truncating(short.session.get, 2)
+            texts = short.get_prompts(6)
+            assert len(texts) == 6, f'asked for 6, got {len(texts)}'
+            assert sum(map(_from_stub, texts)) == 2, texts
+
+            assert prompts.get_prompts(0) == []
+    finally:
+        stub.close()
+
+
+def _from_stub(text):
+    return text.split('] ', 1)[-1] in PROMPTS
+
+
+def _truncating(get, keep):
+    """Wrap session.get so the service's JSON carries only keep texts"""
+    def truncated(*args, **kwargs):
+        resp = get(*args, **kwargs)
+        texts = resp.json()['texts'][:keep]
+        resp.json = lambda: {'texts': texts}
+        return resp
+    return truncated
+
+
+def main():
+    failed = 0
+    for name, check in (('breaker_opens', test_breaker_opens),
+                        ('breaker_half_opens', test_breaker_half_opens),
+                        ('fallback_count', test_fallback_count)):
+        try:
+            check()
+            print(f'{name}: ok')
+        except AssertionError as e:
+            failed += 1
+            print(f'{name}: FAILED {e}')
+    sys.exit(1 if failed else 0)
+
+
+if __name__ == '__main__':
+    main()
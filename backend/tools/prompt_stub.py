@@ -0,0 +1,86 @@
+#!/usr/bin/env python3
+
+# convolute/backend/tools/prompt_stub.py
+"""
+Stand-in for the external prompt service, for exercising the prompt client
+locally.
+
+Serves GET /api/prompt?category=<tag>[&count=<n>] with canned prompts.
+--delay and --fail-rate make it slow or flaky so the client's timeouts,
+circuit breaker and fallback to the local database can be watched in
+action.
+
+    python tools/prompt_stub.py --port 5001 --delay 2.5 --fail-rate 0.3
+"""
+
+import argparse
+import json
+import random
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, urlparse
+
+PROMPTS = [
+    "What is something you changed your mind about recently?",
+    "Describe a skill you would like to learn and why.",
+    "What makes an explanation easy to follow?",
+    "Which invention has most changed daily life?",
+    "What would you do with an extra hour every day?",
+]
+
+
+def make_handler(delay, fail_rate):
+    class PromptHandler(BaseHTTPRequestHandler):
+        def do_GET(self):
+            url = urlparse(self.path)
+            if url.path != '/api/prompt':
+                self._reply(404, {'error': 'not found'})
+                return
+
+            if delay:
+                time.sleep(delay)
+            if random.random() < fail_rate:
+                self._reply(503, {'error': 'stub failure'})
+                return
+
+            query = parse_qs(url.query)
+            category = query.get('category', [None])[0]
+            prefix = f"[{category}] " if category else ""
+            if 'count' in query:
+                count = int(query['count'][0])
+                self._reply(200, {'texts': [prefix + random.choice(PROMPTS) for _ in range(count)]})
+            else:
+                self._reply(200, {'text': prefix + random.choice(PROMPTS)})
+
+        def _reply(self, status, body):
+            data = json.dumps(body).encode()
+            self.send_response(status)
+            self.send_header('Content-Type', 'application/json')
+            self.send_header('Content-Length', str(len(data)))
+            self.end_headers()
+            self.wfile.write(data)
+
+        def log_message(self, format, *args):
+            pass
+
+    return PromptHandler
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split('\n\n')[0])
+    parser.add_argument('--host', default='127.0.0.1')
+    parser.add_argument('--port', type=int, default=5001)
+    parser.add_argument('--delay', type=float, default=0.0, help='seconds to wait before answering')
+    parser.add_argument('--fail-rate', type=float, default=0.0, help='fraction of requests answered with 503')
+    args = parser.parse_args()
+
+    server = ThreadingHTTPServer((args.host, args.port), make_handler(args.delay, args.fail_rate))
+    print(f"Prompt stub listening on http://{args.host}:{args.port}/api/prompt")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+
+
+if __name__ == '__main__':
+    main()
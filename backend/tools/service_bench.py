@@ -0,0 +1,202 @@
+#!/usr/bin/env python3
+
+# convolute/backend/tools/service_bench.py
+"""
+Microbenchmarks for the service layer, checked against stored baselines.
+
+Builds temp-file SQLite databases with generated prompt corpora
+(10/1k/100k prompts) and rosters (10/500/5k students), then times
+KeywordService.get_next_keyword, PromptService.get_prompt_by_tags,
+PromptService.get_prompt_for_filter_with_session,
+PairingService.create_pairings and PromptService.bulk_import_prompts.
+
+Each result is the fastest of repeated calls, the least noisy estimate on
+a shared machine; bulk_import_prompts imports a batch of IMPORT_BATCH new
+prompts into the corpus of the given size. With --check the results are
+compared with the baseline file and the script exits with status 1 if any
+benchmark is slower than its baseline by more than --threshold (a
+fraction; defaults to the baseline file's, else 0.25). Baselines are
+machine-specific: record them with --update on the machine that runs the
+check.
+
+    python tools/service_bench.py --update          # record baselines
+    python tools/service_bench.py --check           # compare, exit 1 on regression
+    python tools/service_bench.py --check --quick   # skip the 100k/5k sizes
+"""
+
+import argparse
+import itertools
+import json
+import os
+import random
+import sys
+import tempfile
+import time
+
+sys.path.append(os.path.join(os.path.dirname(__file__), '..'))
+
+from flask import Flask
+
+from app.config import Config
+from app.database import configure_engine, install_pragmas
+from app.extensions import db
+from app.models import Prompt, PromptTag, Session, Student, Tag
+from app.services.keyword_service import KeywordService
+from app.services.pairing_service import PairingService
+from app.services.prompt_service import PromptService
+
+BASELINE = os.path.join(os.path.dirname(__file__), 'service_bench_baseline.json')
+PROMPT_SIZES = (10, 1000, 100000)
+STUDENT_SIZES = (10, 500, 5000)
+IMPORT_BATCH = 100
+TAGS = ['general', 'technical', 'personal', 'academic', 'creative', 'teamwork',
+        'daily_life', 'job_interview', 'present_perfect', 'daily_routines']
+
+
+def make_app(directory, name):
+    app = Flask(name)
+    app.config.from_object(Config)
+    app.config['SQLALCHEMY_DATABASE_URI'] = 'sqlite:///' + os.path.join(directory, name + '.sqlite3')
+    app.config['SQLALCHEMY_ENGINE_OPTIONS'] = {}
+    configure_engine(app)
+    db.init_app(app)
+    with app.app_context():
+        install_pragmas(app, db.engine)
+        db.create_all()
+    return app
+
+
+def seed_prompts(count, rng):
+    """count prompts, each with one to three tags"""
+    db.session.execute(db.insert(Tag), [{'tag': tag, 'public': True} for tag in TAGS])
+    tag_ids = [tag.id for tag in Tag.query.order_by(Tag.id)]
+    db.session.execute(db.insert(Prompt), [{'prompt': f"Generated prompt {i}: {rng.random()}"} for i in range(count)])
+    links = []
+    for prompt_id in range(1, count + 1):
+        for tag_id in rng.sample(tag_ids, rng.randint(1, 3)):
+            links.append({'prompt_id': prompt_id, 'tag_id': tag_id})
+    db.session.execute(db.insert(PromptTag), links)
+    db.session.commit()
+
+
+def seed_session(keyword, students):
+    session = Session(keyword=keyword, instructor_id=0, student_count=students)
+    db.session.add(session)
+    db.session.flush()
+    db.session.execute(db.insert(Student), [{'name': f"student{i}", 'session_id': session.id, 'round_count': 0}
+                                            for i in range(students)])
+    db.session.commit()
+    return session
+
+
+def import_batch(batch, rng):
+    """IMPORT_BATCH prompts not seen in earlier batches, in the bulk-import format"""
+    return [{'prompt': f"Imported prompt {batch}-{i}", 'tags': rng.sample(TAGS, 2) + ['imported']}
+            for i in range(IMPORT_BATCH)]
+
+
+def measure(fn, min_runs=5, max_runs=500, min_time=1.0):
+    """Fastest seconds per call of fn, run at least min_runs times and for at least min_time seconds"""
+    fn()    # warm up statement caches and the connection pool
+    timings = []
+    started = time.perf_counter()
+    while len(timings) < max_runs and (len(timings) < min_runs or time.perf_counter() - started < min_time):
+        began = time.perf_counter()
+        fn()
+        timings.append(time.perf_counter() - began)
+    return min(timings), len(timings)
+
+
+def run_benchmarks(directory, prompt_sizes, student_sizes):
+    rng = random.Random(1234)
+    results = {}
+
+    app = make_app(directory, 'keywords')
+    with app.app_context():
+        KeywordService.populate_keywords()
+        results['get_next_keyword'] = measure(KeywordService.get_next_keyword)
+
+    for size in prompt_sizes:
+        app = make_app(directory, f'prompts_{size}')
+        with app.app_context():
+            seed_prompts(size, rng)
+            seed_session('BENCH', 2)
+            results[f'get_prompt_by_tags[prompts={size}]'] = measure(
+                lambda: PromptService.get_prompt_by_tags(['general', 'technical']))
+            results[f'get_prompt_for_filter_with_session[prompts={size}]'] = measure(
+                lambda: PromptService.get_prompt_for_filter_with_session('general', 'BENCH'))
+
+            batches = itertools.count()
+            results[f'bulk_import_prompts[prompts={size}]'] = measure(
+                lambda: PromptService.bulk_import_prompts(import_batch(next(batches), rng)), min_time=0)
+
+    for size in student_sizes:
+        app = make_app(directory, f'students_{size}')
+        with app.app_context():
+            seed_session('BENCH', size)
+            results[f'create_pairings[students={size}]'] = measure(lambda: PairingService.create_pairings('BENCH'))
+
+    return results
+
+
+def compare(results, baselines, threshold):
+    """Rows of (name, seconds, baseline, ratio, regressed)"""
+    rows = []
+    for name, (seconds, _) in results.items():
+        baseline = baselines.get(name, {}).get('best_s')
+        ratio = seconds / baseline if baseline else None
+        rows.append((name, seconds, baseline, ratio, ratio is not None and ratio > 1 + threshold))
+    return rows
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split('\n\n')[0])
+    parser.add_argument('--baseline', default=BASELINE, help='baseline file (default: %(default)s)')
+    parser.add_argument('--threshold', type=float,
+                        help='allowed slowdown as a fraction of the baseline (default: the baseline file\'s, else 0.25)')
+    parser.add_argument('--quick', action='store_true', help='skip the 100k prompt and 5k student sizes')
+    parser.add_argument('--check', action='store_true', help='exit with status 1 if a benchmark regressed')
+    parser.add_argument('--update', action='store_true', help='write the results as the new baselines')
+    parser.add_argument('--json', action='store_true', help='print results as JSON instead of a table')
+    args = parser.parse_args()
+
+    prompt_sizes = PROMPT_SIZES[:-1] if args.quick else PROMPT_SIZES
+    student_sizes = STUDENT_SIZES[:-1] if args.quick else STUDENT_SIZES
+
+    with tempfile.TemporaryDirectory() as directory:
+        results = run_benchmarks(directory, prompt_sizes, student_sizes)
+
+    baselines, threshold = {}, 0.25
+    if os.path.exists(args.baseline):
+        with open(args.baseline) as f:
+            stored = json.load(f)
+        baselines, threshold = stored['benchmarks'], stored.get('threshold', threshold)
+    if args.threshold is not None:
+        threshold = args.threshold
+
+    rows = compare(results, baselines, threshold)
+
+    if args.json:
+        json.dump([{'name': name, 'best_s': seconds, 'runs': results[name][1], 'baseline_s': baseline,
+                    'ratio': ratio, 'regressed': regressed}
+                   for name, seconds, baseline, ratio, regressed in rows], sys.stdout, indent=2)
+        print()
+    else:
+        print(f"{'benchmark':<52} {'best':>12} {'baseline':>12} {'ratio':>7}")
+        for name, seconds, baseline, ratio, regressed in rows:
+            print(f"{name:<52} {seconds * 1000:>10.3f}ms "
+                  f"{(f'{baseline * 1000:.3f}ms' if baseline else '-'):>12} "
+                  f"{(f'{ratio:.2f}' if ratio else '-'):>7}{'  REGRESSED' if regressed else ''}")
+
+    if args.update:
+        baselines.update({name: {'best_s': round(seconds, 6), 'runs': runs} for name, (seconds, runs) in results.items()})
+        with open(args.baseline, 'w') as f:
+            json.dump({'threshold': threshold, 'benchmarks': dict(sorted(baselines.items()))}, f, indent=2)
+            f.write('\n')
+
+    if args.check and any(regressed for *_, regressed in rows):
+        sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
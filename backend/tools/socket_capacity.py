@@ -0,0 +1,105 @@
+#!/usr/bin/env python3
+
+# convolute/backend/tools/socket_capacity.py
+"""
+Measure how many concurrent Socket.IO websocket connections a running
+server holds, and how responsive it stays while holding them.
+
+Opens N raw Engine.IO websockets (no client threads), has each join an
+instructor room, then times fresh join round trips while all N are open.
+Pass --pid to also report the server's RSS and thread count.
+
+Requires websocket-client (pip install -r tools/requirements.txt).
+
+    python tools/socket_capacity.py --url http://127.0.0.1:5000 -n 1000 --pid 1234
+"""
+
+import argparse
+import json
+import statistics
+import sys
+import time
+
+import websocket
+
+
+def open_socket(ws_url, timeout):
+    """Open an Engine.IO websocket and connect the default namespace"""
+    ws = websocket.create_connection(ws_url, timeout=timeout, suppress_origin=True)
+    ws.recv()               # Engine.IO open packet
+    ws.send('40')           # Socket.IO connect
+    ws.recv()               # Socket.IO connect ack
+    return ws
+
+
+def join_round_trip(ws, keyword):
+    """Time join_instructor_room -> instructor_joined on an open socket"""
+    started = time.perf_counter()
+    ws.send('42' + json.dumps(['join_instructor_room', {'keyword': keyword}]))
+    while True:
+        packet = ws.recv()
+        if packet == '2':
+            ws.send('3')    # answer Engine.IO pings while waiting
+        elif packet.startswith('42') and 'instructor_joined' in packet:
+            return (time.perf_counter() - started) * 1000
+
+
+def process_stats(pid):
+    """RSS (MB) and thread count of a local process, from /proc"""
+    stats = {}
+    with open(f'/proc/{pid}/status') as f:
+        for line in f:
+            if line.startswith('VmRSS:'):
+                stats['rss_mb'] = round(int(line.split()[1]) / 1024, 1)
+            elif line.startswith('Threads:'):
+                stats['threads'] = int(line.split()[1])
+    return stats
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split('\n\n')[0])
+    parser.add_argument('--url', default='http://127.0.0.1:5000')
+    parser.add_argument('-n', '--connections', type=int, default=500)
+    parser.add_argument('--probes', type=int, default=50, help='join round trips timed while connections are held')
+    parser.add_argument('--timeout', type=float, default=10)
+    parser.add_argument('--pid', type=int, help='server process id for RSS/thread stats')
+    args = parser.parse_args()
+
+    ws_url = args.url.replace('http', 'ws', 1).rstrip('/') + '/socket.io/?EIO=4&transport=websocket'
+    result = {'url': args.url, 'requested': args.connections}
+    if args.pid:
+        result['server_before'] = process_stats(args.pid)
+
+    sockets = []
+    started = time.perf_counter()
+    try:
+        for i in range(args.connections):
+            ws = open_socket(ws_url, args.timeout)
+            join_round_trip(ws, f'capacity{i % 50}')
+            sockets.append(ws)
+    except Exception as e:
+        result['error'] = f'{type(e).__name__}: {e}'
+    result['open'] = len(sockets)
+    result['open_seconds'] = round(time.perf_counter() - started, 2)
+
+    if sockets:
+        probes = [join_round_trip(sockets[i % len(sockets)], 'capacity-probe') for i in range(args.probes)]
+        probes.sort()
+        result['probe_ms'] = {
+            'p50': round(statistics.median(probes), 2),
+            'p95': round(probes[int(len(probes) * 0.95) - 1], 2),
+            'max': round(probes[-1], 2)
+        }
+
+    if args.pid:
+        result['server_after'] = process_stats(args.pid)
+
+    for ws in sockets:
+        ws.close()
+
+    json.dump(result, sys.stdout, indent=2)
+    print()
+
+
+if __name__ == '__main__':
+    main()
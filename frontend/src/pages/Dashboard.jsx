@@ -20,31 +20,34 @@ export default function Dashboard({ keyword, onLogout, userEmail }) {
   const [instructorParticipating, setInstructorParticipating] = useState(false);
   const processedStudents = useRef(new Set());
   const [pairings, setPairings] = useState([]);
-  const [currentPairingObjects, setCurrentPairingObjects] = useState([]);
+  const [currentRound, setCurrentRound] = useState(null);
   const [availableTags, setAvailableTags] = useState([]);
 
   useEffect(() => {
+    // Local countdown between server ticks; the server ends each phase (see handleTick)
     const timer = setInterval(() => {
       if (timerRunning && !isPaused) {
-        setTimeRemaining(prev => {
-          if (prev <= 1) {
-            // Timer reached 0, trigger automatic transition
-            setTimerRunning(false);
-            if (sessionStatus === 'pairing') {
-              // Auto-transition from pairing to talking
-              setTimeout(() => handleStatusChange(), 100);
-            } else if (sessionStatus === 'talking') {
-              // Auto-transition from talking to inactive (next round)
-              setTimeout(() => handleStatusChange(), 100);
-            }
-            return 0;
-          }
-          return prev - 1;
-        });
+        setTimeRemaining(prev => Math.max(prev - 1, 0));
       }
     }, 1000);
     return () => clearInterval(timer);
-  }, [timerRunning, isPaused, sessionStatus]);
+  }, [timerRunning, isPaused]);
+
+  useEffect(() => {
+    // Phase durations are timed on the server so the class keeps going if this tab closes
+    if (keyword) {
+      fetch(`${import.meta.env.VITE_API_URL}/session/${keyword}/timer`, {
+        method: 'PUT',
+        headers: {
+          'Content-Type': 'application/json',
+        },
+        body: JSON.stringify({
+          pairing_seconds: pairingDuration * 60,
+          talking_seconds: talkingDuration * 60
+        }),
+      }).catch(error => console.error('Error configuring round timer:', error));
+    }
+  }, [keyword, pairingDuration, talkingDuration]);
 
   useEffect(() => {
     if (keyword && !socket) {
@@ -122,6 +125,33 @@ export default function Dashboard({ keyword, onLogout, userEmail }) {
       setStudents(prev => prev.filter(s => s.id !== data.student.id));
     };
 
+    const handleRosterDelta = (data) => {
+      console.log('[DEBUG] Received roster_delta event:', data.joined.length, 'joined,', data.left.length, 'left');
+      // Apply a whole batch of joins/leaves in one state update
+      const leftIds = new Set(data.left.map(s => s.id));
+      setStudents(prev => {
+        const known = new Set(prev.map(s => s.id));
+        const added = data.joined.filter(s => !known.has(s.id));
+        return [...prev, ...added].filter(s => !leftIds.has(s.id));
+      });
+    };
+
+    const handleTick = ([round, phase, remaining, paused]) => {
+      // Server timer: [round, 'p'airing | 't'alking | 'i'dle, seconds remaining, paused]
+      setTimeRemaining(remaining);
+      setIsPaused(Boolean(paused));
+      if (phase === 'i') {
+        setSessionStatus('inactive');
+        setTimerRunning(false);
+        setPairings([]);
+        setCurrentRound(null);
+      } else {
+        setSessionStatus(phase === 'p' ? 'pairing' : 'talking');
+        setTimerRunning(!paused);
+        setCurrentRound(round);
+      }
+    };
+
     const handleConnectError = (error) => {
       console.error('[DEBUG] WebSocket connection error:', error);
     };
@@ -131,6 +161,8 @@ export default function Dashboard({ keyword, onLogout, userEmail }) {
     newSocket.on('instructor_joined', handleInstructorJoined);
     newSocket.on('student_joined', handleStudentJoined);
     newSocket.on('student_left', handleStudentLeft);
+    newSocket.on('roster_delta', handleRosterDelta);
+    newSocket.on('tick', handleTick);
     newSocket.on('connect_error', handleConnectError);
 
     // Store cleanup function
@@ -140,6 +172,8 @@ export default function Dashboard({ keyword, onLogout, userEmail }) {
       newSocket.off('instructor_joined', handleInstructorJoined);
       newSocket.off('student_joined', handleStudentJoined);
       newSocket.off('student_left', handleStudentLeft);
+      newSocket.off('roster_delta', handleRosterDelta);
+      newSocket.off('tick', handleTick);
       newSocket.off('connect_error', handleConnectError);
       newSocket.disconnect();
     };
@@ -275,17 +309,18 @@ export default function Dashboard({ keyword, onLogout, userEmail }) {
     }
   };
 
-  const handlePauseRound = () => {
-    if (isPaused) {
-      // Resume: continue timer if session was running before pause
-      setIsPaused(false);
-      if (sessionStatus === 'pairing' || sessionStatus === 'talking') {
-        setTimerRunning(true);
+  const handlePauseRound = async () => {
+    // Pause or resume the server timer; its tick updates the display
+    try {
+      const res = await fetch(`${import.meta.env.VITE_API_URL}/session/${keyword}/timer/${isPaused ? 'resume' : 'pause'}`, {
+        method: 'POST',
+      });
+      if (!res.ok) {
+        const data = await res.json();
+        setErrorMessage(data.message || 'Error pausing round');
       }
-    } else {
-      // Pause: stop timer but keep everything else frozen
-      setIsPaused(true);
-      setTimerRunning(false);
+    } catch (error) {
+      setErrorMessage('Network error pausing round');
     }
   };
 
@@ -295,6 +330,12 @@ export default function Dashboard({ keyword, onLogout, userEmail }) {
       // Notify students to reset their state
       const res = await fetch(`${import.meta.env.VITE_API_URL}/session/${keyword}/reset-round`, {
         method: 'POST',
+        headers: {
+          'Content-Type': 'application/json',
+        },
+        body: JSON.stringify({
+          round: currentRound
+        }),
       });
       
       if (res.ok) {
@@ -302,7 +343,7 @@ export default function Dashboard({ keyword, onLogout, userEmail }) {
         setTimeRemaining(pairingDuration * 60);
         setIsPaused(false);
         setPairings([]); // Clear pairings display
-        setCurrentPairingObjects([]); // Clear pairing objects
+        setCurrentRound(null); // Clear current round
       } else {
         const data = await res.json();
         setErrorMessage(data.message || 'Error resetting round');
@@ -348,7 +389,7 @@ export default function Dashboard({ keyword, onLogout, userEmail }) {
             })
           }];
           setPairings(displayPairings);
-          setCurrentPairingObjects(pairingData.pairings); // Store for discussion notification
+          setCurrentRound(pairingData.pairings[0]?.round || null); // Server keeps the round's pairings
           // Update session status to pairing
           setSessionStatus('pairing');
           setTimeRemaining(pairingDuration * 60);
@@ -371,7 +412,7 @@ export default function Dashboard({ keyword, onLogout, userEmail }) {
             'Content-Type': 'application/json',
           },
           body: JSON.stringify({
-            pairing_objects: currentPairingObjects
+            round: currentRound
           }),
         });
         
@@ -394,6 +435,12 @@ export default function Dashboard({ keyword, onLogout, userEmail }) {
         // Notify students to reset their state
         const res = await fetch(`${import.meta.env.VITE_API_URL}/session/${keyword}/reset-round`, {
           method: 'POST',
+          headers: {
+            'Content-Type': 'application/json',
+          },
+          body: JSON.stringify({
+            round: currentRound
+          }),
         });
         
         if (res.ok) {
@@ -401,7 +448,7 @@ export default function Dashboard({ keyword, onLogout, userEmail }) {
           setTimeRemaining(pairingDuration * 60);
           setTimerRunning(false); // Don't start timer, just set it to pairing duration
           setPairings([]); // Clear previous pairings
-          setCurrentPairingObjects([]);
+          setCurrentRound(null);
         } else {
           const data = await res.json();
           setErrorMessage(data.message || 'Error resetting round');
@@ -488,7 +535,7 @@ export default function Dashboard({ keyword, onLogout, userEmail }) {
               </div>
               <div className={styles.analyticsItem}>
                 <div className={styles.analyticsNumberRounds}>
-                  {currentPairingObjects.length > 0 ? currentPairingObjects[0].round : 0}
+                  {currentRound || 0}
                 </div>
                 <div className={styles.analyticsLabel}>Current Round</div>
               </div>
@@ -73,6 +73,19 @@ export default function Room({ keyword, username, onLeave }) {
       // Talkers don't get prompts, just the start notification
     };
 
+    const handleResync = (data) => {
+      console.log('[DEBUG] Resync received:', data);
+      // Restore this student's part of the current round after a reconnect
+      handlePairingAssignment(data.assignment);
+      if (data.discussion) {
+        if (data.discussion.prompt) {
+          handleDiscussionPrompt(data.discussion);
+        } else {
+          handleDiscussionStarted(data.discussion);
+        }
+      }
+    };
+
     const handleRoundReset = (data) => {
       console.log('[DEBUG] Round reset notification received:', data);
       // Reset to initial state
@@ -98,6 +111,7 @@ export default function Room({ keyword, username, onLeave }) {
     socket.on('discussion_prompt', handleDiscussionPrompt);
     socket.on('discussion_started', handleDiscussionStarted);
     socket.on('round_reset', handleRoundReset);
+    socket.on('resync', handleResync);
 
     return () => {
       socket.off('connect', handleConnect);
@@ -109,6 +123,7 @@ export default function Room({ keyword, username, onLeave }) {
       socket.off('discussion_prompt', handleDiscussionPrompt);
       socket.off('discussion_started', handleDiscussionStarted);
       socket.off('round_reset', handleRoundReset);
+      socket.off('resync', handleResync);
       socket.disconnect();
     };
   }, [keyword, username]);